@@ -1,16 +1,24 @@
-import streamlit as st
+import os
 import secrets
+import tempfile
+
+import streamlit as st
 from auth import admin_create_user_flow
+from cache import cache_dashboard, cache_lancamentos, invalidar_usuario
 #from email_utils import send_temporary_password
 from db import (
-    listar_usuarios,
+    buscar_usuarios,
     excluir_usuario,
     atualizar_senha,
     log_audit,
-    listar_audit_logs,
+    paginar_audit_logs,
+    tipos_audit_logs,
     can_delete_user,
-    set_must_change_password
+    set_must_change_password,
+    estatisticas_auditoria,
 )
+from limite_login import estatisticas_login
+from senhas import estatisticas_senhas
 
 
 def tela_admin():
@@ -22,60 +30,7 @@ def tela_admin():
     #if not os.environ.get("SMTP_HOST"):
         #st.warning("SMTP não configurado. Emails serão impressos no console (dev). Configure env vars para envio real.")
 
-    # LISTAGEM e ações por usuário
-    users = listar_usuarios()
-    st.subheader("Usuários")
-    if users.empty:
-        st.info("Nenhum usuário cadastrado.")
-    else:
-        for _, u in users.iterrows():
-            cols = st.columns([3, 3, 1, 1, 1])
-            cols[0].markdown(f"**{u['nome']}**")
-            cols[1].markdown(f"{u['email']}")
-            cols[2].markdown("Admin" if u["is_admin"] else "Usuário")
-            if cols[3].button("Resetar senha", key=f"reset_{u['id_usuario']}"):
-                temp_pw = secrets.token_urlsafe(10)
-
-                atualizar_senha(u["id_usuario"], temp_pw)
-                set_must_change_password(u["id_usuario"], True)
-
-                log_audit(
-                    "password_reset_by_admin",
-                    st.session_state.usuario["id"],
-                    u["id_usuario"],
-                    "Reset de senha por admin"
-                    )
-                st.success("Senha resetada com sucesso!")
-                st.info(f"🔑 Nova senha temporária: {temp_pw}")
-                st.warning("Informe essa senha ao usuário. Ele será obrigado a trocá-la no login.")
-
-            if cols[4].button("Excluir", key=f"del_{u['id_usuario']}"):
-                st.session_state[f"confirm_delete_{u['id_usuario']}"] = True
-
-            if st.session_state.get(f"confirm_delete_{u['id_usuario']}", False):
-                confirm = st.text_input(
-                    f"Digite o email de {u['nome']} para confirmar exclusão",
-                    key=f"conf_input_{u['id_usuario']}"
-                    )
-
-                if st.button("Confirmar exclusão", key=f"confirm_button_{u['id_usuario']}"):
-                    if confirm != u["email"]:
-                        st.error("Email não confere. Exclusão cancelada.")
-                    else:
-                        if not can_delete_user(u['id_usuario']):
-                            st.error("Não é possível excluir o último administrador.")
-                        else:
-                            excluir_usuario(u['id_usuario'])
-                            log_audit(
-                                "user_deleted",
-                                st.session_state.usuario['id'],
-                                u['id_usuario'],
-                                "Exclusão de usuário"
-                            )
-                            del st.session_state[f"confirm_delete_{u['id_usuario']}"]
-                            st.session_state.pop(f"conf_input_{u['id_usuario']}", None)
-                            st.success("Usuário excluído.")
-                            st.rerun()
+    _tela_usuarios()
 
     st.divider()
     st.subheader("Criar novo usuário (gera senha temporária)")
@@ -106,16 +61,174 @@ def tela_admin():
                         st.error(f"Erro ao criar usuário: {e}")
 
     st.divider()
-    st.subheader("Logs de auditoria (recentes)")
-    logs = listar_audit_logs(limit=100)
+    with st.expander("Caches do processo"):
+        st.caption("Lançamentos")
+        st.json(cache_lancamentos.stats())
+        st.caption("Dashboard (resumos e figuras)")
+        st.json(cache_dashboard.stats())
+        st.caption("Fila de auditoria")
+        st.json(estatisticas_auditoria())
+        st.caption("Limite de login")
+        st.json(estatisticas_login())
+        st.caption("Pool de senhas (bcrypt)")
+        st.json(estatisticas_senhas())
+
+    st.divider()
+    _tela_auditoria()
+
+
+def _tela_usuarios():
+    # busca e paginação no SQL; a tabela desenha só a página e as ações valem
+    # para o usuário selecionado (custo de render limitado ao tamanho da página)
+    st.subheader("Usuários")
+    c1, c2 = st.columns([3, 1])
+    busca = c1.text_input("Buscar por nome ou e-mail", key="usuarios_busca")
+    por_pagina = c2.selectbox("Por página", [25, 50, 100, 200], index=1, key="usuarios_por_pagina")
+
+    # busca mudou: volta para a primeira página
+    if st.session_state.get("usuarios_assinatura") != (busca, por_pagina):
+        st.session_state.usuarios_assinatura = (busca, por_pagina)
+        st.session_state.usuarios_pagina = 1
+    pagina = st.session_state.usuarios_pagina
+    users, total = buscar_usuarios(busca, por_pagina, (pagina - 1) * por_pagina)
+    paginas = max(1, -(-total // por_pagina))
+
+    if total == 0:
+        st.info("Nenhum usuário encontrado." if busca else "Nenhum usuário cadastrado.")
+        return
+
+    evento = st.dataframe(
+        users.rename(columns={
+            "id_usuario": "ID", "nome": "Nome", "email": "Email",
+            "is_admin": "Admin", "must_change_password": "Trocar senha",
+        }),
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        # chave muda com busca/página/exclusão: a seleção não "pula" para outra linha
+        key=f"usuarios_tabela_{busca}_{por_pagina}_{pagina}_{st.session_state.get('usuarios_versao', 0)}",
+    )
+    n1, n2, n3 = st.columns([1, 1, 4])
+    if n1.button("← Anterior", disabled=pagina <= 1, key="usuarios_anterior"):
+        st.session_state.usuarios_pagina -= 1
+        st.rerun()
+    if n2.button("Próxima →", disabled=pagina >= paginas, key="usuarios_proxima"):
+        st.session_state.usuarios_pagina += 1
+        st.rerun()
+    n3.caption(f"{total} usuário(s) — página {pagina} de {paginas}")
+
+    linhas = evento.selection.rows
+    if not linhas:
+        st.caption("Selecione um usuário na tabela para ver as ações.")
+        return
+    u = users.iloc[linhas[0]]
+    _acoes_usuario(u)
+
+
+def _acoes_usuario(u):
+    st.markdown(f"**{u['nome']}** — {u['email']} ({'Admin' if u['is_admin'] else 'Usuário'})")
+    cols = st.columns([1, 1, 4])
+    if cols[0].button("Resetar senha", key=f"reset_{u['id_usuario']}"):
+        temp_pw = secrets.token_urlsafe(10)
+
+        atualizar_senha(u["id_usuario"], temp_pw)
+        set_must_change_password(u["id_usuario"], True)
+
+        log_audit(
+            "password_reset_by_admin",
+            st.session_state.usuario["id"],
+            u["id_usuario"],
+            "Reset de senha por admin"
+            )
+        st.success("Senha resetada com sucesso!")
+        st.info(f"🔑 Nova senha temporária: {temp_pw}")
+        st.warning("Informe essa senha ao usuário. Ele será obrigado a trocá-la no login.")
+
+    if cols[1].button("Excluir", key=f"del_{u['id_usuario']}"):
+        st.session_state[f"confirm_delete_{u['id_usuario']}"] = True
+
+    if st.session_state.get(f"confirm_delete_{u['id_usuario']}", False):
+        confirm = st.text_input(
+            f"Digite o email de {u['nome']} para confirmar exclusão",
+            key=f"conf_input_{u['id_usuario']}"
+            )
+
+        if st.button("Confirmar exclusão", key=f"confirm_button_{u['id_usuario']}"):
+            if confirm != u["email"]:
+                st.error("Email não confere. Exclusão cancelada.")
+            else:
+                if not can_delete_user(u['id_usuario']):
+                    st.error("Não é possível excluir o último administrador.")
+                else:
+                    excluir_usuario(u['id_usuario'])
+                    invalidar_usuario(u['id_usuario'])
+                    log_audit(
+                        "user_deleted",
+                        st.session_state.usuario['id'],
+                        u['id_usuario'],
+                        "Exclusão de usuário"
+                    )
+                    del st.session_state[f"confirm_delete_{u['id_usuario']}"]
+                    st.session_state.pop(f"conf_input_{u['id_usuario']}", None)
+                    st.session_state.usuarios_versao = st.session_state.get("usuarios_versao", 0) + 1
+                    st.success("Usuário excluído.")
+                    st.rerun()
+
+
+def _tela_auditoria():
+    st.subheader("Logs de auditoria")
+    # filtros aplicados no SQL; a paginação é por chave (created_at, id), sem OFFSET
+    c1, c2, c3 = st.columns([2, 1, 1])
+    tipos = c1.multiselect("Tipos de evento", tipos_audit_logs())
+    ator = c2.number_input("Ator (id)", min_value=0, step=1, value=None)
+    alvo = c3.number_input("Alvo (id)", min_value=0, step=1, value=None)
+    c4, c5 = st.columns([2, 1])
+    periodo = c4.date_input("Período (UTC)", value=(), format="DD/MM/YYYY")
+    por_pagina = c5.selectbox("Por página", [50, 100, 200, 500], index=1)
+
+    filtros = {
+        "event_type": tipos or None,
+        "actor_id": ator,
+        "target_id": alvo,
+        "inicio": periodo[0] if len(periodo) >= 1 else None,
+        "fim": periodo[1] if len(periodo) == 2 else None,
+    }
+    # filtros mudaram: volta para a primeira página
+    assinatura = (repr(filtros), por_pagina)
+    if st.session_state.get("audit_assinatura") != assinatura:
+        st.session_state.audit_assinatura = assinatura
+        st.session_state.audit_cursores = [None]
+    cursores = st.session_state.audit_cursores
+
+    logs, proximo = paginar_audit_logs(por_pagina, cursores[-1], **filtros)
     if logs.empty:
-        st.info("Sem eventos registrados.")
+        st.info("Sem eventos para os filtros escolhidos.")
     else:
-        # filtros simples
-        tipos = sorted(logs['event_type'].unique().tolist())
-        filtro = st.selectbox("Filtrar por tipo (opcional)", ["Todos"] + tipos)
-        if filtro != "Todos":
-            logs = logs[logs['event_type'] == filtro]
-        st.dataframe(logs)
-        csv = logs.to_csv(index=False).encode('utf-8')
-        st.download_button("Baixar logs (CSV)", csv, file_name="audit_logs.csv", mime="text/csv")
\ No newline at end of file
+        st.dataframe(logs, hide_index=True)
+
+    n1, n2, n3 = st.columns([1, 1, 4])
+    if n1.button("← Mais recentes", disabled=len(cursores) == 1):
+        cursores.pop()
+        st.rerun()
+    if n2.button("Mais antigos →", disabled=proximo is None):
+        cursores.append(proximo)
+        st.rerun()
+    n3.caption(f"Página {len(cursores)}")
+
+    formato = st.radio("Exportar trilha completa (com os filtros)", ["csv", "parquet"], horizontal=True)
+    if st.button("Gerar exportação"):
+        # escrita em lotes num arquivo temporário; nada de DataFrame com a trilha inteira
+        from exportacao import exportar_auditoria
+        fd, caminho = tempfile.mkstemp(prefix="audit_logs_", suffix=f".{formato}")
+        os.close(fd)
+        try:
+            linhas = exportar_auditoria(caminho, formato, **filtros)
+            with open(caminho, "rb") as f:
+                st.download_button(
+                    f"Baixar {linhas} evento(s)",
+                    f,
+                    file_name=f"audit_logs.{formato}",
+                    mime="text/csv" if formato == "csv" else "application/vnd.apache.parquet",
+                )
+        finally:
+            os.remove(caminho)
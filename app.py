@@ -1,6 +1,7 @@
+import json
+import os
+import sqlite3
 import streamlit as st
-import plotly.express as px
-import pandas as pd
 from dotenv import load_dotenv
 from logger_config import logger
 
@@ -10,28 +11,20 @@ st.set_page_config(page_title="Minha Renda", layout="wide")
 # ================= ENV =================
 load_dotenv()
 
+# Só o necessário para a tela de login; o resto é importado depois do
+# st.stop() do login (Plotly, logic, cache) ou no ponto de uso (admin,
+# importação, exportação/pyarrow). benchmarks/bench_startup.py vigia isto.
 from auth import tela_login, tela_mudar_senha
-from db import (
-    criar_tabela_usuarios,
-    criar_tabelas,
-    carregar_gastos,
-    carregar_rendas,
-    inserir_gasto,
-    inserir_renda,
-    atualizar_gasto,
-    atualizar_renda,
-    dump_db_bytes,
-)
-from logic import (
-    classificacao_base_df,
-    gerar_resumo,
-    gerar_evolucao_mensal
-)
-from admin import tela_admin
+from db import migrar
+from backup import iniciar_backup_agendado
+from retencao import iniciar_retencao_agendada
+from recorrencias import iniciar_recorrencias_agendadas
 
 # ================= BANCO =================
-criar_tabela_usuarios()
-criar_tabelas()
+migrar()
+iniciar_backup_agendado()
+iniciar_retencao_agendada()
+iniciar_recorrencias_agendadas()
 
 # ================= AUTH =================
 if "usuario" not in st.session_state:
@@ -42,23 +35,58 @@ if st.session_state.usuario.get("must_change_password", False):
     tela_mudar_senha()
     st.stop()
 
+# ================= IMPORTS (PÓS-LOGIN) =================
+import pandas as pd
+import plotly.express as px
+from db import (
+    carregar_gastos,
+    carregar_rendas,
+    listar_anos,
+    listar_categorias,
+    obter_versao_dados,
+    inserir_gasto,
+    inserir_renda,
+    aplicar_alteracoes_gastos,
+    aplicar_alteracoes_rendas,
+    buscar_lancamentos,
+    criar_recorrencia,
+    encerrar_recorrencia,
+    listar_recorrencias,
+    ano_mes,
+    para_reais,
+)
+from logic import (
+    classificacao_base_df,
+    matriz_resumo_sql,
+)
+from cache import obter_dashboard, obter_lancamentos
+from backup import gerar_backup
+from recorrencias import materializar
+
 id_usuario = st.session_state.usuario["id"]
 is_admin = st.session_state.usuario.get("is_admin", False)
 
 # ================= CACHE =================
-@st.cache_data(ttl=30)
-def _carregar_gastos(id_u):
-    return carregar_gastos(id_u)
-
-@st.cache_data(ttl=30)
-def _carregar_rendas(id_u):
-    return carregar_rendas(id_u)
+# DataFrames ficam no cache LRU compartilhado do processo (cache.py), com chave
+# (tabela, usuário, versão dos dados). A sessão guarda só a versão; uma escrita
+# muda a versão e só invalida as entradas daquele usuário.
+# Os frames são compartilhados entre sessões: não alterar sem .copy().
+def _sincronizar_dados():
+    st.session_state.versao_dados = obter_versao_dados(id_usuario)
+
+def _gastos():
+    return obter_lancamentos(
+        "gastos", id_usuario, st.session_state.versao_dados,
+        lambda: carregar_gastos(id_usuario)
+    )
 
-if "gastos" not in st.session_state:
-    st.session_state.gastos = _carregar_gastos(id_usuario)
+def _rendas():
+    return obter_lancamentos(
+        "rendas", id_usuario, st.session_state.versao_dados,
+        lambda: carregar_rendas(id_usuario)
+    )
 
-if "rendas" not in st.session_state:
-    st.session_state.rendas = _carregar_rendas(id_usuario)
+_sincronizar_dados()
 
 # ================= SIDEBAR =================
 st.sidebar.markdown(f"👤 **Usuário:** {st.session_state.usuario['nome']}")
@@ -75,6 +103,7 @@ if st.sidebar.button("Sair"):
     st.rerun()
 
 if is_admin and st.session_state.get("show_admin", False):
+    from admin import tela_admin
     tela_admin()
     st.stop()
 
@@ -96,11 +125,7 @@ with st.sidebar.expander("📅 Período / Filtros", expanded=True):
         ][x - 1]
     )
 
-    anos_disponiveis = (
-        sorted(st.session_state.rendas["ano"].dropna().astype(int).unique())
-        if not st.session_state.rendas.empty
-        else [pd.Timestamp.now().year]
-    )
+    anos_disponiveis = listar_anos(id_usuario) or [pd.Timestamp.now().year]
 
     ano = st.selectbox("Ano", anos_disponiveis)
     visao = st.radio("Tipo de visão", ["Mensal", "Anual"])
@@ -109,16 +134,40 @@ with st.sidebar.expander("📅 Período / Filtros", expanded=True):
         st.session_state.mes = mes
         st.session_state.ano = ano
         st.session_state.visao = visao
-        _carregar_gastos.clear()
-        _carregar_rendas.clear()
-        st.session_state.gastos = _carregar_gastos(id_usuario)
-        st.session_state.rendas = _carregar_rendas(id_usuario)
         st.rerun()
 
 mes = st.session_state.get("mes", 1)
 ano = st.session_state.get("ano", anos_disponiveis[0])
 visao = st.session_state.get("visao", "Mensal")
 
+# ================= RECORRÊNCIAS =================
+# A regra começa no mês/ano do filtro; os meses até hoje (ou o próprio mês,
+# se for futuro) já são gerados. Os seguintes vêm do agendador (recorrencias.py).
+def _salvar_recorrencia(tipo, descricao, valor, id_classificacao=None, categoria=None):
+    criar_recorrencia(
+        id_usuario, tipo, descricao, valor, (ano, mes),
+        id_classificacao=id_classificacao, categoria=categoria,
+    )
+    hoje = pd.Timestamp.now()
+    materializar(ate=max((ano, mes), (hoje.year, hoje.month)), id_usuario=id_usuario)
+
+def _recorrencias(tipo):
+    regras = listar_recorrencias(id_usuario)
+    regras = regras[regras["tipo"] == tipo]
+    if regras.empty:
+        return
+    with st.expander(f"🔁 {len(regras)} recorrência(s) ativa(s)"):
+        for regra in regras.itertuples():
+            col_desc, col_acao = st.columns([4, 1])
+            prox_ano, prox_mes = ano_mes(regra.proximo_periodo)
+            col_desc.write(
+                f"{regra.descricao} — R$ {para_reais(regra.valor_centavos):,.2f} "
+                f"(próximo: {prox_mes:02d}/{prox_ano})"
+            )
+            if col_acao.button("Encerrar", key=f"encerrar_recorrencia_{regra.id}"):
+                encerrar_recorrencia(regra.id, id_usuario)
+                st.rerun()
+
 # ================= ABA RENDA =================
 with aba_renda:
     st.subheader("💵 Nova renda")
@@ -126,18 +175,23 @@ with aba_renda:
     with st.form("form_renda"):
         descricao = st.text_input("Descrição")
         valor = st.number_input("Valor (R$)", min_value=0.0, step=50.0)
+        repetir = st.checkbox("Repetir todo mês a partir deste", key="renda_recorrente")
         salvar = st.form_submit_button("Salvar")
 
         if salvar:
             if not descricao or valor <= 0:
                 st.warning("Preencha todos os campos")
+            elif repetir:
+                _salvar_recorrencia("rendas", descricao, valor)
+                st.success("Renda recorrente criada!")
+                st.rerun()
             else:
                 inserir_renda(id_usuario, descricao, valor, mes, ano)
-                _carregar_rendas.clear()
-                st.session_state.rendas = _carregar_rendas(id_usuario)
                 st.success("Renda adicionada!")
                 st.rerun()
 
+    _recorrencias("rendas")
+
 # ================= ABA GASTO =================
 with aba_gasto:
     st.subheader("➕ Novo gasto")
@@ -155,15 +209,7 @@ with aba_gasto:
             ].iloc[0]
         )
 
-        categorias_existentes = (
-            st.session_state.gastos
-            .query("id_classificacao == @id_classificacao")["categoria"]
-            .dropna()
-            .unique()
-            .tolist()
-            if not st.session_state.gastos.empty
-            else []
-        )
+        categorias_existentes = listar_categorias(id_usuario, id_classificacao)
 
         categoria_sel = st.selectbox(
             "Categoria",
@@ -177,12 +223,17 @@ with aba_gasto:
 
         descricao = st.text_input("Descrição")
         valor = st.number_input("Valor (R$)", min_value=0.0, step=1.0)
+        repetir = st.checkbox("Repetir todo mês a partir deste", key="gasto_recorrente")
 
         salvar = st.form_submit_button("Salvar")
 
         if salvar:
             if not categoria or not descricao or valor <= 0:
                 st.warning("Preencha todos os campos")
+            elif repetir:
+                _salvar_recorrencia("gastos", descricao, valor, id_classificacao, categoria)
+                st.success("Gasto recorrente criado!")
+                st.rerun()
             else:
                 inserir_gasto(
                     id_usuario,
@@ -193,103 +244,228 @@ with aba_gasto:
                     mes,
                     ano
                 )
-                _carregar_gastos.clear()
-                st.session_state.gastos = _carregar_gastos(id_usuario)
                 st.success("Gasto adicionado!")
                 st.rerun()
 
+    _recorrencias("gastos")
+
 # ================= DASHBOARD =================
+def _calcular_painel(visao, mes, ano):
+    # Matriz (ano, mes, classificação) montada de resumo_mensal numa consulta;
+    # resumo, evolução e comparativo são fatias dela.
+    matriz = matriz_resumo_sql(id_usuario, classificacao_base_df)
+    renda_total, resumo_df = matriz.resumo(visao, mes, ano)
+    evolucao = matriz.evolucao(ano)
+
+    fig = px.bar(
+        resumo_df.sort_values("real_pct", ascending=False),
+        x="valor",
+        y="nome",
+        orientation="h",
+        color="status",
+        color_discrete_map={
+            "Abaixo do ideal": "green",
+            "Dentro do ideal": "gold",
+            "Acima do ideal": "crimson",
+        },
+    )
+    fig2 = px.line(
+        evolucao,
+        x="mes_nome",
+        y=["Renda", "Gastos", "Saldo"],
+        markers=True
+    )
+    return {
+        "renda_total": renda_total,
+        "resumo": resumo_df,
+        "comparativo": matriz.comparativo_anual() if len(matriz.anos) > 1 else None,
+        # specs serializadas: o cache mede o tamanho e o rerun só desserializa
+        "fig_resumo": fig.to_json(),
+        "fig_evolucao": fig2.to_json(),
+    }
+
+def _painel_dashboard(visao, mes, ano):
+    # compartilhado entre sessões (cache.py): não alterar os frames
+    return obter_dashboard(
+        id_usuario, visao, mes, ano, st.session_state.versao_dados,
+        lambda: _calcular_painel(visao, mes, ano)
+    )
+
 with aba_dashboard:
     st.subheader("📊 Dashboard")
 
-    renda_total, resumo_df = gerar_resumo(
-        st.session_state.rendas,
-        st.session_state.gastos,
-        classificacao_base_df,
-        visao,
-        mes,
-        ano,
-        id_usuario
-    )
+    painel = _painel_dashboard(visao, mes, ano)
+    renda_total, resumo_df = painel["renda_total"], painel["resumo"]
 
     if resumo_df.empty:
         st.info("Sem dados no período")
     else:
         col1, col2, col3 = st.columns(3)
         col1.metric("💵 Renda", f"R$ {renda_total:,.2f}")
-        col2.metric("📉 Gastos", f"R$ {resumo_df['valor'].sum():,.2f}")
-        saldo = renda_total - resumo_df["valor"].sum()
+        gastos_total = para_reais(int(resumo_df["valor_centavos"].sum()))
+        col2.metric("📉 Gastos", f"R$ {gastos_total:,.2f}")
+        saldo = renda_total - gastos_total
         col3.metric("💰 Saldo", f"R$ {saldo:,.2f}")
 
-        resumo_sorted = resumo_df.sort_values("real_pct", ascending=False)
-        fig = px.bar(
-            resumo_sorted,
-            x="valor",
-            y="nome",
-            orientation="h",
-            color="status",
-            color_discrete_map={
-                "Abaixo do ideal": "green",
-                "Dentro do ideal": "gold",
-                "Acima do ideal": "crimson",
-            },
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(json.loads(painel["fig_resumo"]), use_container_width=True)
 
     st.subheader("📈 Evolução mensal")
-    evolucao = gerar_evolucao_mensal(
-        st.session_state.gastos,
-        st.session_state.rendas,
-        ano
+    st.plotly_chart(json.loads(painel["fig_evolucao"]), use_container_width=True)
+
+    if painel["comparativo"] is not None:
+        st.subheader("📆 Comparativo anual")
+        st.dataframe(
+            painel["comparativo"],
+            hide_index=True,
+            use_container_width=True,
+            column_config={"var_gastos_pct": st.column_config.NumberColumn("Var. gastos", format="percent")},
+        )
+
+# ================= REGISTROS =================
+# O editor mostra `valor` em reais; aplicar_alteracoes_* converte de volta.
+def _para_editor(df, colunas):
+    return df.assign(valor=para_reais(df["valor_centavos"]))[colunas]
+
+def _resumo_alteracoes(resultado):
+    return (
+        f"Alterações aplicadas: {resultado['inseridos']} incluída(s), "
+        f"{resultado['atualizados']} atualizada(s), {resultado['excluidos']} excluída(s)."
     )
-    fig2 = px.line(
-        evolucao,
-        x="mes_nome",
-        y=["Renda", "Gastos", "Saldo"],
-        markers=True
+
+BUSCA_POR_PAGINA = 20
+
+def _busca_lancamentos():
+    """Busca por descrição/categoria no índice FTS, paginada (não carrega o histórico)."""
+    col_busca, col_tipo = st.columns([3, 1])
+    busca = col_busca.text_input("🔎 Buscar lançamentos", key="busca_lancamentos",
+                                 placeholder="descrição ou categoria")
+    tipo = {"Todos": None, "Gastos": "gastos", "Rendas": "rendas"}[
+        col_tipo.selectbox("Em", ["Todos", "Gastos", "Rendas"], key="busca_tipo")
+    ]
+    if not busca.strip():
+        return
+    assinatura = (busca, tipo)
+    if st.session_state.get("busca_assinatura") != assinatura:
+        st.session_state.busca_assinatura = assinatura
+        st.session_state.busca_pagina = 0
+    pagina = st.session_state.busca_pagina
+
+    resultado, total = buscar_lancamentos(id_usuario, busca, tipo, BUSCA_POR_PAGINA, pagina * BUSCA_POR_PAGINA)
+    if not total:
+        st.info("Nenhum lançamento encontrado.")
+        return
+    st.dataframe(
+        resultado.assign(valor=para_reais(resultado["valor_centavos"]))[
+            ["tipo", "id", "categoria", "descricao", "valor", "mes", "ano"]
+        ],
+        hide_index=True,
+        use_container_width=True,
     )
-    st.plotly_chart(fig2, use_container_width=True)
+    paginas = (total - 1) // BUSCA_POR_PAGINA + 1
+    col_ant, col_info, col_prox = st.columns([1, 2, 1])
+    if col_ant.button("← Anterior", key="busca_anterior", disabled=pagina == 0):
+        st.session_state.busca_pagina -= 1
+        st.rerun()
+    col_info.caption(f"{total} lançamento(s) — página {pagina + 1} de {paginas}")
+    if col_prox.button("Próxima →", key="busca_proxima", disabled=pagina + 1 >= paginas):
+        st.session_state.busca_pagina += 1
+        st.rerun()
 
-# ================= REGISTROS =================
 with aba_registros:
+    _busca_lancamentos()
+    st.divider()
+
     st.subheader("📋 Rendas")
-    if not st.session_state.rendas.empty:
+    if not _rendas().empty:
+        rendas_registro = _para_editor(_rendas(), ["id", "descricao", "valor", "mes", "ano"])
         edited_rendas = st.data_editor(
-            st.session_state.rendas[["id", "descricao", "valor"]],
+            rendas_registro,
             num_rows="dynamic",
+            disabled=["id"],
             use_container_width=True,
         )
         if st.button("Aplicar alterações em rendas"):
-            for _, row in edited_rendas.iterrows():
-                atualizar_renda(row["id"], row["descricao"], float(row["valor"]))
-            _carregar_rendas.clear()
-            st.session_state.rendas = _carregar_rendas(id_usuario)
-            st.success("Alterações aplicadas.")
+            try:
+                resultado = aplicar_alteracoes_rendas(
+                    id_usuario, rendas_registro, edited_rendas, padroes={"mes": mes, "ano": ano}
+                )
+            except (sqlite3.IntegrityError, ValueError) as e:
+                st.error(f"Não foi possível aplicar as alterações: {e}")
+            else:
+                _sincronizar_dados()
+                st.success(_resumo_alteracoes(resultado))
 
     st.divider()
 
     st.subheader("📋 Gastos")
-    if not st.session_state.gastos.empty:
+    if not _gastos().empty:
+        gastos_registro = _para_editor(
+            _gastos(), ["id", "id_classificacao", "categoria", "descricao", "valor", "mes", "ano"]
+        ).astype({"categoria": object})  # texto livre no editor, não lista fechada
         edited_gastos = st.data_editor(
-            st.session_state.gastos[["id", "categoria", "descricao", "valor"]],
+            gastos_registro,
             num_rows="dynamic",
+            disabled=["id"],
             use_container_width=True,
         )
         if st.button("Aplicar alterações em gastos"):
-            for _, row in edited_gastos.iterrows():
-                atualizar_gasto(row["id"], row["descricao"], float(row["valor"]))
-            _carregar_gastos.clear()
-            st.session_state.gastos = _carregar_gastos(id_usuario)
-            st.success("Alterações aplicadas.")
+            try:
+                resultado = aplicar_alteracoes_gastos(
+                    id_usuario, gastos_registro, edited_gastos, padroes={"mes": mes, "ano": ano}
+                )
+            except (sqlite3.IntegrityError, ValueError) as e:
+                st.error(f"Não foi possível aplicar as alterações: {e}")
+            else:
+                _sincronizar_dados()
+                st.success(_resumo_alteracoes(resultado))
+
+    st.divider()
+
+    st.subheader("Importar extrato bancário")
+    arquivo_extrato = st.file_uploader(
+        "Extrato CSV (data;descricao;valor) ou OFX", type=["csv", "ofx", "qfx"]
+    )
+    if arquivo_extrato is not None and st.button("Importar extrato"):
+        try:
+            from importacao import importar_extrato
+            total = importar_extrato(id_usuario, arquivo_extrato)
+        except ValueError as e:
+            st.error(f"Não foi possível importar: {e}")
+        else:
+            _sincronizar_dados()
+            st.success(
+                f"{total['gastos']} gasto(s) e {total['rendas']} renda(s) importado(s); "
+                f"{total['duplicadas']} já existiam, {total['invalidas']} linha(s) inválida(s)."
+            )
 
     st.divider()
 
     st.subheader("Exportar / Backup")
     if st.button("Baixar backup do DB"):
-        db_bytes = dump_db_bytes()
-        st.download_button(
-            "Download DB",
-            db_bytes,
-            file_name="database.db",
-            mime="application/octet-stream"
-        )
+        # snapshot consistente via API de backup, comprimido em disco
+        caminho = gerar_backup(compressao="gzip")
+        try:
+            with open(caminho, "rb") as f:
+                st.download_button(
+                    "Download DB",
+                    f,
+                    file_name="database.db.gz",
+                    mime="application/gzip"
+                )
+        finally:
+            os.remove(caminho)
+
+    if st.button("Baixar meus dados (Parquet)"):
+        # rendas/ e gastos/ particionados por ano=AAAA, prontos para pyarrow/pandas
+        from exportacao import exportar_zip
+        caminho = exportar_zip(id_usuario)
+        try:
+            with open(caminho, "rb") as f:
+                st.download_button(
+                    "Download Parquet",
+                    f,
+                    file_name="meus_dados_parquet.zip",
+                    mime="application/zip"
+                )
+        finally:
+            os.remove(caminho)
@@ -1,19 +1,16 @@
+import math
 import string
 import streamlit as st
 import secrets
 #from email_utils import send_temporary_password
 from db import (
     autenticar_usuario,
-    record_login_attempt,
-    count_failed_attempts_recent,
     log_audit,
     atualizar_senha,
     set_must_change_password,
     criar_usuario as db_criar_usuario,
 )
-
-MAX_FAILED = 5
-LOCKOUT_MINUTES = 15
+from limite_login import ip_do_cliente, obter_limitador
 
 def tela_login():
     st.title("Login")
@@ -24,24 +21,32 @@ def tela_login():
         email = st.text_input("Email")
         senha = st.text_input("Senha", type="password")
         if st.button("Entrar"):
-            failures = count_failed_attempts_recent(email, minutes=LOCKOUT_MINUTES)
-            if failures >= MAX_FAILED:
-                st.error("Muitas tentativas falhas. Tente novamente mais tarde.")
+            # bloqueio decidido em memória (por e-mail e IP); o banco só recebe o histórico em lote
+            limitador = obter_limitador()
+            ip = ip_do_cliente(st.context.ip_address, st.context.headers.get("X-Forwarded-For"))
+            espera = limitador.espera(email, ip)
+            if espera:
+                st.error(f"Muitas tentativas falhas. Tente novamente em {math.ceil(espera / 60)} min.")
             else:
-                user = autenticar_usuario(email, senha)
-                record_login_attempt(email, success=bool(user))
-                if user:
-                    st.session_state.usuario = {
-                        "id": user[0],
-                        "nome": user[1],
-                        "is_admin": bool(user[2]),
-                        "must_change_password": bool(user[3])
-                    }
-                    log_audit("login_success", user[0], user[0], f"Login bem-sucedido para {email}")
-                    st.rerun()
+                try:
+                    user = autenticar_usuario(email, senha)
+                except TimeoutError:
+                    # pool de bcrypt saturado: não conta como tentativa
+                    st.error("Servidor ocupado. Tente novamente em instantes.")
                 else:
-                    log_audit("login_failed", None, None, f"Falha de login para {email}")
-                    st.error("Credenciais inválidas.")
+                    limitador.registrar(email, ip, sucesso=bool(user))
+                    if user:
+                        st.session_state.usuario = {
+                            "id": user[0],
+                            "nome": user[1],
+                            "is_admin": bool(user[2]),
+                            "must_change_password": bool(user[3])
+                        }
+                        log_audit("login_success", user[0], user[0], f"Login bem-sucedido para {email}")
+                        st.rerun()
+                    else:
+                        log_audit("login_failed", None, None, f"Falha de login para {email}")
+                        st.error("Credenciais inválidas.")
 
     with cadastro:
         st.info("Cadastro cria usuário padrão (sem permissões de admin).")
@@ -0,0 +1,158 @@
+"""
+Backup online do SQLite.
+
+A cópia usa a API de backup do sqlite3 em passos de N páginas, lendo de um
+único snapshot (transação de leitura em WAL): é consistente e não bloqueia
+os escritores. A compressão (gzip ou zstd, se o pacote `zstandard` estiver instalado)
+é feita em blocos, sem carregar o banco inteiro na memória.
+"""
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from typing import Optional
+
+import db
+from logger_config import logger
+
+try:
+    import zstandard
+except ImportError:  # opcional
+    zstandard = None
+
+
+BACKUP_DIR = os.environ.get("BACKUP_DIR", os.path.join(db.BASE_DIR, "backups"))
+BACKUP_RETENCAO = int(os.environ.get("BACKUP_RETENCAO", "7"))
+BACKUP_INTERVALO_MIN = float(os.environ.get("BACKUP_INTERVALO_MIN", "0"))  # 0 = desligado
+BACKUP_COMPRESSAO = os.environ.get("BACKUP_COMPRESSAO", "gzip").lower() or None
+if BACKUP_COMPRESSAO in ("nenhuma", "none"):
+    BACKUP_COMPRESSAO = None
+
+PAGINAS_POR_PASSO = 1024
+PAUSA_ENTRE_PASSOS = 0.005
+TAMANHO_BLOCO = 1024 * 1024
+
+EXTENSOES = {None: ".db", "gzip": ".db.gz", "zstd": ".db.zst"}
+
+
+def copiar_banco(destino: str, paginas: int = PAGINAS_POR_PASSO, pausa: float = PAUSA_ENTRE_PASSOS):
+    """Copia o banco atual para `destino` (arquivo SQLite) via API de backup."""
+    origem = db.conectar()
+    try:
+        # Transação de leitura aberta na origem: em WAL todos os passos leem o
+        # mesmo snapshot, os escritores seguem livres e a cópia não é reiniciada
+        # a cada escrita de outra conexão.
+        origem.execute("BEGIN")
+        origem.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        alvo = sqlite3.connect(destino)
+        try:
+            origem.backup(alvo, pages=paginas, sleep=pausa)
+        finally:
+            alvo.close()
+            origem.rollback()
+    finally:
+        origem.close()
+
+
+def _comprimir(origem: str, destino: str, compressao: Optional[str]):
+    if compressao is None:
+        shutil.move(origem, destino)
+        return
+    with open(origem, "rb") as entrada:
+        if compressao == "gzip":
+            with gzip.open(destino, "wb", compresslevel=6) as saida:
+                shutil.copyfileobj(entrada, saida, TAMANHO_BLOCO)
+        elif compressao == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Compressão zstd requer o pacote 'zstandard'.")
+            with open(destino, "wb") as bruto:
+                zstandard.ZstdCompressor(level=3).copy_stream(entrada, bruto, read_size=TAMANHO_BLOCO)
+        else:
+            raise ValueError(f"Compressão desconhecida: {compressao}")
+    os.remove(origem)
+
+
+def gerar_backup(destino: Optional[str] = None, compressao: Optional[str] = "gzip") -> str:
+    """
+    Gera um backup consistente do banco e retorna o caminho do arquivo.
+    Sem `destino`, cria um arquivo temporário (quem chamou deve apagá-lo).
+    """
+    if compressao not in EXTENSOES:
+        raise ValueError(f"Compressão desconhecida: {compressao}")
+    if destino is None:
+        fd, destino = tempfile.mkstemp(prefix="financas_", suffix=EXTENSOES[compressao])
+        os.close(fd)
+
+    fd, copia = tempfile.mkstemp(prefix=".copia_", suffix=".tmp", dir=os.path.dirname(os.path.abspath(destino)))
+    os.close(fd)
+    try:
+        copiar_banco(copia)
+        _comprimir(copia, destino, compressao)
+    finally:
+        if os.path.exists(copia):
+            os.remove(copia)
+    return destino
+
+
+# ---------------- BACKUP AGENDADO ----------------
+
+def aplicar_retencao(diretorio: str = BACKUP_DIR, manter: int = BACKUP_RETENCAO) -> list:
+    """Mantém os `manter` backups mais recentes do diretório; retorna os removidos."""
+    arquivos = sorted(glob.glob(os.path.join(diretorio, "financas_*.db*")), key=os.path.getmtime, reverse=True)
+    removidos = arquivos[manter:]
+    for caminho in removidos:
+        os.remove(caminho)
+    return removidos
+
+
+def backup_local(diretorio: str = BACKUP_DIR, compressao: Optional[str] = BACKUP_COMPRESSAO,
+                 manter: int = BACKUP_RETENCAO) -> str:
+    os.makedirs(diretorio, exist_ok=True)
+    nome = f"financas_{datetime.now().strftime('%Y%m%d_%H%M%S')}{EXTENSOES[compressao]}"
+    caminho = gerar_backup(os.path.join(diretorio, nome), compressao)
+    removidos = aplicar_retencao(diretorio, manter)
+    logger.info("backup gerado: %s (%d antigo(s) removido(s))", caminho, len(removidos))
+    return caminho
+
+
+class BackupAgendado(threading.Thread):
+    """Thread daemon que gera um backup local a cada `intervalo_min` minutos."""
+
+    def __init__(self, intervalo_min: float = BACKUP_INTERVALO_MIN, diretorio: str = BACKUP_DIR,
+                 compressao: Optional[str] = BACKUP_COMPRESSAO, manter: int = BACKUP_RETENCAO):
+        super().__init__(name="backup-agendado", daemon=True)
+        self.intervalo = intervalo_min * 60
+        self.diretorio = diretorio
+        self.compressao = compressao
+        self.manter = manter
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                backup_local(self.diretorio, self.compressao, self.manter)
+            except Exception:
+                logger.exception("falha no backup agendado")
+
+    def parar(self):
+        self._parar.set()
+
+
+_agendador: Optional[BackupAgendado] = None
+_agendador_lock = threading.Lock()
+
+
+def iniciar_backup_agendado() -> Optional[BackupAgendado]:
+    """Inicia o agendador uma vez por processo, se BACKUP_INTERVALO_MIN > 0."""
+    global _agendador
+    if BACKUP_INTERVALO_MIN <= 0:
+        return None
+    with _agendador_lock:
+        if _agendador is None or not _agendador.is_alive():
+            _agendador = BackupAgendado()
+            _agendador.start()
+    return _agendador
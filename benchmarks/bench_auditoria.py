@@ -0,0 +1,139 @@
+"""
+log_audit síncrono vs. fila assíncrona, e verificação das garantias de
+durabilidade documentadas em db.py (seção AUDITORIA):
+
+  1. tudo o que foi aceito está no banco após descarregar_auditoria(), na ordem;
+  2. created_at é o instante da chamada, não o da gravação;
+  3. fila cheia aplica backpressure e cai para gravação síncrona sem perder
+     nem reordenar eventos;
+  4. um processo que termina normalmente sem descarregar grava a fila no atexit.
+
+    python benchmarks/bench_auditoria.py [--eventos 20000]
+
+Roda num banco temporário. Sai com código 1 se alguma garantia falhar.
+As mesmas garantias são verificadas em tests/test_auditoria.py.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import db  # noqa: E402
+
+
+class GravadorTravado(db.GravadorAuditoria):
+    """Só começa a consumir a fila depois de `liberar`."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.liberar = threading.Event()
+
+    def run(self):
+        self.liberar.wait()
+        super().run()
+
+
+def contar(tipo: str) -> int:
+    with db.conexao() as conn:
+        return conn.execute("SELECT COUNT(1) FROM audit_logs WHERE event_type = ?", (tipo,)).fetchone()[0]
+
+
+def medir(eventos: int, tipo: str) -> float:
+    t0 = time.perf_counter()
+    for i in range(eventos):
+        db.log_audit(tipo, 1, 2, f"evento {i}")
+    return (time.perf_counter() - t0) / eventos * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eventos", type=int, default=20_000)
+    args = parser.parse_args(argv)
+    falhas = []
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db.DB_NAME = os.path.join(pasta, "bench.db")
+        db.migrar()
+
+        db.AUDIT_ASSINCRONO = False
+        us_sinc = medir(args.eventos // 10, "sinc")
+        db.AUDIT_ASSINCRONO = True
+
+        us_assinc = medir(args.eventos, "assinc")
+        t0 = time.perf_counter()
+        db.descarregar_auditoria(timeout=60)
+        descarga_ms = (time.perf_counter() - t0) * 1000
+        print(f"log_audit síncrono     {us_sinc:8.1f} µs/evento")
+        print(f"log_audit assíncrono   {us_assinc:8.1f} µs/evento  (+{descarga_ms:.0f} ms para descarregar)")
+        print(f"estatísticas           {db.estatisticas_auditoria()}")
+
+        # 1. tudo gravado e em ordem
+        with db.conexao() as conn:
+            detalhes = [r[0] for r in conn.execute(
+                "SELECT details FROM audit_logs WHERE event_type = 'assinc' ORDER BY id")]
+        if detalhes != [f"evento {i}" for i in range(args.eventos)]:
+            falhas.append(f"1: {len(detalhes)} de {args.eventos} eventos, ou fora de ordem")
+
+        # 2. created_at da chamada: evento enfileirado com a thread parada
+        db.parar_auditoria()
+        gravador = db._obter_gravador()
+        antes = db._agora_utc()
+        db.log_audit("instante", None, None, None)
+        depois = db._agora_utc()
+        time.sleep(1.5)
+        db.descarregar_auditoria()
+        with db.conexao() as conn:
+            criado = conn.execute("SELECT created_at FROM audit_logs WHERE event_type = 'instante'").fetchone()[0]
+        if not antes <= criado <= depois:
+            falhas.append(f"2: created_at {criado} fora do instante da chamada ({antes} .. {depois})")
+
+        # 3. backpressure: fila de 10 que ninguém consome, espera curta -> a
+        # cada 11ª chamada quem chamou grava a fila e o evento, em ordem
+        gravador.parar()
+        travado = GravadorTravado(tamanho_fila=10, espera_max=0.01)
+        travado.start()
+        db._gravador = travado
+        for i in range(50):
+            db.log_audit("cheia", None, None, str(i))
+        if travado.sincronos != 4:
+            falhas.append(f"3: esperado 4 gravações síncronas, houve {travado.sincronos}")
+        travado.liberar.set()
+        db.descarregar_auditoria()
+        with db.conexao() as conn:
+            cheia = [r[0] for r in conn.execute("SELECT details FROM audit_logs WHERE event_type = 'cheia' ORDER BY id")]
+        if cheia != [str(i) for i in range(50)]:
+            falhas.append(f"3: {len(cheia)} de 50 eventos com a fila cheia, ou fora de ordem")
+        db.parar_auditoria()
+        db.fechar_conexoes()
+
+        # 4. atexit: processo novo enfileira e sai sem descarregar
+        script = textwrap.dedent(f"""
+            import sys
+            sys.path.insert(0, {RAIZ!r})
+            import db
+            db.DB_NAME = {db.DB_NAME!r}
+            for i in range(1000):
+                db.log_audit("saida", None, None, str(i))
+        """)
+        # intervalo longo: sem o atexit nada seria gravado antes da saída
+        env = dict(os.environ, AUDIT_INTERVALO_S="60")
+        subprocess.run([sys.executable, "-c", script], check=True, cwd=RAIZ, env=env)
+        if contar("saida") != 1000:
+            falhas.append(f"4: {contar('saida')} de 1000 eventos gravados no atexit")
+        db.fechar_conexoes()
+
+    for falha in falhas:
+        print(f"FALHA {falha}")
+    print("garantias ok" if not falhas else "")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+Busca textual em rendas/gastos (db.buscar_lancamentos, FTS5) com milhões de
+lançamentos de muitos usuários: latência da busca vs. carregar o histórico
+do usuário e filtrar em pandas (o que a aba Registros permitia), custo dos
+triggers na escrita, e verificação de que
+
+  1. o resultado é o mesmo de uma busca por prefixo de palavra em Python
+     (sem maiúsculas/acentos), só com lançamentos do próprio usuário;
+  2. inserções, edições, exclusões e troca de usuário mantêm o índice em dia
+     (e o integrity-check do FTS5 passa);
+  3. a paginação cobre o total sem repetir lançamentos.
+
+    python benchmarks/bench_busca.py [--lancamentos 2000000] [--usuarios 100000]
+
+Roda num banco temporário. Sai com código 1 se alguma verificação falhar.
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import unicodedata
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import db  # noqa: E402
+
+PALAVRAS = ["Mercado", "Padaria", "Farmácia", "Uber", "iFood", "Aluguel", "Luz", "Água", "Internet",
+            "Netflix", "Spotify", "Posto", "Gasolina", "Restaurante", "Café", "Academia", "Escola",
+            "Livraria", "Cinema", "Presente", "São João", "Pão de Açúcar", "Salário", "Freelance"]
+CATEGORIAS = ["Alimentação", "Transporte", "Moradia", "Lazer", "Saúde", "Educação"]
+BUSCAS = ["mercado", "merc", "cafe", "pao acucar", "saude", "sao jo", "net", "alim farm", "xyz"]
+
+
+def _caso(expr: str, valores: list) -> str:
+    casos = " ".join(f"WHEN {i} THEN '{v}'" for i, v in enumerate(valores))
+    return f"CASE {expr} % {len(valores)} {casos} END"
+
+
+def popular(lancamentos: int, usuarios: int):
+    """3/4 gastos, 1/4 rendas; descrições como 'Mercado-Café 123' ou 'Posto/Uber (12)'."""
+    desc = (f"{_caso('(i * 7)', PALAVRAS)} || CASE i % 3 WHEN 0 THEN '-' WHEN 1 THEN ' / ' ELSE ' ' END || "
+            f"{_caso('(i * 13 / 5)', PALAVRAS)} || ' ' || (i % 997)")
+    with db.conexao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            f"""
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO gastos (id_usuario, id_classificacao, categoria, descricao, valor_centavos, mes, ano)
+            SELECT (i * 7919) % ?, 1 + i % 4, {_caso('i', CATEGORIAS)}, {desc}, i % 50000, 1 + i % 12, 2020 + i % 5
+            FROM n
+            """,
+            (lancamentos * 3 // 4, usuarios),
+        )
+        conn.execute(
+            f"""
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO rendas (id_usuario, descricao, valor_centavos, mes, ano)
+            SELECT (i * 7919) % ?, {desc}, i % 900000, 1 + i % 12, 2020 + i % 5
+            FROM n
+            """,
+            (lancamentos // 4, usuarios),
+        )
+
+
+def palavras_de(texto) -> list:
+    if not isinstance(texto, str):
+        return []
+    sem_acento = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    return re.findall(r"[^\W_]+", sem_acento.lower())
+
+
+def referencia(id_usuario: int, busca: str) -> set:
+    """(tipo, id) que casam, carregando o histórico do usuário e comparando em Python."""
+    termos = palavras_de(busca)
+    achados = set()
+    for tipo, df in (("gastos", db.carregar_gastos(id_usuario)), ("rendas", db.carregar_rendas(id_usuario))):
+        for linha in df.itertuples():
+            palavras = palavras_de(linha.descricao) + palavras_de(getattr(linha, "categoria", None))
+            if termos and all(any(p.startswith(t) for p in palavras) for t in termos):
+                achados.add((tipo, linha.id))
+    return achados
+
+
+def obtido(id_usuario: int, busca: str) -> set:
+    df, _ = db.buscar_lancamentos(id_usuario, busca, limite=1_000_000)
+    return set(zip(df["tipo"], df["id"]))
+
+
+def ms(fn) -> float:
+    inicio = time.perf_counter()
+    fn()
+    return (time.perf_counter() - inicio) * 1000
+
+
+def consulta_indice(id_usuario: int, busca: str):
+    """Só o FTS5: total e os 20 melhores rowids de cada tabela, sem montar DataFrame."""
+    consulta = db._consulta_fts(id_usuario, busca)
+    with db.conexao() as conn:
+        for tabela in ("gastos", "rendas"):
+            conn.execute(f"SELECT COUNT(1) FROM {tabela}_fts WHERE {tabela}_fts MATCH ?", (consulta,)).fetchone()
+            conn.execute(f"SELECT rowid FROM {tabela}_fts WHERE {tabela}_fts MATCH ? ORDER BY rank LIMIT 20",
+                         (consulta,)).fetchall()
+
+
+def busca_pandas(id_usuario: int, termo: str):
+    gastos = db.carregar_gastos(id_usuario)
+    return gastos[gastos["descricao"].str.contains(termo, case=False, regex=False)]
+
+
+def integro() -> bool:
+    try:
+        with db.conexao() as conn:
+            for tabela in ("gastos", "rendas"):
+                conn.execute(f"INSERT INTO {tabela}_fts ({tabela}_fts) VALUES ('integrity-check')")
+        return True
+    except Exception as e:
+        print(f"  integrity-check: {e}")
+        return False
+
+
+def medir_escrita(pasta: str, com_busca: bool, linhas: int = 20000) -> float:
+    """Tempo (s) de `linhas` inserts de gastos em lotes de 500, com ou sem os triggers de busca (e a indexação)."""
+    db.DB_NAME = os.path.join(pasta, f"escrita_{com_busca}.db")
+    db.migrar(forcar=True)
+    if not com_busca:
+        with db.conexao() as conn:
+            for trigger in ("ins", "del", "upd"):
+                conn.execute(f"DROP TRIGGER trg_gastos_busca_{trigger}")
+    dados = [(i % 100, 1, "Lazer", f"Cinema / Pipoca {i}", i, 1 + i % 12, 2024) for i in range(linhas)]
+    inicio = time.perf_counter()
+    for k in range(0, linhas, 500):
+        with db.conexao() as conn:
+            conn.executemany(
+                "INSERT INTO gastos (id_usuario, id_classificacao, categoria, descricao, valor_centavos, mes, ano) "
+                "VALUES (?,?,?,?,?,?,?)", dados[k:k + 500],
+            )
+    if com_busca:
+        db.indexar_busca_pendente()  # os triggers só anotam; indexar faz parte do custo
+    segundos = time.perf_counter() - inicio
+    db.fechar_conexoes()
+    return segundos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lancamentos", type=int, default=2_000_000)
+    parser.add_argument("--usuarios", type=int, default=100_000)
+    args = parser.parse_args(argv)
+    falhas = []
+    aleatorio = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        sem, com = medir_escrita(pasta, False), medir_escrita(pasta, True)
+        print(f"20.000 inserts de gastos: {sem * 1000:.0f} ms sem índice de busca, {com * 1000:.0f} ms com "
+              f"({(com / sem - 1) * 100:+.0f}%)")
+
+        db.DB_NAME = os.path.join(pasta, "bench.db")
+        db.migrar(forcar=True)
+        inicio = time.perf_counter()
+        popular(args.lancamentos, args.usuarios)
+        print(f"{args.lancamentos:,} lançamentos de {args.usuarios:,} usuários inseridos (com índice) em "
+              f"{time.perf_counter() - inicio:.1f} s; banco com {os.path.getsize(db.DB_NAME) / 2**20:.0f} MB")
+        inicio = time.perf_counter()
+        db.reconstruir_indice_busca()
+        print(f"reconstruir_indice_busca: {time.perf_counter() - inicio:.1f} s")
+
+        usuarios = [aleatorio.randrange(1, args.usuarios) for _ in range(200)]
+        print("  busca         índice p50  p99       buscar_lancamentos p50  p99     histórico + pandas p50")
+        for busca in BUSCAS:
+            indice = sorted(ms(lambda: consulta_indice(u, busca)) for u in usuarios)
+            api = sorted(ms(lambda: db.buscar_lancamentos(u, busca, limite=20)) for u in usuarios)
+            pandas_ms = statistics.median(ms(lambda: busca_pandas(u, busca)) for u in usuarios[:20])
+            p99 = int(len(usuarios) * 0.99) - 1
+            print(f"  {busca:<12} {statistics.median(indice):7.3f} ms {indice[p99]:7.3f} ms   "
+                  f"{statistics.median(api):7.3f} ms {api[p99]:7.3f} ms   {pandas_ms:7.2f} ms")
+            if statistics.median(indice) >= 1:
+                falhas.append(f"latência: '{busca}' no índice com mediana {statistics.median(indice):.2f} ms "
+                              f"(alvo < 1 ms)")
+
+        # 1. igual à referência em Python
+        for u in usuarios[:30]:
+            for busca in BUSCAS:
+                if obtido(u, busca) != referencia(u, busca):
+                    falhas.append(f"1: usuário {u}, busca '{busca}' difere da referência")
+
+        # 2. escritas mantêm o índice
+        u, outro = usuarios[0], usuarios[1]
+        db.inserir_gasto(u, 1, "Viagem", "Hotel Fazenda-Paraíso", 900, 7, 2024)
+        db.inserir_renda(u, "Reembolso (hotel)", 100, 7, 2024)
+        with db.conexao() as conn:
+            id_gasto = conn.execute("SELECT MAX(id) FROM gastos").fetchone()[0]
+        if len(obtido(u, "hotel")) != 2 or obtido(u, "paraiso") != {("gastos", id_gasto)}:
+            falhas.append("2: inserção não apareceu na busca")
+        db.atualizar_gasto(id_gasto, "Pousada", 900)
+        if obtido(u, "paraiso") or obtido(u, "pousada") != {("gastos", id_gasto)}:
+            falhas.append("2: edição não atualizou o índice")
+        with db.conexao() as conn:
+            conn.execute("UPDATE gastos SET id_usuario = ? WHERE id = ?", (outro, id_gasto))
+        if obtido(u, "pousada") or obtido(outro, "pousada") != {("gastos", id_gasto)}:
+            falhas.append("2: troca de usuário não atualizou o índice")
+        db.excluir_gasto(id_gasto)
+        if obtido(outro, "pousada"):
+            falhas.append("2: exclusão não saiu do índice")
+        for u in usuarios[2:12]:
+            alvo = db.carregar_gastos(u)
+            if not alvo.empty:
+                editado = alvo.drop(index=alvo.index[0]).assign(descricao="Editado em lote")
+                db.aplicar_alteracoes_gastos(u, alvo, editado)
+                if len(obtido(u, "editado lote")) != len(alvo) - 1:
+                    falhas.append(f"2: edição em lote do usuário {u} não refletiu no índice")
+        if not integro():
+            falhas.append("2: integrity-check do FTS5 falhou")
+
+        # 3. paginação
+        u, busca = max(usuarios, key=lambda x: db.buscar_lancamentos(x, "a")[1]), "a"
+        _, total = db.buscar_lancamentos(u, busca)
+        vistos = []
+        for offset in range(0, total, 7):
+            pagina, _ = db.buscar_lancamentos(u, busca, limite=7, offset=offset)
+            vistos += list(zip(pagina["tipo"], pagina["id"]))
+        if len(vistos) != total or len(set(vistos)) != total:
+            falhas.append(f"3: paginação trouxe {len(vistos)} ({len(set(vistos))} distintos) de {total}")
+        db.fechar_conexoes()
+
+    for falha in falhas:
+        print(f"FALHA {falha}")
+    print("verificações ok" if not falhas else "")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Valores em centavos inteiros vs. REAL: exatidão das somas e memória do
+DataFrame carregado (carregar_gastos) antes e depois dos tipos compactos,
+em escala. As verificações de exatidão e de tipos/memória ficam em
+tests/test_centavos.py; aqui só os números.
+
+    python benchmarks/bench_centavos.py [--linhas 1000000]
+
+Roda num banco temporário; o financas.db não é tocado.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+CATEGORIAS = ["Mercado", "Aluguel", "Luz", "Água", "Internet", "Farmácia", "Padaria", "Combustível"]
+
+
+def popular(linhas: int, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centavos = rng.integers(1, 500_000, size=linhas)
+    with db.conexao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT INTO gastos (id_usuario, id_classificacao, categoria, descricao, valor_centavos, mes, ano) "
+            "VALUES (1, ?, ?, 'lançamento', ?, ?, ?)",
+            zip(
+                rng.integers(1, 7, size=linhas).tolist(),
+                [CATEGORIAS[i] for i in rng.integers(0, len(CATEGORIAS), size=linhas)],
+                centavos.tolist(),
+                rng.integers(1, 13, size=linhas).tolist(),
+                rng.integers(2015, 2027, size=linhas).tolist(),
+            ),
+        )
+    return centavos
+
+
+def como_antes(df: pd.DataFrame) -> pd.DataFrame:
+    """Tipos que carregar_gastos devolvia com valor REAL: float64, Int64 e object."""
+    return df.assign(valor=df["valor_centavos"] / 100).drop(columns="valor_centavos").astype({
+        "id_usuario": "Int64", "id_classificacao": "Int64", "mes": "Int64", "ano": "Int64",
+        "categoria": object,
+    })
+
+
+def mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(index=True, deep=True).sum() / 1024 / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db.DB_NAME = os.path.join(pasta, "bench.db")
+        db.migrar()
+        centavos = popular(args.linhas)
+
+        novo = db.carregar_gastos(1)
+        antigo = como_antes(novo)
+
+        exato = sum(Decimal(int(c)) for c in centavos) / 100
+        soma_float = antigo["valor"].sum()
+        soma_centavos = int(novo["valor_centavos"].sum())
+
+        # soma acumulada de 0,10 em float: o caso clássico de deriva
+        dezenas = pd.Series(np.full(args.linhas, 0.1))
+        db.fechar_conexoes()
+
+    print(f"linhas={args.linhas:,}")
+    print(f"  total exato (Decimal)       {exato}")
+    print(f"  soma de valor_centavos      {Decimal(soma_centavos) / 100}")
+    print(f"  soma de valor float64       {float(soma_float)!r}")
+    print(f"  {args.linhas:,} x 0.10 em float     {float(dezenas.sum())!r}  (em centavos: {10 * args.linhas})")
+    print("  memória por coluna (MB)       antes    depois")
+    for col_antes, col_novo in (
+        ("valor", "valor_centavos"), ("id_classificacao",) * 2, ("mes",) * 2, ("ano",) * 2, ("categoria",) * 2,
+    ):
+        print(f"    {col_novo:<26} {antigo[col_antes].memory_usage(deep=True, index=False) / 2**20:8.1f} "
+              f"{novo[col_novo].memory_usage(deep=True, index=False) / 2**20:8.1f}")
+    print(f"  frame inteiro (MB)          {mb(antigo):8.1f} {mb(novo):8.1f}  (-{1 - mb(novo) / mb(antigo):.0%})")
+
+
+if __name__ == "__main__":
+    main()
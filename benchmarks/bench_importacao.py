@@ -0,0 +1,80 @@
+"""
+Vazão da importação de extratos (importacao.importar_extrato) num banco
+temporário: primeira carga e reimportação (tudo duplicado).
+
+    python benchmarks/bench_importacao.py [--linhas 1000000] [--formato csv|ofx]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import importacao  # noqa: E402
+
+
+DESCRICOES = ["Supermercado", "Padaria", "Posto", "Farmácia", "Aluguel", "Salário", "Pix recebido", "Restaurante"]
+
+
+def gerar_csv(caminho: str, linhas: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    datas = np.datetime64("2015-01-01") + rng.integers(0, 365 * 10, size=linhas)
+    valores = np.round((rng.random(linhas) - 0.8) * 1000, 2)
+    desc = rng.integers(0, len(DESCRICOES), size=linhas)
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("data;descricao;valor\n")
+        for i in range(0, linhas, 100_000):
+            bloco = slice(i, i + 100_000)
+            f.writelines(
+                f"{np.datetime_as_string(d)};{DESCRICOES[k]} {n % 5000};{str(v).replace('.', ',')}\n"
+                for d, k, v, n in zip(datas[bloco], desc[bloco], valores[bloco], range(i, i + 100_000))
+            )
+
+
+def gerar_ofx(caminho: str, linhas: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    valores = np.round((rng.random(linhas) - 0.8) * 1000, 2)
+    with open(caminho, "w", encoding="latin-1") as f:
+        f.write("OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n")
+        for i in range(linhas):
+            f.write(
+                f"<STMTTRN><TRNTYPE>OTHER<DTPOSTED>2020{1 + i % 12:02d}{1 + i % 28:02d}"
+                f"<TRNAMT>{valores[i]}<FITID>{i}<MEMO>{DESCRICOES[i % len(DESCRICOES)]}\n"
+            )
+        f.write("</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--formato", choices=["csv", "ofx"], default="csv")
+    parser.add_argument("--lote", type=int, default=importacao.TAMANHO_LOTE)
+    args = parser.parse_args(argv)
+
+    tmp = tempfile.mkdtemp()
+    db.DB_NAME = os.path.join(tmp, "bench.db")
+    db.migrar()
+
+    arquivo = os.path.join(tmp, f"extrato.{args.formato}")
+    t0 = time.perf_counter()
+    (gerar_csv if args.formato == "csv" else gerar_ofx)(arquivo, args.linhas)
+    print(f"arquivo {args.formato}: {args.linhas:,} linhas, {os.path.getsize(arquivo) / 1e6:.1f} MB "
+          f"(gerado em {time.perf_counter() - t0:.1f}s)")
+
+    opcoes = {"sep": ";", "decimal": ",", "dayfirst": False} if args.formato == "csv" else {}
+    for rodada in ("carga inicial", "reimportação"):
+        t0 = time.perf_counter()
+        total = importacao.importar_extrato(1, arquivo, formato=args.formato, tamanho_lote=args.lote, **opcoes)
+        dt = time.perf_counter() - t0
+        print(f"  {rodada:14s} {dt:7.1f}s  {total['lidas'] / dt:10,.0f} linhas/s  {total}")
+
+    print(f"  resumo_mensal consistente: {db.verificar_resumo_mensal().empty}")
+
+
+if __name__ == "__main__":
+    main()
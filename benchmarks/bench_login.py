@@ -0,0 +1,138 @@
+"""
+Checagem de bloqueio de login: COUNT + INSERT em login_attempts a cada clique
+(caminho antigo) vs. limitador em memória (limite_login.py) com gravação em lote,
+numa tabela já grande (credential stuffing), e verificação de que
+
+  1. o bloqueio por e-mail e por IP acontece na mesma tentativa que antes;
+  2. um processo novo é aquecido pelo banco (restart não zera bloqueio);
+  3. a retenção (retencao.reter) apaga só o que passou do prazo, em lotes.
+
+    python benchmarks/bench_login.py [--historico 1000000] [--tentativas 20000]
+
+Roda num banco temporário. Sai com código 1 se alguma verificação falhar.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import db  # noqa: E402
+import limite_login  # noqa: E402
+import retencao  # noqa: E402
+
+
+def popular(linhas: int, dias: int = 60):
+    """Histórico de falhas nos últimos `dias` dias (em ordem de id, como na prática), e-mails aleatórios."""
+    with db.conexao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            """
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO login_attempts (email, success, ip, attempted_at)
+            SELECT 'u' || (abs(random()) % 200000) || '@x.com', 0,
+                   '10.0.' || (i % 250) || '.' || (i % 200),
+                   datetime('now', '-' || ((? - i) * ? * 86400 / ?) || ' seconds')
+            FROM n
+            """,
+            (linhas, linhas, dias, linhas),
+        )
+
+
+def caminho_antigo(tentativas: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(tentativas):
+        email = f"alvo{i % 1000}@x.com"
+        if db.count_failed_attempts_recent(email, minutes=15) < 5:
+            db.record_login_attempt(email, success=False, ip="10.9.9.9")
+    return (time.perf_counter() - t0) / tentativas * 1e6
+
+
+def caminho_novo(limitador, tentativas: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(tentativas):
+        email = f"alvo{i % 1000}@y.com"
+        if not limitador.espera(email, "10.8.8.8" if i % 2 else None):
+            limitador.registrar(email, "10.8.8.8" if i % 2 else None, sucesso=False)
+    limitador.descarregar()
+    return (time.perf_counter() - t0) / tentativas * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--historico", type=int, default=1_000_000)
+    parser.add_argument("--tentativas", type=int, default=20_000)
+    args = parser.parse_args(argv)
+    falhas = []
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db.DB_NAME = os.path.join(pasta, "bench.db")
+        db.migrar()
+        popular(args.historico)
+
+        us_antigo = caminho_antigo(args.tentativas)
+        limitador = limite_login.LimitadorLogin(max_falhas_ip=10 ** 9)
+        us_novo = caminho_novo(limitador, args.tentativas)
+        print(f"login_attempts com {args.historico:,} linhas, {args.tentativas:,} tentativas")
+        print(f"  COUNT + INSERT por tentativa   {us_antigo:8.1f} µs")
+        print(f"  limitador em memória + lote    {us_novo:8.1f} µs")
+        print(f"  {limitador.stats()}")
+
+        # 1. mesma tentativa bloqueada: 5 falhas liberam, a 6ª é barrada; IP com limite próprio
+        lim = limite_login.LimitadorLogin(max_falhas=5, max_falhas_ip=8, janela_min=15, persistir=False)
+        agora = 1_000_000.0
+        barradas = []
+        for i in range(7):
+            if lim.espera("Vitima@X.com ", None, agora + i):
+                barradas.append(i)
+            else:
+                lim.registrar("vitima@x.com", None, sucesso=False, agora=agora + i)
+        if barradas != [5, 6]:
+            falhas.append(f"1: e-mail barrado nas tentativas {barradas}, esperado [5, 6]")
+        if lim.espera("vitima@x.com", None, agora + 15 * 60 + 1) != 0:
+            falhas.append("1: bloqueio não expirou após a janela")
+        for i in range(8):
+            lim.registrar(f"outro{i}@x.com", "1.2.3.4", sucesso=False, agora=agora)
+        if not lim.espera("novo@x.com", "1.2.3.4", agora) or lim.espera("novo@x.com", "5.6.7.8", agora):
+            falhas.append("1: limite por IP não isolou o IP atacante")
+        lim.registrar("outro0@x.com", "1.2.3.4", sucesso=True, agora=agora)
+        if lim.por_email.bloqueado_ate("outro0@x.com", agora) or not lim.espera("x@x.com", "1.2.3.4", agora):
+            falhas.append("1: sucesso deveria limpar só o e-mail, não o IP")
+
+        # 2. aquecimento: falhas gravadas agora bloqueiam num limitador novo
+        gravador = limite_login.LimitadorLogin()
+        for _ in range(5):
+            gravador.registrar("reinicio@x.com", "7.7.7.7", sucesso=False)
+        gravador.descarregar()
+        novo = limite_login.LimitadorLogin()
+        carregadas = novo.aquecer()
+        if not novo.espera("reinicio@x.com"):
+            falhas.append("2: limitador aquecido não bloqueou o e-mail")
+        print(f"  aquecimento: {carregadas:,} falha(s) da janela carregadas")
+
+        # 3. poda: nada com menos de 30 dias some
+        with db.conexao() as conn:
+            recentes = conn.execute(
+                "SELECT COUNT(1) FROM login_attempts WHERE attempted_at >= datetime('now', '-29 days')").fetchone()[0]
+        t0 = time.perf_counter()
+        apagadas = retencao.reter("login_attempts", 30, destino="nenhum")["linhas"]
+        poda_ms = (time.perf_counter() - t0) * 1000
+        with db.conexao() as conn:
+            restantes, antigas = conn.execute(
+                "SELECT COUNT(1), SUM(attempted_at < datetime('now', '-30 days')) FROM login_attempts").fetchone()
+        print(f"  poda: {apagadas:,} apagada(s) em {poda_ms:.0f} ms, {restantes:,} restante(s)")
+        if antigas or restantes < recentes:
+            falhas.append(f"3: poda deixou {antigas} antiga(s) ou apagou recentes ({restantes} < {recentes})")
+        db.fechar_conexoes()
+
+    for falha in falhas:
+        print(f"FALHA {falha}")
+    print("verificações ok" if not falhas else "")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Benchmark da normalização de carga (db.normalizar_df) contra a implementação
+anterior (astype(str) + replace + .apply(converter_ano) por linha).
+
+    python benchmarks/bench_normalizacao.py [--linhas 1000000] [--pct-blob 0.1]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import normalizar_df  # noqa: E402
+
+
+# ---------------- implementação anterior (referência) ----------------
+
+def _converter_ano_legado(valor):
+    if pd.isna(valor):
+        return pd.NA
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        try:
+            return int.from_bytes(bytes(valor), byteorder="little", signed=False)
+        except Exception:
+            pass
+    try:
+        return int(valor)
+    except Exception:
+        try:
+            return int(float(valor))
+        except Exception:
+            return pd.NA
+
+
+def _normalizar_int_legado(df, colunas):
+    for col in colunas:
+        if col in df.columns:
+            df[col] = (
+                df[col]
+                .astype(str)
+                .str.replace(".0", "", regex=False)
+                .replace("nan", pd.NA)
+                .astype("Int64")
+            )
+        return df
+
+
+def _normalizar_legado(df):
+    # mesma sequência que carregar_gastos fazia antes
+    df = _normalizar_int_legado(df, ["mes", "ano", "id_usuario"])
+    df["mes"] = pd.to_numeric(df["mes"], errors="coerce").astype("Int64")
+    df["ano"] = df["ano"].apply(_converter_ano_legado).astype("Int64")
+    df["valor"] = pd.to_numeric(df["valor"], errors="coerce").astype(float)
+    return df
+
+
+# ---------------- dados ----------------
+
+def gerar_frame(linhas: int, pct_blob: float, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    anos = rng.integers(2015, 2027, size=linhas)
+    ano_col = anos.astype(object)
+    blobs = rng.random(linhas) < pct_blob
+    ano_col[blobs] = [int(a).to_bytes(8, "little") for a in anos[blobs]]
+    return pd.DataFrame({
+        "id": np.arange(linhas),
+        "id_usuario": rng.integers(1, 1000, size=linhas),
+        "id_classificacao": rng.integers(1, 7, size=linhas),
+        "valor": rng.random(linhas) * 1000,
+        "mes": rng.integers(1, 13, size=linhas),
+        "ano": ano_col,
+    })
+
+
+def medir(func, df, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        copia = df.copy()
+        t0 = time.perf_counter()
+        func(copia)
+        tempos.append(time.perf_counter() - t0)
+    return min(tempos)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--pct-blob", type=float, default=0.1)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    df = gerar_frame(args.linhas, args.pct_blob)
+
+    esperado = _normalizar_legado(df.copy())
+    obtido = normalizar_df(df.copy())
+    for col in ("mes", "ano", "id_usuario"):
+        # id_usuario agora também vira Int64 (antes ficava int64 pelo bug do return);
+        # mes/ano saem como Int8/Int16 desde a migração para centavos
+        pd.testing.assert_series_equal(esperado[col], obtido[col], check_dtype=False)
+
+    t_legado = medir(_normalizar_legado, df, args.repeticoes)
+    t_novo = medir(normalizar_df, df, args.repeticoes)
+    t_int = medir(normalizar_df, df.assign(ano=pd.to_numeric(df["ano"], errors="coerce").fillna(2020).astype("int64")), args.repeticoes)
+
+    print(f"linhas={args.linhas:,} blobs={args.pct_blob:.0%}")
+    print(f"  legado (str + apply)      {t_legado * 1000:9.1f} ms")
+    print(f"  vetorizado                {t_novo * 1000:9.1f} ms  ({t_legado / t_novo:.1f}x)")
+    print(f"  vetorizado, sem BLOB      {t_int * 1000:9.1f} ms  ({t_legado / t_int:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Navegação na auditoria: LIMIT/OFFSET vs. paginação por chave (created_at, id)
+em páginas profundas, filtros no SQL, e exportação em lotes. Verifica que
+
+  1. as páginas por chave, concatenadas, são exatamente a ordem do OFFSET
+     (inclusive com muitos eventos no mesmo segundo);
+  2. os filtros (tipo, ator, alvo, período) batem com o filtro em pandas;
+  3. a exportação CSV/Parquet traz todas as linhas com pico de memória
+     limitado a poucos lotes.
+
+    python benchmarks/bench_paginacao_auditoria.py [--eventos 1000000]
+
+Roda num banco temporário. Sai com código 1 se alguma verificação falhar.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import db  # noqa: E402
+import exportacao  # noqa: E402
+
+TIPOS = ["login_success", "login_failed", "user_created_self", "password_changed", "user_deleted"]
+
+
+def popular(eventos: int):
+    """~50 eventos por segundo ao longo dos últimos dias: muitos empates em created_at."""
+    with db.conexao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            f"""
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO audit_logs (event_type, actor_id, target_id, details, created_at)
+            SELECT CASE i % 5 {' '.join(f"WHEN {k} THEN '{t}'" for k, t in enumerate(TIPOS))} END,
+                   i % 1000, (i * 7) % 5000, 'evento ' || i,
+                   datetime('now', '-' || ((? - i) / 50) || ' seconds')
+            FROM n
+            """,
+            (eventos, eventos),
+        )
+
+
+def medir(fn, repeticoes: int = 5) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        fn()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor * 1000
+
+
+def pagina_offset(limite: int, offset: int) -> pd.DataFrame:
+    with db.conexao() as conn:
+        return pd.read_sql(
+            "SELECT * FROM audit_logs ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            conn, params=(limite, offset),
+        )
+
+
+def cursor_da_pagina(limite: int, pagina: int):
+    cursor = None
+    for _ in range(pagina):
+        _, cursor = db.paginar_audit_logs(limite, cursor)
+    return cursor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eventos", type=int, default=1_000_000)
+    parser.add_argument("--por-pagina", type=int, default=100)
+    args = parser.parse_args(argv)
+    falhas = []
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db.DB_NAME = os.path.join(pasta, "bench.db")
+        db.migrar()
+        popular(args.eventos)
+        limite = args.por_pagina
+
+        print(f"audit_logs com {args.eventos:,} eventos, {limite} por página")
+        print("  página          OFFSET    por chave")
+        for pagina in (1, 100, args.eventos // limite // 2, args.eventos // limite - 1):
+            cursor = cursor_da_pagina(limite, pagina - 1) if pagina < 200 else None
+            if cursor is None and pagina > 1:
+                # cursor de uma página profunda: a última linha da página anterior
+                ultima = pagina_offset(1, (pagina - 1) * limite - 1).iloc[0]
+                cursor = (ultima["created_at"], int(ultima["id"]))
+            ms_offset = medir(lambda: pagina_offset(limite, (pagina - 1) * limite))
+            ms_chave = medir(lambda: db.paginar_audit_logs(limite, cursor))
+            print(f"  {pagina:>8,}  {ms_offset:9.1f} ms {ms_chave:9.1f} ms")
+
+        filtros = {"event_type": ["user_deleted", "password_changed"], "actor_id": 42}
+        ms_filtro = medir(lambda: db.paginar_audit_logs(limite, **filtros))
+        print(f"  tipo + ator, primeira página      {ms_filtro:9.1f} ms")
+
+        # 1. ordem idêntica à do OFFSET nas primeiras 30 páginas
+        paginas, cursor = [], None
+        for _ in range(30):
+            df, cursor = db.paginar_audit_logs(limite, cursor)
+            paginas.append(df)
+        por_chave = pd.concat(paginas, ignore_index=True)
+        if not por_chave.equals(pagina_offset(30 * limite, 0)):
+            falhas.append("1: páginas por chave diferem de LIMIT/OFFSET")
+
+        # 2. filtros no SQL == filtro em pandas
+        with db.conexao() as conn:
+            tudo = pd.read_sql("SELECT * FROM audit_logs", conn)
+        inicio = tudo["created_at"].quantile(0.3, interpolation="lower")
+        fim = tudo["created_at"].quantile(0.6, interpolation="lower")
+        casos = [
+            {"event_type": "login_failed"},
+            {"event_type": ["user_deleted", "password_changed"], "actor_id": 42},
+            {"target_id": 35},
+            {"inicio": inicio, "fim": fim, "actor_id": 7},
+        ]
+        for caso in casos:
+            esperado = tudo
+            if "event_type" in caso:
+                tipos = [caso["event_type"]] if isinstance(caso["event_type"], str) else caso["event_type"]
+                esperado = esperado[esperado["event_type"].isin(tipos)]
+            for chave, coluna in (("actor_id", "actor_id"), ("target_id", "target_id")):
+                if chave in caso:
+                    esperado = esperado[esperado[coluna] == caso[chave]]
+            if "inicio" in caso:
+                esperado = esperado[(esperado["created_at"] >= caso["inicio"]) & (esperado["created_at"] <= caso["fim"])]
+            obtido = pd.concat([pd.DataFrame(l, columns=db.COLUNAS_AUDITORIA) for l in db.iterar_audit_logs(**caso)]
+                               or [pd.DataFrame(columns=db.COLUNAS_AUDITORIA)])
+            if sorted(obtido["id"]) != sorted(esperado["id"]):
+                falhas.append(f"2: filtro {caso}: {len(obtido)} linha(s), esperado {len(esperado)}")
+        total_mb = tudo.memory_usage(deep=True).sum() / 2**20
+        del tudo
+
+        # 3. exportação em lotes
+        for formato in ("csv", "parquet"):
+            destino = os.path.join(pasta, f"audit.{formato}")
+            inicio_t = time.perf_counter()
+            exportacao.exportar_auditoria(destino, formato)
+            segundos = time.perf_counter() - inicio_t
+            # segunda passada só para o pico (tracemalloc deixa tudo bem mais lento)
+            tracemalloc.start()
+            linhas = exportacao.exportar_auditoria(destino, formato)
+            pico = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+            lidas = (sum(1 for _ in open(destino, encoding="utf-8")) - 1 if formato == "csv"
+                     else pq.ParquetFile(destino).metadata.num_rows)
+            print(f"  exportar {formato:<8} {linhas:,} linhas em {segundos:5.1f} s, pico {pico:6.1f} MB "
+                  f"(DataFrame inteiro: {total_mb:.0f} MB), arquivo {os.path.getsize(destino) / 2**20:.1f} MB")
+            if linhas != args.eventos or lidas != args.eventos:
+                falhas.append(f"3: {formato} com {lidas} linha(s), esperado {args.eventos}")
+            if pico > total_mb / 2:
+                falhas.append(f"3: pico de memória do {formato} ({pico:.0f} MB) perto do DataFrame inteiro")
+        db.fechar_conexoes()
+
+    for falha in falhas:
+        print(f"FALHA {falha}")
+    print("verificações ok" if not falhas else "")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
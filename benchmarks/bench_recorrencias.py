@@ -0,0 +1,194 @@
+"""
+Materialização de recorrências (recorrencias.materializar) para muitos
+usuários: N usuários com um salário (renda) e alguns custos fixos (CFE)
+recorrentes, 12 meses gerados de uma vez, comparado a um inserir_* por
+lançamento (como os formulários do app.py). Mede também a latência de um
+escritor concorrente e verifica que
+
+  1. cada (regra, mês) gera exatamente um lançamento, com os totais certos
+     em resumo_mensal;
+  2. rodar de novo, ou com os cursores das regras voltados ao início, não
+     insere nada;
+  3. um lote que falha no meio não deixa nada pela metade: a próxima
+     execução completa exatamente o que faltava;
+  4. a virada do mês gera só o mês novo.
+
+    python benchmarks/bench_recorrencias.py [--usuarios 100000] [--gastos 2] [--meses 12]
+
+Roda num banco temporário. Sai com código 1 se alguma verificação falhar.
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import db  # noqa: E402
+import recorrencias  # noqa: E402
+
+CUSTOS_FIXOS = ["Aluguel", "Condomínio", "Internet", "Plano de saúde", "Escola"]
+
+
+def popular(usuarios: int, gastos: int, inicio: int):
+    """Usuários 2..N+1, cada um com um salário e `gastos` custos fixos recorrentes desde `inicio`."""
+    with db.conexao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            """
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO usuarios (nome, email, senha, is_admin) SELECT 'Usuário ' || i, 'u' || i || '@x.com', 'x', 0 FROM n
+            """,
+            (usuarios,),
+        )
+        conn.execute(
+            """
+            INSERT INTO recorrencias (id_usuario, tipo, descricao, valor_centavos, inicio_periodo, proximo_periodo)
+            SELECT id_usuario, 'rendas', 'Salário', 300000 + id_usuario % 700000, ?, ? FROM usuarios WHERE is_admin = 0
+            """,
+            (inicio, inicio),
+        )
+        for k in range(gastos):
+            conn.execute(
+                """
+                INSERT INTO recorrencias (id_usuario, tipo, id_classificacao, categoria, descricao, valor_centavos,
+                                          inicio_periodo, proximo_periodo)
+                SELECT id_usuario, 'gastos', 1, 'Moradia', ?, 5000 + (id_usuario * 37 + ?) % 200000, ?, ?
+                FROM usuarios WHERE is_admin = 0
+                """,
+                (CUSTOS_FIXOS[k % len(CUSTOS_FIXOS)], k, inicio, inicio),
+            )
+
+
+def escritor(parar: threading.Event, latencias: list):
+    """Um lançamento manual por vez (outro usuário no app), medindo a espera pelo lock."""
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        db.inserir_gasto(1, 6, "Lazer", "Cinema", 30, 1, 2020)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        time.sleep(0.005)
+
+
+def contar(sql: str, params=()) -> int:
+    with db.conexao() as conn:
+        return conn.execute(sql, params).fetchone()[0]
+
+
+def lancamentos_recorrentes() -> int:
+    return sum(contar(f"SELECT COUNT(1) FROM {t} WHERE hash_importacao LIKE 'rec:%'") for t in ("rendas", "gastos"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--usuarios", type=int, default=100_000)
+    parser.add_argument("--gastos", type=int, default=2, help="custos fixos recorrentes por usuário")
+    parser.add_argument("--meses", type=int, default=12)
+    args = parser.parse_args(argv)
+    falhas = []
+    regras = args.usuarios * (1 + args.gastos)
+    esperado = regras * args.meses
+    ate = (2025, 12)
+    inicio = db.periodo(*ate) - args.meses + 1
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db.DB_NAME = os.path.join(pasta, "bench.db")
+        db.migrar(forcar=True)
+        popular(args.usuarios, args.gastos, inicio)
+
+        latencias, parar = [], threading.Event()
+        concorrente = threading.Thread(target=escritor, args=(parar, latencias))
+        concorrente.start()
+        t = time.perf_counter()
+        resultado = recorrencias.materializar(ate=ate)
+        segundos = time.perf_counter() - t
+        parar.set()
+        concorrente.join()
+        # referência: um inserir_* (uma transação) por lançamento, como os
+        # formulários, no mesmo banco já cheio (usuário 1, fora das verificações)
+        amostra = 2000
+        t = time.perf_counter()
+        for i in range(amostra):
+            db.inserir_renda(1, "Salário", 3000, 1 + i % 12, 2020)
+        manual = (time.perf_counter() - t) / amostra
+
+        print(f"{args.usuarios:,} usuários × {1 + args.gastos} regras × {args.meses} meses = {esperado:,} lançamentos")
+        print(f"  materializar: {segundos:6.1f} s ({resultado['lancamentos'] / segundos:,.0f}/s) em "
+              f"{resultado['lotes']:,} lote(s) de até {recorrencias.RECORRENCIAS_LOTE}")
+        print(f"  um inserir_* por lançamento: {manual * 1000:.2f} ms cada -> ~{manual * esperado:,.0f} s estimados")
+        print(f"  escritor concorrente: p50 {statistics.median(latencias):.2f} ms, máx {max(latencias):.1f} ms "
+              f"({len(latencias)} inserts)")
+
+        # 1. um lançamento por (regra, mês), resumo certo
+        distintos = sum(contar(f"SELECT COUNT(DISTINCT hash_importacao) FROM {t} WHERE hash_importacao LIKE 'rec:%'")
+                        for t in ("rendas", "gastos"))
+        if resultado["lancamentos"] != esperado or lancamentos_recorrentes() != esperado or distintos != esperado:
+            falhas.append(f"1: {resultado['lancamentos']} inseridos, {lancamentos_recorrentes()} na base "
+                          f"({distintos} distintos), esperado {esperado}")
+        esperado_rendas = contar(
+            "SELECT SUM(valor_centavos) * ? FROM recorrencias WHERE tipo = 'rendas'", (args.meses,)
+        )
+        obtido_rendas = contar("SELECT SUM(valor_centavos) FROM resumo_mensal WHERE id_classificacao = ? "
+                               "AND id_usuario > 1", (db.RESUMO_ID_RENDAS,))
+        if esperado_rendas != obtido_rendas:
+            falhas.append(f"1: resumo_mensal de rendas {obtido_rendas}, esperado {esperado_rendas}")
+        t = time.perf_counter()
+        if not db.verificar_resumo_mensal().empty:
+            falhas.append("1: resumo_mensal divergente")
+        print(f"  verificar_resumo_mensal: {time.perf_counter() - t:.1f} s")
+
+        # 2. idempotência
+        t = time.perf_counter()
+        de_novo = recorrencias.materializar(ate=ate)
+        print(f"  segunda execução: {(time.perf_counter() - t) * 1000:.1f} ms, {de_novo['lancamentos']} lançamento(s)")
+        with db.conexao() as conn:
+            conn.execute("UPDATE recorrencias SET proximo_periodo = inicio_periodo")
+        t = time.perf_counter()
+        voltou = recorrencias.materializar(ate=ate)
+        print(f"  com os cursores no início: {time.perf_counter() - t:.1f} s, {voltou['lancamentos']} lançamento(s)")
+        if de_novo["lancamentos"] or voltou["lancamentos"] or lancamentos_recorrentes() != esperado:
+            falhas.append(f"2: reexecução inseriu {de_novo['lancamentos']} + {voltou['lancamentos']}")
+
+        # 3. falha no meio: um trigger aborta o lote que avança uma regra do meio
+        proximo = db.periodo(*ate) + 1
+        meio = contar("SELECT MAX(id) FROM recorrencias") // 2
+        with db.conexao() as conn:
+            conn.execute(
+                f"CREATE TRIGGER falha_bench BEFORE UPDATE OF proximo_periodo ON recorrencias "
+                f"WHEN NEW.id = {meio} BEGIN SELECT RAISE(ABORT, 'falha simulada'); END"
+            )
+        try:
+            recorrencias.materializar(ate=db.ano_mes(proximo))
+            falhas.append("3: a falha simulada não interrompeu a materialização")
+        except sqlite3.IntegrityError:
+            pass
+        parcial = lancamentos_recorrentes() - esperado
+        with db.conexao() as conn:
+            conn.execute("DROP TRIGGER falha_bench")
+            pendentes = conn.execute(
+                "SELECT COUNT(1) FROM recorrencias WHERE ativa = 1 AND proximo_periodo <= ?", (proximo,)
+            ).fetchone()[0]
+        if parcial != regras - pendentes or parcial % recorrencias.RECORRENCIAS_LOTE:
+            falhas.append(f"3: {parcial} lançamento(s) do mês novo antes da falha para {regras - pendentes} "
+                          f"regra(s) avançadas")
+
+        # 4. virada do mês: só o mês novo
+        resto = recorrencias.materializar(ate=db.ano_mes(proximo))
+        if resto["lancamentos"] != pendentes or lancamentos_recorrentes() != esperado + regras:
+            falhas.append(f"4: mês novo com {lancamentos_recorrentes() - esperado} lançamento(s), esperado {regras}")
+        if not db.verificar_resumo_mensal().empty:
+            falhas.append("4: resumo_mensal divergente depois da falha e da virada do mês")
+        db.fechar_conexoes()
+
+    for falha in falhas:
+        print(f"FALHA {falha}")
+    print("verificações ok" if not falhas else "")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Retenção de audit_logs / login_attempts (retencao.py) numa base grande:
+tempo por destino (arquivo CSV gzip, banco de arquivo, nenhum), latência de
+um escritor concorrente durante a retenção, e verificação de que
+
+  1. a contagem diária (agregados + tabela) é a mesma antes e depois;
+  2. cada linha apagada está no arquivo (CSV ou banco), nenhuma a mais;
+  3. só linhas além do prazo somem, e rodar de novo não faz nada.
+
+    python benchmarks/bench_retencao.py [--eventos 1000000]
+
+Roda em bancos temporários. Sai com código 1 se alguma verificação falhar.
+"""
+import argparse
+import csv
+import gzip
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import db  # noqa: E402
+import retencao  # noqa: E402
+
+DIAS = 730
+
+
+def popular(eventos: int):
+    """`eventos` em audit_logs e metade disso em login_attempts, espalhados por 2 anos."""
+    with db.conexao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            """
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO audit_logs (event_type, actor_id, target_id, details, created_at)
+            SELECT CASE i % 4 WHEN 0 THEN 'login_success' WHEN 1 THEN 'login_failed'
+                              WHEN 2 THEN 'password_changed' ELSE 'user_deleted' END,
+                   i % 500, i % 700, 'evento ' || i,
+                   datetime('now', '-' || ((? - i) * ? * 86400 / ?) || ' seconds')
+            FROM n
+            """,
+            (eventos, eventos, DIAS, eventos),
+        )
+        conn.execute(
+            """
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO login_attempts (email, success, ip, attempted_at)
+            SELECT 'u' || (i % 3000) || '@x.com', i % 3 = 0, '10.0.0.' || (i % 250),
+                   datetime('now', '-' || ((? - i) * ? * 86400 / ?) || ' seconds')
+            FROM n
+            """,
+            (eventos // 2, eventos // 2, DIAS, eventos // 2),
+        )
+
+
+def escritor(parar: threading.Event, latencias: list):
+    """Um insert por vez em audit_logs (gravação síncrona), medindo a espera pelo lock."""
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        db._gravar_auditoria([("concorrente", None, None, None, db._agora_utc())])
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        time.sleep(0.002)
+
+
+def contar(tabela: str, onde: str = "") -> int:
+    with db.conexao() as conn:
+        return conn.execute(f"SELECT COUNT(1) FROM {tabela} {onde}").fetchone()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eventos", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+    falhas = []
+
+    print(f"audit_logs {args.eventos:,} / login_attempts {args.eventos // 2:,} linhas em {DIAS} dias; "
+          f"prazos {retencao.RETENCAO_AUDIT_DIAS} e {retencao.RETENCAO_LOGIN_DIAS} dias")
+    for destino in retencao.DESTINOS:
+        with tempfile.TemporaryDirectory() as pasta:
+            db.DB_NAME = os.path.join(pasta, "bench.db")
+            db.migrar()
+            popular(args.eventos)
+            antes = {t: retencao.contagem_diaria(t) for t in retencao.POLITICAS}
+            total_antes = {t: contar(t) for t in retencao.POLITICAS}
+
+            latencias, parar = [], threading.Event()
+            concorrente = threading.Thread(target=escritor, args=(parar, latencias))
+            concorrente.start()
+            time.sleep(0.2)
+            inicio = time.perf_counter()
+            resultado = retencao.aplicar_politica(
+                destino=destino, diretorio=os.path.join(pasta, "arquivo"), banco=os.path.join(pasta, "arquivo.db"),
+            )
+            segundos = time.perf_counter() - inicio
+            parar.set()
+            concorrente.join()
+
+            apagadas = sum(r["linhas"] for r in resultado.values())
+            tamanho = sum(os.path.getsize(r["arquivo"]) for r in resultado.values() if r["arquivo"])
+            if destino == "banco":
+                tamanho = os.path.getsize(os.path.join(pasta, "arquivo.db"))
+            print(f"  destino {destino:<8} {apagadas:,} linhas em {segundos:5.1f} s "
+                  f"({apagadas / segundos:,.0f}/s), arquivo {tamanho / 2**20:6.1f} MB; "
+                  f"escritor concorrente: p50 {statistics.median(latencias):.2f} ms, "
+                  f"máx {max(latencias):.1f} ms ({len(latencias)} inserts)")
+
+            for tabela, r in resultado.items():
+                # 1. contagem diária preservada (o escritor concorrente só soma 'concorrente')
+                depois = retencao.contagem_diaria(tabela)
+                if tabela == "audit_logs":
+                    depois = depois[depois["event_type"] != "concorrente"].reset_index(drop=True)
+                if not depois.equals(antes[tabela]):
+                    falhas.append(f"1 ({destino}): contagem diária de {tabela} mudou")
+
+                # 2. tudo o que saiu está no arquivo
+                if destino == "arquivo":
+                    with gzip.open(r["arquivo"], "rt", newline="", encoding="utf-8") as f:
+                        arquivadas = sum(1 for _ in csv.reader(f)) - 1
+                elif destino == "banco":
+                    with sqlite3.connect(r["arquivo"]) as arq:
+                        arquivadas = arq.execute(f"SELECT COUNT(1) FROM {tabela}").fetchone()[0]
+                else:
+                    arquivadas = r["linhas"]
+                restantes = contar(tabela, "WHERE event_type IS NOT 'concorrente'" if tabela == "audit_logs" else "")
+                if arquivadas != r["linhas"] or restantes + r["linhas"] != total_antes[tabela]:
+                    falhas.append(f"2 ({destino}): {tabela} apagou {r['linhas']}, arquivou {arquivadas}, "
+                                  f"restaram {restantes} de {total_antes[tabela]}")
+
+                # 3. nada além do prazo, nada dentro dele
+                data = retencao.POLITICAS[tabela]["data"]
+                dias = retencao.dias_padrao(tabela)
+                if contar(tabela, f"WHERE {data} < datetime('now', '-{dias} days', '-1 minute')"):
+                    falhas.append(f"3 ({destino}): {tabela} ainda tem linhas além de {dias} dias")
+                if contar(tabela, f"WHERE {data} >= datetime('now', '-{dias} days', '+1 minute')") < \
+                        total_antes[tabela] * (dias - 1) / DIAS:
+                    falhas.append(f"3 ({destino}): {tabela} perdeu linhas dentro do prazo")
+            if any(r["linhas"] for r in retencao.aplicar_politica(destino="nenhum").values()):
+                falhas.append(f"3 ({destino}): segunda execução apagou algo")
+            db.fechar_conexoes()
+
+    for falha in falhas:
+        print(f"FALHA {falha}")
+    print("verificações ok" if not falhas else "")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+bcrypt: tempo por work factor (para escolher BCRYPT_CUSTO), logins simultâneos
+com hash na thread da sessão vs. pool limitado de senhas.py, e verificação de que
+
+  1. hash/verificação funcionam e hash inválido não levanta;
+  2. SHA-256 legado é aceito e regravado em bcrypt depois do login, sem atrasá-lo;
+  3. bcrypt de custo menor só é regravado com SENHAS_REHASH (opt-in);
+  4. o rehash não sobrescreve uma troca de senha feita no meio do caminho;
+  5. pool e fila cheios levantam TimeoutError em vez de enfileirar sem limite.
+
+    python benchmarks/bench_senhas.py [--alvo-ms 250] [--sessoes 8]
+
+Roda num banco temporário. Sai com código 1 se alguma verificação falhar.
+"""
+import argparse
+import hashlib
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import bcrypt  # noqa: E402
+
+import db  # noqa: E402
+import senhas  # noqa: E402
+
+
+def logins_simultaneos(sessoes: int, verificar) -> tuple:
+    """`sessoes` threads verificam uma senha ao mesmo tempo; retorna (total_s, latências_ms, maior atraso_ms)."""
+    armazenado = bcrypt.hashpw(b"segredo", bcrypt.gensalt(senhas.BCRYPT_CUSTO))
+    latencias, pausas = [], [0.0]
+    fim = threading.Event()
+
+    def sessao():
+        inicio = time.perf_counter()
+        verificar("segredo", armazenado)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+    def outra_sessao():
+        # outra sessão com trabalho leve a cada 5 ms: atraso até conseguir CPU/GIL
+        while not fim.is_set():
+            inicio = time.perf_counter()
+            time.sleep(0.005)
+            sum(range(2000))
+            pausas.append((time.perf_counter() - inicio) * 1000 - 5)
+
+    observador = threading.Thread(target=outra_sessao)
+    observador.start()
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=sessao) for _ in range(sessoes)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - inicio
+    fim.set()
+    observador.join()
+    return total, latencias, max(pausas)
+
+
+def esperar(condicao, timeout: float = 10) -> bool:
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if condicao():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def hash_armazenado(email: str):
+    return db.get_user_by_email(email)[3]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alvo-ms", type=float, default=250)
+    parser.add_argument("--sessoes", type=int, default=8)
+    args = parser.parse_args(argv)
+    falhas = []
+
+    tempos = senhas.medir_custos()
+    print(f"bcrypt por custo ({os.cpu_count()} CPU):")
+    for custo, ms in tempos.items():
+        marca = "  <- BCRYPT_CUSTO" if custo == senhas.BCRYPT_CUSTO else ""
+        print(f"  custo {custo:2d}  {ms:8.1f} ms{marca}")
+    dentro = [c for c, ms in tempos.items() if ms <= args.alvo_ms]
+    print(f"  maior custo abaixo de {args.alvo_ms:.0f} ms nesta máquina: {max(dentro) if dentro else min(tempos)}")
+
+    for nome, verificar in (
+        ("na thread da sessão", lambda s, h: bcrypt.checkpw(s.encode(), h)),
+        (f"pool de senhas ({senhas.SENHAS_POOL})", senhas.verificar),
+    ):
+        total, latencias, pausa = logins_simultaneos(args.sessoes, verificar)
+        print(f"{args.sessoes} logins simultâneos {nome:<24} total {total * 1000:7.0f} ms, "
+              f"latência p50 {statistics.median(latencias):6.0f} ms, máx {max(latencias):6.0f} ms, "
+              f"outra sessão atrasada no máx. {pausa:5.1f} ms")
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db.DB_NAME = os.path.join(pasta, "bench.db")
+        db.migrar()
+
+        # 1. ida e volta
+        h = senhas.gerar_hash("abc")
+        if not senhas.verificar("abc", h) or senhas.verificar("abd", h) or senhas.verificar("abc", b"$2b$lixo"):
+            falhas.append("1: verificação de bcrypt incorreta")
+        if senhas.custo_do_hash(h) != senhas.BCRYPT_CUSTO:
+            falhas.append(f"1: custo {senhas.custo_do_hash(h)} != BCRYPT_CUSTO {senhas.BCRYPT_CUSTO}")
+
+        # 2. SHA-256 legado: login devolve antes do rehash terminar
+        db.criar_usuario("Legado", "legado@x.com", "x")
+        with db.conexao() as conn:
+            conn.execute("UPDATE usuarios SET senha = ? WHERE email = 'legado@x.com'",
+                         (hashlib.sha256(b"antiga").hexdigest(),))
+        inicio = time.perf_counter()
+        ok = db.autenticar_usuario("legado@x.com", "antiga")
+        login_ms = (time.perf_counter() - inicio) * 1000
+        ainda_sha = isinstance(hash_armazenado("legado@x.com"), str)
+        if not ok or db.autenticar_usuario("legado@x.com", "errada"):
+            falhas.append("2: login com SHA-256 legado falhou")
+        if not esperar(lambda: senhas.custo_do_hash(hash_armazenado("legado@x.com")) == senhas.BCRYPT_CUSTO):
+            falhas.append("2: SHA-256 não foi regravado em bcrypt")
+        elif not db.autenticar_usuario("legado@x.com", "antiga"):
+            falhas.append("2: login falhou depois do rehash")
+        print(f"login SHA-256 legado: {login_ms:.1f} ms (rehash ainda pendente ao retornar: {ainda_sha})")
+
+        # 3. custo menor: só com SENHAS_REHASH
+        fraco = bcrypt.hashpw(b"senha", bcrypt.gensalt(senhas.BCRYPT_CUSTO - 2))
+        db.criar_usuario("Fraco", "fraco@x.com", "x")
+        with db.conexao() as conn:
+            conn.execute("UPDATE usuarios SET senha = ? WHERE email = 'fraco@x.com'", (fraco,))
+        db.autenticar_usuario("fraco@x.com", "senha")
+        time.sleep(1)
+        if senhas.custo_do_hash(hash_armazenado("fraco@x.com")) != senhas.BCRYPT_CUSTO - 2:
+            falhas.append("3: rehash de custo aconteceu sem SENHAS_REHASH")
+        senhas.SENHAS_REHASH = True
+        db.autenticar_usuario("fraco@x.com", "senha")
+        if not esperar(lambda: senhas.custo_do_hash(hash_armazenado("fraco@x.com")) == senhas.BCRYPT_CUSTO):
+            falhas.append("3: rehash de custo não aconteceu com SENHAS_REHASH")
+        senhas.SENHAS_REHASH = False
+
+        # 4. troca de senha concorrente vence o rehash
+        antigo = hash_armazenado("fraco@x.com")
+        db.atualizar_senha(db.get_user_by_email("fraco@x.com")[0], "nova")
+        db._regravar_hash(db.get_user_by_email("fraco@x.com")[0], antigo, senhas.gerar_hash("senha"))
+        if not db.autenticar_usuario("fraco@x.com", "nova"):
+            falhas.append("4: rehash sobrescreveu a senha trocada")
+
+        # 5. fila limitada
+        servico = senhas.ServicoSenhas(tamanho=1, fila_max=2, timeout=0.2)
+        ocupados = [servico._enviar(None, senhas._hash_bcrypt, "x", senhas.BCRYPT_CUSTO) for _ in range(2)]
+        try:
+            servico.gerar_hash("x")
+            falhas.append("5: fila cheia não levantou TimeoutError")
+        except TimeoutError:
+            pass
+        for f in ocupados:
+            f.result()
+        servico.timeout = 10
+        if not servico.verificar("x", servico.gerar_hash("x")):
+            falhas.append("5: serviço não voltou a atender depois de esvaziar")
+        db.fechar_conexoes()
+
+    print(f"estatísticas: {senhas.estatisticas_senhas()}")
+    for falha in falhas:
+        print(f"FALHA {falha}")
+    print("verificações ok" if not falhas else "")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Cold start da tela de login: mede, com `python -X importtime`, os imports que
+o app.py faz antes do primeiro st.stop() (o gate de login) e falha se
+
+  * algum módulo pesado/pós-login (plotly.express, pandas, pyarrow, admin...) for
+    carregado nesse trecho, ou
+  * o tempo de import do app sem o streamlit (melhor de N processos: o
+    mínimo é bem menos ruidoso que a média em máquina compartilhada) passar
+    da referência gravada em startup_baseline.json + tolerância.
+
+O streamlit sozinho é a maior parte do cold start, não depende deste
+repositório e varia muito entre máquinas e versões; por isso o tempo
+comparado é o total menos o cumulativo do `import streamlit` no mesmo
+processo (o que os imports do app acrescentam).
+
+    python benchmarks/bench_startup.py [--repeticoes 7] [--tolerancia 0.25] [--folga-ms 25]
+    python benchmarks/bench_startup.py --gravar-referencia
+
+A referência ainda depende da máquina: grave de novo ao trocar de ambiente de CI.
+Código de saída 0 = ok, 1 = regressão.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(RAIZ, "app.py")
+REFERENCIA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+
+# não podem aparecer antes do login (o próprio streamlit já importa
+# plotly.graph_objects quando o plotly está instalado; o caro é plotly.express)
+PROIBIDOS = ("plotly.express", "pandas", "pyarrow", "admin", "logic", "cache", "importacao", "exportacao")
+
+
+def _proibido(nome: str) -> bool:
+    return any(nome == p or nome.startswith(p + ".") for p in PROIBIDOS)
+
+
+def _chama_st_stop(no) -> bool:
+    for filho in ast.walk(no):
+        if (
+            isinstance(filho, ast.Call)
+            and isinstance(filho.func, ast.Attribute)
+            and filho.func.attr == "stop"
+            and isinstance(filho.func.value, ast.Name)
+            and filho.func.value.id == "st"
+        ):
+            return True
+    return False
+
+
+def imports_antes_do_login(caminho: str = APP) -> list:
+    """Comandos `import` de nível de módulo anteriores ao primeiro st.stop()."""
+    with open(caminho, encoding="utf-8") as f:
+        arvore = ast.parse(f.read(), caminho)
+    comandos = []
+    for no in arvore.body:
+        if _chama_st_stop(no):
+            break
+        if isinstance(no, ast.Import):
+            comandos += [f"import {a.name}" for a in no.names]
+        elif isinstance(no, ast.ImportFrom) and no.level == 0:
+            comandos.append(f"import {no.module}")
+    return comandos
+
+
+def medir(comandos: list) -> tuple:
+    """Um processo novo com -X importtime; retorna (total_us, {modulo: cumulativo_us})."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(comandos)],
+        cwd=RAIZ, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"falha ao importar: {'; '.join(comandos)}")
+    total, modulos = 0, {}
+    for linha in proc.stderr.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        proprio, cumulativo, nome = linha[len("import time:"):].split("|")
+        total += int(proprio)
+        modulos[nome.strip()] = int(cumulativo)
+    return total, modulos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticoes", type=int, default=7)
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="folga sobre a referência (0.25 = +25%%)")
+    parser.add_argument("--folga-ms", type=float, default=25.0,
+                        help="folga absoluta somada ao limite (ruído de poucos ms pesa muito num tempo pequeno)")
+    parser.add_argument("--gravar-referencia", action="store_true")
+    args = parser.parse_args(argv)
+
+    comandos = imports_antes_do_login()
+    medicoes = [medir(comandos) for _ in range(args.repeticoes)]
+    tempos = [(t - modulos.get("streamlit", 0)) / 1000 for t, modulos in medicoes]
+    melhor_ms = min(tempos)
+    modulos = medicoes[-1][1]
+    streamlit_ms = min(m.get("streamlit", 0) for _, m in medicoes) / 1000
+
+    print(f"imports antes do login: {', '.join(c.split()[1] for c in comandos)}")
+    print(f"tempo de import sem o streamlit: melhor {melhor_ms:.1f} ms, mediana {statistics.median(tempos):.1f} ms "
+          f"({args.repeticoes} processos; streamlit sozinho: melhor {streamlit_ms:.1f} ms)")
+    for nome, us in sorted(modulos.items(), key=lambda kv: -kv[1])[:8]:
+        if "." not in nome:
+            print(f"  {us / 1000:8.1f} ms  {nome}")
+
+    falhas = []
+    carregados = sorted(n for n in modulos if _proibido(n))
+    if carregados:
+        falhas.append(f"módulos pós-login carregados no login: {', '.join(carregados[:10])}")
+
+    if args.gravar_referencia:
+        with open(REFERENCIA, "w", encoding="utf-8") as f:
+            json.dump({"app_sem_streamlit_ms": round(melhor_ms, 1), "python": sys.version.split()[0]}, f, indent=2)
+            f.write("\n")
+        print(f"referência gravada em {REFERENCIA}")
+    elif os.path.exists(REFERENCIA):
+        with open(REFERENCIA, encoding="utf-8") as f:
+            referencia = json.load(f)["app_sem_streamlit_ms"]
+        limite = referencia * (1 + args.tolerancia) + args.folga_ms
+        print(f"referência: {referencia:.1f} ms (limite {limite:.1f} ms)")
+        if melhor_ms > limite:
+            falhas.append(f"imports do app {melhor_ms:.1f} ms acima do limite {limite:.1f} ms")
+    else:
+        print("sem referência gravada; rode com --gravar-referencia")
+
+    for falha in falhas:
+        print(f"FALHA: {falha}")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Gestão de usuários no painel admin com muitos usuários: página e busca no
+SQL (buscar_usuarios) vs. carregar a tabela inteira (listar_usuarios) e
+filtrar em pandas, tempo de render da tela (streamlit AppTest), e verificação de que
+
+  1. as páginas, concatenadas, cobrem todos os usuários uma vez, em ordem de nome;
+  2. a busca por nome/e-mail bate com o filtro em pandas;
+  3. % e _ digitados na busca são literais.
+
+    python benchmarks/bench_usuarios.py [--usuarios 20000]
+
+Roda num banco temporário. Sai com código 1 se alguma verificação falhar.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import db  # noqa: E402
+
+
+def popular(usuarios: int):
+    with db.conexao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            """
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO usuarios (nome, email, senha, is_admin)
+            SELECT CASE i % 3 WHEN 0 THEN 'Ana ' WHEN 1 THEN 'bruno ' ELSE 'Carla ' END || (i * 7919 % ?),
+                   'u' || i || CASE i % 100 WHEN 0 THEN '_100%' ELSE '' END || '@x.com', 'x', 0
+            FROM n
+            """,
+            (usuarios, usuarios),
+        )
+
+
+def medir(fn, repeticoes: int = 5) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        fn()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor * 1000
+
+
+def filtro_pandas(df: pd.DataFrame, termo: str) -> pd.DataFrame:
+    termo = termo.lower()
+    return df[df["nome"].str.lower().str.contains(termo, regex=False)
+              | df["email"].str.lower().str.contains(termo, regex=False)]
+
+
+def render_admin() -> Optional[float]:
+    """Tempo (s) do primeiro render de tela_admin; None sem streamlit.testing."""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return None
+
+    def app():
+        import os
+        import sys
+        sys.path.insert(0, os.environ["BENCH_RAIZ"])
+        import streamlit as st
+        import db
+        db.DB_NAME = os.environ["BENCH_DB"]
+        st.session_state.usuario = {"id": 1, "is_admin": True}
+        from admin import tela_admin
+        tela_admin()
+
+    os.environ["BENCH_RAIZ"], os.environ["BENCH_DB"] = RAIZ, db.DB_NAME
+    at = AppTest.from_function(app, default_timeout=300)
+    inicio = time.perf_counter()
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return time.perf_counter() - inicio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--usuarios", type=int, default=20_000)
+    parser.add_argument("--por-pagina", type=int, default=50)
+    args = parser.parse_args(argv)
+    falhas = []
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db.DB_NAME = os.path.join(pasta, "bench.db")
+        db.migrar()
+        popular(args.usuarios)
+        limite = args.por_pagina
+        total = args.usuarios + 1  # + admin inicial
+        ultima = (total - 1) // limite * limite
+
+        print(f"usuarios com {total:,} linhas, {limite} por página")
+        print(f"  tabela inteira (listar_usuarios)       {medir(db.listar_usuarios):8.1f} ms")
+        print(f"  primeira página (buscar_usuarios)      {medir(lambda: db.buscar_usuarios('', limite)):8.1f} ms")
+        print(f"  última página                          {medir(lambda: db.buscar_usuarios('', limite, ultima)):8.1f} ms")
+        print(f"  busca 'carla 1', tabela + pandas       "
+              f"{medir(lambda: filtro_pandas(db.listar_usuarios(), 'carla 1')):8.1f} ms")
+        print(f"  busca 'carla 1', SQL                   {medir(lambda: db.buscar_usuarios('carla 1', limite)):8.1f} ms")
+        segundos = render_admin()
+        if segundos is not None:
+            print(f"  render da tela admin                   {segundos * 1000:8.1f} ms")
+
+        tudo = db.listar_usuarios()
+
+        # 1. páginas cobrem tudo, em ordem
+        paginas, offset = [], 0
+        while True:
+            df, contagem = db.buscar_usuarios("", limite, offset)
+            if df.empty:
+                break
+            paginas.append(df)
+            offset += limite
+        obtido = pd.concat(paginas, ignore_index=True)
+        esperado = tudo.assign(chave=tudo["nome"].str.lower()).sort_values(["chave", "id_usuario"], kind="stable")
+        if contagem != total or list(obtido["id_usuario"]) != list(esperado["id_usuario"]):
+            falhas.append(f"1: {len(obtido)} usuário(s) paginados (total {contagem}), esperado {total} em ordem de nome")
+
+        # 2. busca == filtro em pandas
+        for termo in ("ana 1", "BRUNO", "u12", "@x.com", "nada disso"):
+            df, contagem = db.buscar_usuarios(termo, total)
+            esperado = filtro_pandas(tudo, termo)
+            if contagem != len(esperado) or sorted(df["id_usuario"]) != sorted(esperado["id_usuario"]):
+                falhas.append(f"2: busca {termo!r}: {contagem} usuário(s), esperado {len(esperado)}")
+
+        # 3. curingas literais
+        for termo in ("%", "_100%", "u1_"):
+            _, contagem = db.buscar_usuarios(termo, total)
+            if contagem != len(filtro_pandas(tudo, termo)):
+                falhas.append(f"3: busca {termo!r} tratou curinga como padrão ({contagem} usuário(s))")
+        db.fechar_conexoes()
+
+    for falha in falhas:
+        print(f"FALHA {falha}")
+    print("verificações ok" if not falhas else "")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_MAX_MB = float(os.environ.get("CACHE_MAX_MB", "256"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1024"))
+CACHE_DASHBOARD_MAX_MB = float(os.environ.get("CACHE_DASHBOARD_MAX_MB", "64"))
+CACHE_DASHBOARD_MAX_ENTRIES = int(os.environ.get("CACHE_DASHBOARD_MAX_ENTRIES", "4096"))
+
+
+def tamanho_bytes(valor: Any) -> int:
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(index=True, deep=True))
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if isinstance(valor, (str, bytes)):
+        return sys.getsizeof(valor)
+    if isinstance(valor, dict):
+        return sum(tamanho_bytes(v) for v in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sum(tamanho_bytes(v) for v in valor)
+    return 0
+
+
+class CacheLRU:
+    """
+    Cache LRU compartilhado pelo processo, limitado por número de entradas e
+    por bytes (DataFrames medidos com memory_usage(deep=True)).
+
+    Os valores são devolvidos por referência e compartilhados entre sessões:
+    quem lê não deve alterá-los (faça .copy() antes de modificar).
+    """
+
+    def __init__(self, max_bytes: int, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._dados: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._carregando: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chave: Hashable, default=None):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                self.misses += 1
+                return default
+            self._dados.move_to_end(chave)
+            self.hits += 1
+            return item[0]
+
+    def put(self, chave: Hashable, valor: Any):
+        tamanho = tamanho_bytes(valor)
+        with self._lock:
+            if chave in self._dados:
+                self._remover(chave)
+            if tamanho > self.max_bytes:
+                # maior que o cache inteiro: não guarda
+                return
+            self._dados[chave] = (valor, tamanho)
+            self._bytes += tamanho
+            while len(self._dados) > self.max_entries or self._bytes > self.max_bytes:
+                antiga = next(iter(self._dados))
+                self._remover(antiga)
+                self.evictions += 1
+
+    def get_or_load(self, chave: Hashable, carregar: Callable[[], Any]):
+        """
+        Retorna o valor em cache ou chama `carregar()`. Chamadas concorrentes
+        para a mesma chave esperam a primeira carga em vez de repetir a consulta.
+        """
+        sentinela = object()
+        valor = self.get(chave, sentinela)
+        if valor is not sentinela:
+            return valor
+
+        with self._lock:
+            evento = self._carregando.get(chave)
+            dono = evento is None
+            if dono:
+                evento = self._carregando[chave] = threading.Event()
+
+        if not dono:
+            evento.wait()
+            with self._lock:
+                item = self._dados.get(chave)
+            if item is not None:
+                return item[0]
+            return carregar()
+
+        try:
+            valor = carregar()
+            self.put(chave, valor)
+            return valor
+        finally:
+            with self._lock:
+                self._carregando.pop(chave, None)
+            evento.set()
+
+    def invalidar(self, condicao: Callable[[Hashable], bool]) -> int:
+        """Remove as chaves para as quais `condicao(chave)` é verdadeira."""
+        with self._lock:
+            alvos = [k for k in self._dados if condicao(k)]
+            for k in alvos:
+                self._remover(k)
+            return len(alvos)
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._dados),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / total) if total else 0.0,
+            }
+
+    def _remover(self, chave):
+        _, tamanho = self._dados.pop(chave)
+        self._bytes -= tamanho
+
+
+# ================= CACHE DE LANÇAMENTOS =================
+# Chave: (tabela, id_usuario, versao_dados). A versão vem de
+# db.obter_versao_dados, então uma escrita só afeta as chaves daquele usuário.
+
+cache_lancamentos = CacheLRU(int(CACHE_MAX_MB * 1024 * 1024))
+
+
+def obter_lancamentos(tabela: str, id_usuario: int, versao: int, carregar: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    def _carregar():
+        # versão nova: as anteriores desse usuário nunca mais serão lidas
+        cache_lancamentos.invalidar(
+            lambda k: k[0] == tabela and k[1] == id_usuario and k[2] != versao
+        )
+        return carregar()
+
+    return cache_lancamentos.get_or_load((tabela, id_usuario, versao), _carregar)
+
+
+# ================= CACHE DO DASHBOARD =================
+# Saídas do logic.py (resumo, evolução, comparativo) e specs JSON das figuras
+# Plotly por período. Chave: (id_usuario, visao, mes, ano, versao_dados); na
+# visão anual o mês não entra. Um rerun sem escrita nova não refaz pandas nem Plotly.
+
+cache_dashboard = CacheLRU(int(CACHE_DASHBOARD_MAX_MB * 1024 * 1024), CACHE_DASHBOARD_MAX_ENTRIES)
+
+
+def obter_dashboard(id_usuario: int, visao: str, mes: int, ano: int, versao: int,
+                    calcular: Callable[[], dict]) -> dict:
+    chave = (id_usuario, visao, mes if visao == "Mensal" else None, ano, versao)
+
+    def _calcular():
+        cache_dashboard.invalidar(lambda k: k[0] == id_usuario and k[4] != versao)
+        return calcular()
+
+    return cache_dashboard.get_or_load(chave, _calcular)
+
+
+def invalidar_usuario(id_usuario: int, versao_atual: Optional[int] = None) -> int:
+    removidas = cache_lancamentos.invalidar(
+        lambda k: k[1] == id_usuario and (versao_atual is None or k[2] != versao_atual)
+    )
+    return removidas + cache_dashboard.invalidar(
+        lambda k: k[0] == id_usuario and (versao_atual is None or k[4] != versao_atual)
+    )
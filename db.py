@@ -1,95 +1,712 @@
+from __future__ import annotations  # anotações com pd.* não forçam o import do pandas
+
+import importlib.util
 import sqlite3
-import pandas as pd
+import sys
 import numpy as np
-import bcrypt
-import hashlib
-import string
+import queue
+import re
 import os
+import threading
+import atexit
+import unicodedata
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
 from typing import Optional, Tuple
 
+from logger_config import logger
+import senhas
+
+
+def _importar_tardio(nome):
+    """
+    Importa `nome` só no primeiro acesso a um atributo (importlib LazyLoader).
+    O login (auth -> db) não usa pandas; assim ele não entra no cold start.
+    """
+    if nome in sys.modules:
+        return sys.modules[nome]
+    spec = importlib.util.find_spec(nome)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nome] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
+
+pd = _importar_tardio("pandas")
+
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_NAME = os.path.join(BASE_DIR, "financas.db")
 
+# Inteiros NumPy (ex.: anos vindos de um DataFrame) seriam gravados como BLOB
+# pelo sqlite3 via buffer protocol; converte para int nativo.
+for _tipo_np in (np.int8, np.int16, np.int32, np.int64, np.uint8, np.uint16, np.uint32):
+    sqlite3.register_adapter(_tipo_np, int)
+
+# ---------------- CONEXÃO / POOL ----------------
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT = float(os.environ.get("DB_BUSY_TIMEOUT", "5"))
+DB_CACHED_STATEMENTS = 256
+
+# Aplicados a cada conexão nova. journal_mode=WAL é persistente no arquivo,
+# os demais valem só para a conexão.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",      # ~16 MB por conexão
+    "PRAGMA mmap_size = 134217728",    # 128 MB
+    "PRAGMA temp_store = MEMORY",
+)
+
 def conectar():
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
-
-
-# ---------------- SCHEMA / TABELAS ----------------
-
-def criar_tabela_usuarios():
-    with conectar() as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id_usuario INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                senha BLOB NOT NULL,
-                estado_civil TEXT,
-                is_admin INTEGER DEFAULT 0,
-                must_change_password INTEGER DEFAULT 0
-            )
-        """)
-
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS login_attempts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT,
-                attempted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                success INTEGER,
-                ip TEXT
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS audit_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                event_type TEXT NOT NULL,
-                actor_id INTEGER,
-                target_id INTEGER,
-                details TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """Abre uma conexão nova já configurada (sem passar pelo pool)."""
+    conn = sqlite3.connect(
+        DB_NAME,
+        check_same_thread=False,
+        timeout=DB_BUSY_TIMEOUT,
+        cached_statements=DB_CACHED_STATEMENTS,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    # usada ao indexar a busca textual (_indexar_pendentes)
+    conn.create_function("termos_busca", 2, _termos_busca, deterministic=True)
+    return conn
+
+
+class PoolConexoes:
+    """
+    Pool simples de conexões SQLite reutilizáveis entre reruns/threads do Streamlit.
+    Cada conexão é usada por uma única thread por vez (checkout/devolução).
+    """
+
+    def __init__(self, caminho: str, tamanho: int = DB_POOL_SIZE):
+        self.caminho = caminho
+        self._livres = queue.LifoQueue(maxsize=tamanho)
+
+    def obter(self) -> sqlite3.Connection:
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            return conectar()
+
+    def devolver(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._livres.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def fechar(self):
+        while True:
+            try:
+                self._livres.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool: Optional[PoolConexoes] = None
+_pool_lock = threading.Lock()
+
+def _obter_pool() -> PoolConexoes:
+    global _pool
+    with _pool_lock:
+        # DB_NAME pode ser trocado (ex.: banco temporário); recria o pool nesse caso
+        if _pool is None or _pool.caminho != DB_NAME:
+            if _pool is not None:
+                _pool.fechar()
+            _pool = PoolConexoes(DB_NAME)
+        return _pool
+
+@contextmanager
+def conexao():
+    """
+    Empresta uma conexão do pool. Faz commit ao sair sem erro e rollback em caso
+    de exceção, como o `with sqlite3.Connection`, e devolve a conexão ao pool.
+    """
+    pool = _obter_pool()
+    conn = pool.obter()
+    try:
+        with conn:
+            yield conn
+    finally:
+        pool.devolver(conn)
+
+def fechar_conexoes():
+    with _pool_lock:
+        if _pool is not None:
+            _pool.fechar()
+
+
+# ---------------- SCHEMA / MIGRAÇÕES ----------------
+
+def _criar_tabela_usuarios(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id_usuario INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            senha BLOB NOT NULL,
+            estado_civil TEXT,
+            is_admin INTEGER DEFAULT 0,
+            must_change_password INTEGER DEFAULT 0
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS login_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT,
+            attempted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            success INTEGER,
+            ip TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL,
+            actor_id INTEGER,
+            target_id INTEGER,
+            details TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Bootstrap dev admin only if no users
+    cur = conn.execute("SELECT COUNT(1) FROM usuarios")
+    count = cur.fetchone()[0]
+    if count == 0:
+        default_email = os.environ.get("DEV_ADMIN_EMAIL", "admin@example.com")
+        default_name = os.environ.get("DEV_ADMIN_NAME", "Admin")
+        default_password = os.environ.get("DEV_ADMIN_PW", "admin")
+        hashed = senhas.gerar_hash(default_password)
+        conn.execute(
+            "INSERT INTO usuarios (nome, email, senha, is_admin, must_change_password) VALUES (?,?,?,?,1)",
+            (default_name, default_email, hashed, 1)
+        )
+        print(f"[BOOTSTRAP] Usuário admin criado: {default_email} / senha: {default_password} (troque imediatamente)")
+
+def _criar_tabelas(conn):
+    """Cria tabelas de rendas/gastos caso não existam."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rendas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_usuario INTEGER,
+            descricao TEXT,
+            valor REAL,
+            mes INTEGER,
+            ano INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS gastos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_usuario INTEGER,
+            id_classificacao INTEGER,
+            categoria TEXT,
+            descricao TEXT,
+            valor REAL,
+            mes INTEGER,
+            ano INTEGER
+        )
+    """)
+
+def _migracao_001_tabelas_base(conn):
+    _criar_tabela_usuarios(conn)
+    _criar_tabelas(conn)
+
+def _migracao_002_indices(conn):
+    # carregar_rendas / carregar_gastos: filtro por usuário e período
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rendas_usuario_periodo ON rendas (id_usuario, ano, mes)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_gastos_usuario_periodo ON gastos (id_usuario, ano, mes)")
+    # count_failed_attempts_recent: igualdade em email/success + faixa em attempted_at
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_login_attempts_email ON login_attempts (email, success, attempted_at)")
+    # listar_audit_logs: ORDER BY created_at DESC, com ou sem filtro de event_type
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at ON audit_logs (created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_tipo ON audit_logs (event_type, created_at)")
+
+def _migracao_003_normaliza_periodo(conn):
+    # Registros antigos têm mes/ano gravados como BLOB (int64 little-endian);
+    # filtros em SQL por período precisam de INTEGER.
+    for tabela in ("rendas", "gastos"):
+        for coluna in ("mes", "ano"):
+            linhas = conn.execute(
+                f"SELECT id, {coluna} FROM {tabela} WHERE typeof({coluna}) = 'blob'"
+            ).fetchall()
+            conn.executemany(
+                f"UPDATE {tabela} SET {coluna} = ? WHERE id = ?",
+                [(int.from_bytes(bytes(v), byteorder="little", signed=False), id_) for id_, v in linhas]
             )
-        """)
-
-        # Bootstrap dev admin only if no users
-        cur = conn.execute("SELECT COUNT(1) FROM usuarios")
-        count = cur.fetchone()[0]
-        if count == 0:
-            default_email = os.environ.get("DEV_ADMIN_EMAIL", "admin@example.com")
-            default_name = os.environ.get("DEV_ADMIN_NAME", "Admin")
-            default_password = os.environ.get("DEV_ADMIN_PW", "admin")
-            hashed = bcrypt.hashpw(default_password.encode("utf-8"), bcrypt.gensalt())
             conn.execute(
-                "INSERT INTO usuarios (nome, email, senha, is_admin, must_change_password) VALUES (?,?,?,?,1)",
-                (default_name, default_email, hashed, 1)
+                f"UPDATE {tabela} SET {coluna} = CAST({coluna} AS INTEGER) WHERE typeof({coluna}) = 'real'"
             )
-            print(f"[BOOTSTRAP] Usuário admin criado: {default_email} / senha: {default_password} (troque imediatamente)")
 
-def criar_tabelas():
-    """Cria tabelas de rendas/gastos caso não existam."""
-    with conectar() as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS rendas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                id_usuario INTEGER,
-                descricao TEXT,
-                valor REAL,
-                mes INTEGER,
-                ano INTEGER
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS gastos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                id_usuario INTEGER,
-                id_classificacao INTEGER,
-                categoria TEXT,
-                descricao TEXT,
-                valor REAL,
-                mes INTEGER,
-                ano INTEGER
+
+def _migracao_004_indices_cobertura(conn):
+    # Índices de cobertura para as agregações em SQL (somar_* / evolucao_mensal):
+    # o GROUP BY é resolvido só com o índice, sem ler a tabela. Como têm
+    # (id_usuario, ano, mes) como prefixo, substituem os índices da migração 2.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_gastos_usuario_periodo_valor "
+        "ON gastos (id_usuario, ano, mes, id_classificacao, valor)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_rendas_usuario_periodo_valor "
+        "ON rendas (id_usuario, ano, mes, valor)"
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_gastos_usuario_periodo")
+    conn.execute("DROP INDEX IF EXISTS idx_rendas_usuario_periodo")
+
+
+# resumo_mensal: totais materializados por (usuário, ano, mês, classificação),
+# mantidos por triggers em rendas/gastos. Rendas usam id_classificacao = 0.
+# Linhas sem usuário/ano/mês/classificação não entram no resumo.
+RESUMO_ID_RENDAS = 0
+
+def _sql_triggers_resumo(tabela, expr_classificacao, valor="valor_centavos"):
+    colunas = ("id_usuario", "ano", "mes", "id_classificacao")
+    new = ("NEW.id_usuario", "NEW.ano", "NEW.mes", expr_classificacao.format(r="NEW"))
+    old = ("OLD.id_usuario", "OLD.ano", "OLD.mes", expr_classificacao.format(r="OLD"))
+    completo_new = " AND ".join(f"{v} IS NOT NULL" for v in new)
+    completo_old = " AND ".join(f"{v} IS NOT NULL" for v in old)
+    chave_new = ", ".join(new)
+    filtro_old = " AND ".join(f"{c} = {v}" for c, v in zip(colunas, old))
+
+    soma = f"""
+        INSERT INTO resumo_mensal (id_usuario, ano, mes, id_classificacao, {valor}, quantidade)
+        VALUES ({chave_new}, COALESCE(NEW.{valor}, 0), 1)
+        ON CONFLICT (id_usuario, ano, mes, id_classificacao) DO UPDATE SET
+            {valor} = {valor} + excluded.{valor},
+            quantidade = quantidade + 1;
+    """
+    subtrai = f"""
+        UPDATE resumo_mensal SET
+            {valor} = {valor} - COALESCE(OLD.{valor}, 0),
+            quantidade = quantidade - 1
+        WHERE {filtro_old};
+        DELETE FROM resumo_mensal WHERE {filtro_old} AND quantidade <= 0;
+    """
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{tabela}_resumo_ins AFTER INSERT ON {tabela} "
+        f"WHEN {completo_new} BEGIN {soma} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{tabela}_resumo_del AFTER DELETE ON {tabela} "
+        f"WHEN {completo_old} BEGIN {subtrai} END",
+        # UPDATE = remove o valor antigo + soma o novo (dois triggers, cada um com seu WHEN)
+        f"CREATE TRIGGER IF NOT EXISTS trg_{tabela}_resumo_upd_old "
+        f"AFTER UPDATE OF id_usuario, ano, mes, {valor}{', id_classificacao' if tabela == 'gastos' else ''} ON {tabela} "
+        f"WHEN {completo_old} BEGIN {subtrai} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{tabela}_resumo_upd_new "
+        f"AFTER UPDATE OF id_usuario, ano, mes, {valor}{', id_classificacao' if tabela == 'gastos' else ''} ON {tabela} "
+        f"WHEN {completo_new} BEGIN {soma} END",
+    ]
+
+def _reconstruir_resumo_mensal(conn, id_usuario=None, valor="valor_centavos"):
+    filtro, params = ("", []) if id_usuario is None else (" AND id_usuario = ?", [id_usuario])
+    conn.execute(f"DELETE FROM resumo_mensal WHERE 1 = 1{filtro}", params)
+    conn.execute(
+        f"""
+        INSERT INTO resumo_mensal (id_usuario, ano, mes, id_classificacao, {valor}, quantidade)
+        SELECT id_usuario, ano, mes, id_classificacao, COALESCE(SUM({valor}), 0), COUNT(1)
+        FROM gastos
+        WHERE id_usuario IS NOT NULL AND ano IS NOT NULL AND mes IS NOT NULL
+          AND id_classificacao IS NOT NULL{filtro}
+        GROUP BY id_usuario, ano, mes, id_classificacao
+        """,
+        params
+    )
+    conn.execute(
+        f"""
+        INSERT INTO resumo_mensal (id_usuario, ano, mes, id_classificacao, {valor}, quantidade)
+        SELECT id_usuario, ano, mes, {RESUMO_ID_RENDAS}, COALESCE(SUM({valor}), 0), COUNT(1)
+        FROM rendas
+        WHERE id_usuario IS NOT NULL AND ano IS NOT NULL AND mes IS NOT NULL{filtro}
+        GROUP BY id_usuario, ano, mes
+        """,
+        params
+    )
+
+def _migracao_005_resumo_mensal(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS resumo_mensal (
+            id_usuario INTEGER NOT NULL,
+            ano INTEGER NOT NULL,
+            mes INTEGER NOT NULL,
+            id_classificacao INTEGER NOT NULL,
+            valor REAL NOT NULL DEFAULT 0,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (id_usuario, ano, mes, id_classificacao)
+        ) WITHOUT ROWID
+    """)
+    # schema da época (valor REAL); a migração 8 refaz tudo em centavos
+    for sql in _sql_triggers_resumo("gastos", "{r}.id_classificacao", valor="valor"):
+        conn.execute(sql)
+    for sql in _sql_triggers_resumo("rendas", str(RESUMO_ID_RENDAS), valor="valor"):
+        conn.execute(sql)
+    _reconstruir_resumo_mensal(conn, valor="valor")
+
+
+def _adicionar_coluna(conn, tabela, coluna, definicao):
+    """ALTER TABLE ADD COLUMN idempotente (SQLite não tem IF NOT EXISTS aqui)."""
+    existentes = {r[1] for r in conn.execute(f"PRAGMA table_info({tabela})")}
+    if coluna not in existentes:
+        conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}")
+
+def _criar_triggers_versao(conn):
+    for tabela in ("rendas", "gastos"):
+        for evento, ids in (
+            ("INSERT", "NEW.id_usuario"),
+            ("UPDATE", "OLD.id_usuario, NEW.id_usuario"),
+            ("DELETE", "OLD.id_usuario"),
+        ):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{tabela}_versao_{evento.lower()}
+                AFTER {evento} ON {tabela}
+                BEGIN
+                    UPDATE usuarios SET versao_dados = versao_dados + 1 WHERE id_usuario IN ({ids});
+                END
+            """)
+
+def _migracao_006_versao_dados(conn):
+    # Contador por usuário incrementado a cada escrita em rendas/gastos; serve de
+    # chave de cache (invalidação só dos dados daquele usuário).
+    _adicionar_coluna(conn, "usuarios", "versao_dados", "INTEGER NOT NULL DEFAULT 0")
+    _criar_triggers_versao(conn)
+
+
+def _migracao_007_hash_importacao(conn):
+    # Deduplicação de extratos importados (importacao.py): hash por lançamento,
+    # único por usuário. Lançamentos manuais ficam com NULL e não entram no índice.
+    for tabela in ("rendas", "gastos"):
+        _adicionar_coluna(conn, tabela, "hash_importacao", "TEXT")
+        conn.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{tabela}_hash_importacao "
+            f"ON {tabela} (id_usuario, hash_importacao) WHERE hash_importacao IS NOT NULL"
+        )
+
+
+# Dinheiro em centavos inteiros: somas exatas (sem deriva de float) e colunas
+# int64 no pandas. SQLite não altera tipo de coluna, então rendas/gastos são
+# recriadas (cópia + DROP + RENAME); índices e triggers vão junto e são refeitos.
+_SCHEMA_CENTAVOS = {
+    "rendas": """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_usuario INTEGER,
+        descricao TEXT,
+        valor_centavos INTEGER NOT NULL DEFAULT 0,
+        mes INTEGER,
+        ano INTEGER,
+        hash_importacao TEXT
+    """,
+    "gastos": """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_usuario INTEGER,
+        id_classificacao INTEGER,
+        categoria TEXT,
+        descricao TEXT,
+        valor_centavos INTEGER NOT NULL DEFAULT 0,
+        mes INTEGER,
+        ano INTEGER,
+        hash_importacao TEXT
+    """,
+}
+
+def _migracao_008_valor_centavos(conn):
+    for tabela, definicao in _SCHEMA_CENTAVOS.items():
+        colunas = [r[1] for r in conn.execute(f"PRAGMA table_info({tabela})")]
+        if "valor_centavos" in colunas:
+            continue
+        sequencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (tabela,)).fetchone()
+        comuns = ", ".join(c for c in colunas if c != "valor")
+        conn.execute(f"CREATE TABLE {tabela}_centavos ({definicao})")
+        conn.execute(
+            f"INSERT INTO {tabela}_centavos ({comuns}, valor_centavos) "
+            f"SELECT {comuns}, CAST(ROUND(COALESCE(valor, 0) * 100) AS INTEGER) FROM {tabela}"
+        )
+        conn.execute(f"DROP TABLE {tabela}")
+        conn.execute(f"ALTER TABLE {tabela}_centavos RENAME TO {tabela}")
+        if sequencia:
+            # preserva o AUTOINCREMENT: ids de linhas já excluídas não voltam
+            conn.execute(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (sequencia[0], tabela)
             )
-        """)
+
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_gastos_usuario_periodo_valor "
+        "ON gastos (id_usuario, ano, mes, id_classificacao, valor_centavos)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_rendas_usuario_periodo_valor "
+        "ON rendas (id_usuario, ano, mes, valor_centavos)"
+    )
+    _migracao_007_hash_importacao(conn)
+    _criar_triggers_versao(conn)
+
+    conn.execute("DROP TABLE IF EXISTS resumo_mensal")
+    conn.execute("""
+        CREATE TABLE resumo_mensal (
+            id_usuario INTEGER NOT NULL,
+            ano INTEGER NOT NULL,
+            mes INTEGER NOT NULL,
+            id_classificacao INTEGER NOT NULL,
+            valor_centavos INTEGER NOT NULL DEFAULT 0,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (id_usuario, ano, mes, id_classificacao)
+        ) WITHOUT ROWID
+    """)
+    for sql in _sql_triggers_resumo("gastos", "{r}.id_classificacao"):
+        conn.execute(sql)
+    for sql in _sql_triggers_resumo("rendas", str(RESUMO_ID_RENDAS)):
+        conn.execute(sql)
+    _reconstruir_resumo_mensal(conn)
+
+
+def _migracao_009_login_attempts_data(conn):
+    # retenção (retencao.py) / falhas_login_recentes: faixa só em attempted_at
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_login_attempts_data ON login_attempts (attempted_at)")
+
+def _migracao_010_indices_auditoria(conn):
+    # paginar_audit_logs: filtro por ator/alvo + ordem (created_at, id). O rowid
+    # já vai no fim de todo índice, então (x, created_at) serve de (x, created_at, id).
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_ator ON audit_logs (actor_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_alvo ON audit_logs (target_id, created_at)")
+
+
+def _migracao_011_agregados_diarios(conn):
+    # retencao.py: contagens por dia das linhas apagadas de audit_logs / login_attempts
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS audit_logs_diario (
+            dia TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (dia, event_type)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS login_attempts_diario (
+            dia TEXT NOT NULL,
+            success INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (dia, success)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migracao_012_indice_usuarios_nome(conn):
+    # buscar_usuarios: ORDER BY nome (sem diferenciar maiúsculas), id_usuario
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_nome ON usuarios (nome COLLATE NOCASE, id_usuario)")
+
+
+# Busca textual (buscar_lancamentos): índices FTS5 sobre descricao/categoria.
+# Cada palavra é indexada com o usuário no próprio token ("mercado" do usuário
+# 42 vira "u42xmercado"): a busca de um usuário só lê os termos dele, em vez de
+# cruzar a lista de todas as linhas com "mercado" de todos os usuários com a
+# lista do usuário. As palavras (letras e dígitos) são extraídas em Python
+# (termos_busca): o SQLite não tem regex, e qualquer pontuação que sobrasse no
+# texto seria separador no tokenizer, deixando a palavra seguinte sem o
+# prefixo (ou com o de outro usuário, se o texto for "a!u7xsalario").
+#
+# Os triggers em rendas/gastos são SQL puro, para as tabelas continuarem
+# graváveis por qualquer cliente SQLite (linha de comando, restauração,
+# scripts): tiram a linha do índice (a tabela FTS guarda o próprio conteúdo,
+# então apagar não precisa recalcular os termos) e anotam o id em
+# <tabela>_busca_pendente. Quem indexa os anotados é _indexar_pendentes, que
+# buscar_lancamentos chama antes de consultar: o índice nunca está atrasado
+# para a busca.
+_TOKENIZADOR_BUSCA = "unicode61 remove_diacritics 2"
+_PALAVRA_BUSCA = re.compile(r"[^\W_]+")
+# por tabela: colunas indexadas e pesos do bm25 (categoria vale mais que descrição)
+_COLUNAS_BUSCA = {
+    "gastos": (("categoria", "descricao"), "bm25(2.0, 1.0)"),
+    "rendas": (("descricao",), "bm25(1.0)"),
+}
+
+def _palavras_busca(texto) -> list:
+    # NFC: acentos decompostos ("a" + U+0303) não partem a palavra
+    return _PALAVRA_BUSCA.findall(unicodedata.normalize("NFC", texto)) if texto else []
+
+def _termos_busca(id_usuario, texto) -> str:
+    """termos_busca(id_usuario, texto) no SQL: as palavras do texto, cada uma com o prefixo u<id_usuario>x."""
+    prefixo = f"u{id_usuario}x"
+    return " ".join(prefixo + p for p in _palavras_busca(texto))
+
+def _sql_termos_busca(coluna: str, registro: str) -> str:
+    return f"termos_busca({registro}.id_usuario, {registro}.{coluna})"
+
+def _criar_busca(conn, tabela: str):
+    colunas, rank = _COLUNAS_BUSCA[tabela]
+    conn.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {tabela}_fts USING fts5("
+        f"{', '.join(colunas)}, tokenize='{_TOKENIZADOR_BUSCA}')"
+    )
+    conn.execute(f"INSERT INTO {tabela}_fts ({tabela}_fts, rank) VALUES ('rank', '{rank}')")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {tabela}_busca_pendente (id INTEGER PRIMARY KEY)")
+    anotar = f"INSERT OR IGNORE INTO {tabela}_busca_pendente (id) VALUES (NEW.id)"
+    tirar = f"DELETE FROM {tabela}_fts WHERE rowid = OLD.id"
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS trg_{tabela}_busca_ins AFTER INSERT ON {tabela} "
+        f"BEGIN {anotar}; END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS trg_{tabela}_busca_del AFTER DELETE ON {tabela} "
+        f"BEGIN {tirar}; DELETE FROM {tabela}_busca_pendente WHERE id = OLD.id; END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS trg_{tabela}_busca_upd "
+        f"AFTER UPDATE OF {', '.join(('id', 'id_usuario') + colunas)} ON {tabela} "
+        f"BEGIN {tirar}; {anotar}; END"
+    )
+
+def _indexar(conn, tabela: str, filtro: str = "") -> int:
+    colunas = _COLUNAS_BUSCA[tabela][0]
+    termos = ", ".join(_sql_termos_busca(c, "x") for c in colunas)
+    return conn.execute(
+        f"INSERT INTO {tabela}_fts (rowid, {', '.join(colunas)}) "
+        f"SELECT x.id, {termos} FROM {tabela} x WHERE x.id_usuario IS NOT NULL{filtro}"
+    ).rowcount
+
+def _indexar_pendentes(conn, tabela: str) -> int:
+    """Indexa as linhas anotadas em <tabela>_busca_pendente. Chamar dentro de uma transação de escrita."""
+    pendentes = f"SELECT id FROM {tabela}_busca_pendente"
+    conn.execute(f"DELETE FROM {tabela}_fts WHERE rowid IN ({pendentes})")
+    indexadas = _indexar(conn, tabela, f" AND x.id IN ({pendentes})")
+    conn.execute(f"DELETE FROM {tabela}_busca_pendente")
+    return indexadas
+
+def _reconstruir_busca(conn, tabela: str):
+    conn.execute(f"DELETE FROM {tabela}_fts")
+    conn.execute(f"DELETE FROM {tabela}_busca_pendente")
+    _indexar(conn, tabela)
+
+def _refazer_busca(conn, tabela: str):
+    """Recria índice, tabela de pendentes e triggers do zero (mudança de formato) e reindexa."""
+    for trigger in ("ins", "del", "upd"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{tabela}_busca_{trigger}")
+    conn.execute(f"DROP TABLE IF EXISTS {tabela}_fts")
+    _criar_busca(conn, tabela)
+    _reconstruir_busca(conn, tabela)
+
+def _migracao_013_busca_textual(conn):
+    # Tabelas recriadas (como na migração 8) perdem estes triggers: refazer com _criar_busca.
+    for tabela in _COLUNAS_BUSCA:
+        _criar_busca(conn, tabela)
+        _reconstruir_busca(conn, tabela)
+
+
+def _migracao_014_recorrencias(conn):
+    # Lançamentos recorrentes (recorrencias.py). Períodos como ano * 12 + mes - 1;
+    # proximo_periodo é o próximo mês ainda não materializado da regra.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS recorrencias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_usuario INTEGER NOT NULL,
+            tipo TEXT NOT NULL CHECK (tipo IN ('gastos', 'rendas')),
+            id_classificacao INTEGER,
+            categoria TEXT,
+            descricao TEXT NOT NULL,
+            valor_centavos INTEGER NOT NULL,
+            intervalo_meses INTEGER NOT NULL DEFAULT 1 CHECK (intervalo_meses >= 1),
+            inicio_periodo INTEGER NOT NULL,
+            fim_periodo INTEGER,
+            proximo_periodo INTEGER NOT NULL,
+            ativa INTEGER NOT NULL DEFAULT 1,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # materializar: regras ativas vencidas; listar_recorrencias: por usuário
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_recorrencias_proximo ON recorrencias (proximo_periodo) WHERE ativa = 1"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_recorrencias_usuario ON recorrencias (id_usuario)")
+
+
+def _migracao_015_busca_sem_pontuacao(conn):
+    # palavras extraídas em Python no lugar dos replace() sobre uma lista fixa
+    # de separadores: o índice é refeito
+    for tabela in _COLUNAS_BUSCA:
+        _refazer_busca(conn, tabela)
+
+
+def _migracao_016_busca_sem_funcao_nos_triggers(conn):
+    # Os triggers da 15 chamavam termos_busca, que só existe nas conexões do
+    # app: qualquer outro cliente falhava ao gravar rendas/gastos. Agora os
+    # triggers só anotam pendências, e o índice passa a guardar o conteúdo
+    # (o 'delete' de uma tabela sem conteúdo exige os termos antigos).
+    for tabela in _COLUNAS_BUSCA:
+        _refazer_busca(conn, tabela)
+
+
+# Lista ordenada de (versão, passo). Cada passo precisa ser idempotente
+# (IF NOT EXISTS etc.) e recebe a conexão já dentro da transação da migração.
+# Novas migrações entram sempre no fim, com a próxima versão.
+MIGRACOES = [
+    (1, _migracao_001_tabelas_base),
+    (2, _migracao_002_indices),
+    (3, _migracao_003_normaliza_periodo),
+    (4, _migracao_004_indices_cobertura),
+    (5, _migracao_005_resumo_mensal),
+    (6, _migracao_006_versao_dados),
+    (7, _migracao_007_hash_importacao),
+    (8, _migracao_008_valor_centavos),
+    (9, _migracao_009_login_attempts_data),
+    (10, _migracao_010_indices_auditoria),
+    (11, _migracao_011_agregados_diarios),
+    (12, _migracao_012_indice_usuarios_nome),
+    (13, _migracao_013_busca_textual),
+    (14, _migracao_014_recorrencias),
+    (15, _migracao_015_busca_sem_pontuacao),
+    (16, _migracao_016_busca_sem_funcao_nos_triggers),
+]
+
+_migrado_em: Optional[str] = None
+_migracao_lock = threading.Lock()
+
+def versao_schema(conn=None) -> int:
+    if conn is None:
+        with conexao() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrar(forcar: bool = False) -> int:
+    """
+    Aplica as migrações pendentes (PRAGMA user_version) uma única vez por processo.
+    Reruns do Streamlit chamam isto a cada interação; após a primeira execução
+    é só uma checagem de flag, sem tocar no banco. Retorna a versão final.
+    """
+    global _migrado_em
+    if _migrado_em == DB_NAME and not forcar:
+        return MIGRACOES[-1][0]
+
+    with _migracao_lock:
+        if _migrado_em == DB_NAME and not forcar:
+            return MIGRACOES[-1][0]
+
+        with conexao() as conn:
+            inicial = atual = versao_schema(conn)
+            for versao, passo in MIGRACOES:
+                if versao <= atual:
+                    continue
+                # BEGIN IMMEDIATE serializa migrações concorrentes de outros processos
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if versao_schema(conn) < versao:
+                        passo(conn)
+                        conn.execute(f"PRAGMA user_version = {int(versao)}")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                atual = versao
+            atual = versao_schema(conn)
+            if atual != inicial:
+                # atualiza estatísticas do planner para os índices novos
+                conn.execute("PRAGMA optimize")
+
+        _migrado_em = DB_NAME
+    return atual
 
 # ---------------- USUÁRIOS / AUTENTICAÇÃO ----------------
 
@@ -101,8 +718,8 @@ def criar_usuario(
     is_admin: bool = False,
     must_change_password: bool = False
 ):
-    hashed = bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt())
-    with conectar() as conn:
+    hashed = senhas.gerar_hash(senha)
+    with conexao() as conn:
         conn.execute(
             """
             INSERT INTO usuarios
@@ -113,14 +730,16 @@ def criar_usuario(
         )
 
 def get_user_by_email(email: str) -> Optional[Tuple]:
-    with conectar() as conn:
+    with conexao() as conn:
         cur = conn.execute("SELECT id_usuario, nome, email, senha, is_admin, must_change_password FROM usuarios WHERE email=?", (email,))
         row = cur.fetchone()
     return row
 
 def autenticar_usuario(email: str, senha: str) -> Optional[Tuple[int, str, bool, bool]]:
     """
-    Autentica usuário e suporta migração automática de hashes SHA256 (hex) antigos para bcrypt.
+    Autentica usuário; o bcrypt roda no pool de senhas.py (TimeoutError se ocupado).
+    Hashes SHA256 (hex) antigos — e, com SENHAS_REHASH=1, bcrypt de custo menor que
+    BCRYPT_CUSTO — são regravados em segundo plano, sem atrasar o login.
     Retorna (id_usuario, nome, is_admin, must_change_password) se sucesso, else None.
     """
     row = get_user_by_email(email)
@@ -132,58 +751,38 @@ def autenticar_usuario(email: str, senha: str) -> Optional[Tuple[int, str, bool,
     if isinstance(stored_hash, memoryview):
         stored_hash = bytes(stored_hash)
 
-    # Case 1: stored_hash is bytes (likely bcrypt bytes) -> try bcrypt
-    if isinstance(stored_hash, (bytes, bytearray)):
-        try:
-            if bcrypt.checkpw(senha.encode("utf-8"), bytes(stored_hash)):
-                return (id_usuario, nome, bool(is_admin), bool(must_change))
-        except Exception:
-            return None
-
-    # Case 2: stored_hash is str
-    if isinstance(stored_hash, str):
-        s = stored_hash
-
-        if len(s) == 64 and all(c in string.hexdigits for c in s):
-            if hashlib.sha256(senha.encode("utf-8")).hexdigest() == s:
-                try:
-                    new_hash = bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt())
-                    with conectar() as conn:
-                        conn.execute("UPDATE usuarios SET senha = ? WHERE id_usuario = ?", (new_hash, id_usuario))
-                except Exception:
-                    pass
-                return (id_usuario, nome, bool(is_admin), bool(must_change))
-            else:
-                return None
-
-        if s.startswith("$2"):
-            try:
-                if bcrypt.checkpw(senha.encode("utf-8"), s.encode("utf-8")):
-                    return (id_usuario, nome, bool(is_admin), bool(must_change))
-            except Exception:
-                return None
-
+    if not senhas.verificar(senha, stored_hash):
         return None
+    if senhas.precisa_rehash(stored_hash):
+        senhas.rehash_em_segundo_plano(
+            senha, lambda novo: _regravar_hash(id_usuario, stored_hash, novo)
+        )
+    return (id_usuario, nome, bool(is_admin), bool(must_change))
 
-    return None
+def _regravar_hash(id_usuario: int, antigo, novo: bytes):
+    # só troca se a senha não mudou enquanto o hash novo era calculado
+    with conexao() as conn:
+        conn.execute(
+            "UPDATE usuarios SET senha = ? WHERE id_usuario = ? AND senha = ?", (novo, id_usuario, antigo)
+        )
 
 def atualizar_senha(id_usuario: int, nova_senha: str, must_change: bool = False):
-    hashed = bcrypt.hashpw(nova_senha.encode("utf-8"), bcrypt.gensalt())
-    with conectar() as conn:
+    hashed = senhas.gerar_hash(nova_senha)
+    with conexao() as conn:
         conn.execute("UPDATE usuarios SET senha = ?, must_change_password = ? WHERE id_usuario = ?", (hashed, 1 if must_change else 0, id_usuario))
 
 def set_must_change_password(id_usuario: int, flag: bool):
-    with conectar() as conn:
+    with conexao() as conn:
         conn.execute("UPDATE usuarios SET must_change_password = ? WHERE id_usuario = ?", (1 if flag else 0, id_usuario))
 
 # ---------------- LOGIN ATTEMPTS / LOCKOUT ----------------
 
 def record_login_attempt(email: str, success: bool, ip: Optional[str] = None):
-    with conectar() as conn:
+    with conexao() as conn:
         conn.execute("INSERT INTO login_attempts (email, success, ip) VALUES (?,?,?)", (email, 1 if success else 0, ip))
 
 def count_failed_attempts_recent(email: str, minutes: int = 15) -> int:
-    with conectar() as conn:
+    with conexao() as conn:
         cur = conn.execute(
             "SELECT COUNT(1) FROM login_attempts WHERE email = ? AND success = 0 AND attempted_at >= datetime('now', ?)",
             (email, f"-{minutes} minutes")
@@ -192,45 +791,379 @@ def count_failed_attempts_recent(email: str, minutes: int = 15) -> int:
     return row[0] if row else 0
 
 def clear_login_attempts(email: str):
-    with conectar() as conn:
+    with conexao() as conn:
         conn.execute("DELETE FROM login_attempts WHERE email = ?", (email,))
 
-# ---------------- AUDIT / LOG ----------------
+def gravar_tentativas_login(tentativas: list):
+    """Grava em lote tuplas (email, success, ip, attempted_at) numa transação só."""
+    if not tentativas:
+        return
+    with conexao() as conn:
+        conn.executemany(
+            "INSERT INTO login_attempts (email, success, ip, attempted_at) VALUES (?,?,?,?)", tentativas
+        )
+
+def falhas_login_recentes(minutes: int = 15) -> list:
+    """(email, ip, attempted_at) das falhas na janela; usado para aquecer o limitador."""
+    with conexao() as conn:
+        return conn.execute(
+            "SELECT email, ip, attempted_at FROM login_attempts "
+            "WHERE attempted_at >= datetime('now', ?) AND success = 0 ORDER BY attempted_at",
+            (f"-{minutes} minutes",),
+        ).fetchall()
+
+# ---------------- AUDITORIA (gravação assíncrona) ----------------
+# log_audit só enfileira; uma thread grava em lotes (executemany, uma
+# transação por lote). Garantias:
+#   * created_at é o instante da chamada (UTC, mesmo formato de CURRENT_TIMESTAMP),
+#     não o da gravação; a ordem de gravação é a ordem das chamadas (entre
+#     threads, a ordem de entrada na fila; a de cada thread se mantém).
+#   * um evento aceito fica no máximo AUDIT_INTERVALO_S segundos (ou até juntar
+#     AUDIT_LOTE eventos) só na memória. Saída normal do processo (atexit) e
+#     descarregar_auditoria() gravam tudo o que estiver pendente.
+#   * fila cheia: log_audit espera até AUDIT_ESPERA_MAX_S (backpressure) e, se
+#     ainda não houver espaço, grava na thread de quem chamou o que estava na
+#     fila e depois o evento, numa transação. A thread gravadora e essa
+#     gravação síncrona se revezam num lock, então a ordem se mantém. Nada é
+#     descartado.
+#   * falha ao gravar um lote: novas tentativas com espera crescente; esgotadas,
+#     o lote vai para o app.log (nível ERROR) para não travar a fila.
+#   * queda abrupta (SIGKILL, falta de energia) perde o que ainda estava na fila.
+# AUDIT_ASSINCRONO=0 volta ao insert síncrono (ex.: scripts e depuração).
+
+AUDIT_ASSINCRONO = os.environ.get("AUDIT_ASSINCRONO", "1") != "0"
+AUDIT_FILA_MAX = int(os.environ.get("AUDIT_FILA_MAX", "10000"))
+AUDIT_LOTE = int(os.environ.get("AUDIT_LOTE", "500"))
+AUDIT_INTERVALO_S = float(os.environ.get("AUDIT_INTERVALO_S", "1"))
+AUDIT_ESPERA_MAX_S = float(os.environ.get("AUDIT_ESPERA_MAX_S", "2"))
+AUDIT_TENTATIVAS = 3
+
+_SQL_AUDITORIA = (
+    "INSERT INTO audit_logs (event_type, actor_id, target_id, details, created_at) VALUES (?,?,?,?,?)"
+)
+_PARAR = object()
+
+def _agora_utc() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def _gravar_auditoria(eventos: list):
+    with conexao() as conn:
+        conn.executemany(_SQL_AUDITORIA, eventos)
+
+
+class GravadorAuditoria(threading.Thread):
+    """Thread daemon que esvazia a fila de auditoria em lotes."""
+
+    def __init__(self, tamanho_fila: int = AUDIT_FILA_MAX, lote: int = AUDIT_LOTE,
+                 intervalo: float = AUDIT_INTERVALO_S, espera_max: float = AUDIT_ESPERA_MAX_S):
+        super().__init__(name="gravador-auditoria", daemon=True)
+        self.lote = lote
+        self.intervalo = intervalo
+        self.espera_max = espera_max
+        self._fila: queue.Queue = queue.Queue(maxsize=tamanho_fila)
+        self.gravados = 0
+        self.lotes = 0
+        self.sincronos = 0
+        self.perdidos = 0
+        # quem tira eventos da fila (a thread ou a gravação síncrona) grava-os
+        # antes de soltar o lock: os lotes entram no banco na ordem da fila
+        self._gravando = threading.Lock()
+        # a thread espera por eventos sem segurar o lock
+        self._tem_itens = threading.Event()
+
+    def _enfileirar(self, item, timeout: Optional[float] = None, bloquear: bool = True):
+        self._fila.put(item, block=bloquear, timeout=timeout)
+        if not self._tem_itens.is_set():  # set() sempre pega o lock do Event
+            self._tem_itens.set()
+
+    def registrar(self, evento: tuple):
+        try:
+            self._enfileirar(evento, self.espera_max)
+            return
+        except queue.Full:
+            pass
+        # backpressure esgotada: grava na thread de quem chamou, depois do que
+        # já estava na fila (mesma ordem das chamadas). Enquanto a thread grava
+        # um lote, a fila pode ter aberto espaço: aí o evento entra nela.
+        while not self._gravando.acquire(timeout=0.005):
+            try:
+                self._enfileirar(evento, bloquear=False)
+                return
+            except queue.Full:
+                pass
+        try:
+            itens = self._esvaziar()
+            self.sincronos += 1
+            parar = self._processar(itens + [evento])
+        finally:
+            self._gravando.release()
+        if parar:
+            # o pedido de parada saiu da fila junto; devolve para a thread
+            self._enfileirar(_PARAR)
+
+    def descarregar(self, timeout: Optional[float] = None) -> bool:
+        """Espera gravar tudo o que foi enfileirado até agora. False se estourar o timeout."""
+        if not self.is_alive():
+            return self._fila.empty()
+        marcador = threading.Event()
+        try:
+            self._enfileirar(marcador, timeout)
+        except queue.Full:
+            return False
+        return marcador.wait(timeout)
+
+    def parar(self, timeout: Optional[float] = 10):
+        """Grava o que estiver pendente e encerra a thread."""
+        if self.is_alive():
+            self._enfileirar(_PARAR)
+            self.join(timeout)
+
+    def pendentes(self) -> int:
+        return self._fila.qsize()
+
+    def _esvaziar(self) -> list:
+        itens = []
+        while True:
+            try:
+                itens.append(self._fila.get_nowait())
+            except queue.Empty:
+                return itens
+
+    def _processar(self, itens: list) -> bool:
+        """Grava os eventos de `itens`, libera os marcadores; True se houver pedido de parada."""
+        eventos = [i for i in itens if isinstance(i, tuple)]
+        if eventos:
+            self._gravar(eventos)
+        for item in itens:
+            if isinstance(item, threading.Event):
+                item.set()
+        return _PARAR in itens
+
+    def run(self):
+        parar = False
+        while not parar:
+            self._tem_itens.wait(self.intervalo)
+            with self._gravando:
+                self._tem_itens.clear()
+                try:
+                    itens = [self._fila.get_nowait()]
+                except queue.Empty:
+                    continue
+                prazo = time.monotonic() + self.intervalo
+                # junta até `lote` eventos ou até o intervalo vencer; um marcador
+                # (descarregar/parar) encerra o lote na hora
+                while len(itens) < self.lote and isinstance(itens[-1], tuple):
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    try:
+                        itens.append(self._fila.get(timeout=restante))
+                    except queue.Empty:
+                        break
+                parar = self._processar(itens)
+                if not self._fila.empty():
+                    self._tem_itens.set()
+
+        # eventos que chegaram depois do pedido de parada
+        with self._gravando:
+            self._processar(self._esvaziar())
+
+    def _gravar(self, eventos: list):
+        for tentativa in range(AUDIT_TENTATIVAS):
+            try:
+                _gravar_auditoria(eventos)
+                self.gravados += len(eventos)
+                self.lotes += 1
+                return
+            except sqlite3.Error:
+                time.sleep(0.1 * 2 ** tentativa)
+        self.perdidos += len(eventos)
+        logger.error(
+            "auditoria: %d evento(s) não gravado(s): %r", len(eventos), eventos
+        )
+
+    def stats(self) -> dict:
+        return {
+            "pendentes": self.pendentes(),
+            "gravados": self.gravados,
+            "lotes": self.lotes,
+            "sincronos": self.sincronos,
+            "perdidos": self.perdidos,
+        }
+
+
+_gravador: Optional[GravadorAuditoria] = None
+_gravador_lock = threading.Lock()
+
+def _obter_gravador() -> GravadorAuditoria:
+    global _gravador
+    if _gravador is None or not _gravador.is_alive():
+        with _gravador_lock:
+            if _gravador is None or not _gravador.is_alive():
+                _gravador = GravadorAuditoria()
+                _gravador.start()
+    return _gravador
+
+def descarregar_auditoria(timeout: Optional[float] = 5) -> bool:
+    """Grava os eventos de auditoria pendentes (leitura logo após escrita, testes)."""
+    if _gravador is None:
+        return True
+    return _gravador.descarregar(timeout)
+
+def parar_auditoria(timeout: Optional[float] = 10):
+    if _gravador is not None:
+        _gravador.parar(timeout)
+
+atexit.register(parar_auditoria)
+
+def estatisticas_auditoria() -> dict:
+    return _gravador.stats() if _gravador is not None else {}
 
 def log_audit(event_type: str, actor_id: Optional[int], target_id: Optional[int], details: Optional[str] = None):
-    with conectar() as conn:
-        conn.execute(
-            "INSERT INTO audit_logs (event_type, actor_id, target_id, details) VALUES (?,?,?,?)",
-            (event_type, actor_id, target_id, details)
+    """Registra um evento de auditoria. Não bloqueia (ver garantias acima)."""
+    evento = (event_type, actor_id, target_id, details, _agora_utc())
+    if not AUDIT_ASSINCRONO:
+        _gravar_auditoria([evento])
+        return
+    _obter_gravador().registrar(evento)
+
+COLUNAS_AUDITORIA = ("id", "event_type", "actor_id", "target_id", "details", "created_at")
+
+def _instante_auditoria(valor, fim: bool = False) -> str:
+    """date/datetime/str -> texto comparável com created_at (UTC). `fim` com data = dia inteiro."""
+    if isinstance(valor, datetime):
+        return valor.strftime("%Y-%m-%d %H:%M:%S")
+    texto = str(valor)
+    if fim and len(texto) == 10:  # só a data: inclui o dia todo
+        return texto + " 23:59:59"
+    return texto
+
+def _filtro_auditoria(event_type=None, actor_id=None, target_id=None, inicio=None, fim=None):
+    """WHERE (sem a palavra) e parâmetros para os filtros da auditoria."""
+    condicoes, params = [], []
+    if event_type:
+        tipos = [event_type] if isinstance(event_type, str) else list(event_type)
+        condicoes.append(f"event_type IN ({', '.join('?' * len(tipos))})")
+        params += tipos
+    if actor_id is not None:
+        condicoes.append("actor_id = ?")
+        params.append(int(actor_id))
+    if target_id is not None:
+        condicoes.append("target_id = ?")
+        params.append(int(target_id))
+    if inicio is not None:
+        condicoes.append("created_at >= ?")
+        params.append(_instante_auditoria(inicio))
+    if fim is not None:
+        condicoes.append("created_at <= ?")
+        params.append(_instante_auditoria(fim, fim=True))
+    return condicoes, params
+
+def paginar_audit_logs(limite: int = 100, cursor: Optional[Tuple[str, int]] = None, **filtros):
+    """
+    Uma página de audit_logs, do mais novo para o mais antigo, paginada por
+    chave (created_at, id): cada página custa o mesmo, sem OFFSET.
+
+    `cursor` é o (created_at, id) devolvido pela página anterior. Filtros:
+    event_type (str ou lista), actor_id, target_id, inicio, fim (date, datetime
+    ou texto UTC). Retorna (DataFrame, próximo cursor ou None se acabou).
+    """
+    descarregar_auditoria()
+    condicoes, params = _filtro_auditoria(**filtros)
+    if cursor is not None:
+        condicoes.append("(created_at, id) < (?, ?)")
+        params += [cursor[0], int(cursor[1])]
+    where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    with conexao() as conn:
+        df = pd.read_sql(
+            f"SELECT {', '.join(COLUNAS_AUDITORIA)} FROM audit_logs{where} "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            conn, params=(*params, limite + 1),
         )
+    if len(df) <= limite:
+        return df, None
+    df = df.iloc[:limite]
+    ultima = df.iloc[-1]
+    return df, (ultima["created_at"], int(ultima["id"]))
+
+def iterar_audit_logs(lote: int = 5000, **filtros):
+    """
+    Percorre audit_logs em ordem cronológica, em listas de até `lote` tuplas
+    (COLUNAS_AUDITORIA), paginando por chave. Memória limitada a um lote.
+    """
+    descarregar_auditoria()
+    base, params_base = _filtro_auditoria(**filtros)
+    cursor = None
+    while True:
+        condicoes, params = list(base), list(params_base)
+        if cursor is not None:
+            condicoes.append("(created_at, id) > (?, ?)")
+            params += cursor
+        where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        with conexao() as conn:
+            linhas = conn.execute(
+                f"SELECT {', '.join(COLUNAS_AUDITORIA)} FROM audit_logs{where} "
+                "ORDER BY created_at, id LIMIT ?",
+                (*params, lote),
+            ).fetchall()
+        if not linhas:
+            return
+        yield linhas
+        if len(linhas) < lote:
+            return
+        cursor = [linhas[-1][5], linhas[-1][0]]
+
+def tipos_audit_logs() -> list:
+    with conexao() as conn:
+        return [r[0] for r in conn.execute("SELECT DISTINCT event_type FROM audit_logs ORDER BY event_type")]
 
 def listar_audit_logs(limit: int = 200, event_type: Optional[str] = None) -> pd.DataFrame:
-    with conectar() as conn:
-        if event_type:
-            df = pd.read_sql("SELECT * FROM audit_logs WHERE event_type = ? ORDER BY created_at DESC LIMIT ?", conn, params=(event_type, limit))
-        else:
-            df = pd.read_sql("SELECT * FROM audit_logs ORDER BY created_at DESC LIMIT ?", conn, params=(limit,))
-    return df
+    return paginar_audit_logs(limit, event_type=event_type)[0]
 
 # ---------------- ADMIN / MANAGEMENT ----------------
 
-def listar_usuarios() -> pd.DataFrame:
-    with conectar() as conn:
-        df = pd.read_sql("SELECT id_usuario, nome, email, is_admin, must_change_password FROM usuarios", conn)
+def _usuarios_bool(df: pd.DataFrame) -> pd.DataFrame:
     if not df.empty:
         df["is_admin"] = df["is_admin"].astype(int).astype(bool)
         df["must_change_password"] = df["must_change_password"].astype(int).astype(bool)
     return df
 
+def listar_usuarios() -> pd.DataFrame:
+    with conexao() as conn:
+        df = pd.read_sql("SELECT id_usuario, nome, email, is_admin, must_change_password FROM usuarios", conn)
+    return _usuarios_bool(df)
+
+def buscar_usuarios(busca: str = "", limite: int = 50, offset: int = 0) -> Tuple[pd.DataFrame, int]:
+    """
+    Uma página de usuários em ordem de nome, filtrando no SQL por trecho do
+    nome ou do e-mail (sem diferenciar maiúsculas). Retorna (página, total
+    de usuários que casam com a busca).
+    """
+    where, params = "", []
+    termo = (busca or "").strip()
+    if termo:
+        # % e _ digitados pelo admin são literais
+        padrao = "%" + termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        where = " WHERE nome LIKE ? ESCAPE '\\' OR email LIKE ? ESCAPE '\\'"
+        params = [padrao, padrao]
+    with conexao() as conn:
+        total = conn.execute(f"SELECT COUNT(1) FROM usuarios{where}", params).fetchone()[0]
+        df = pd.read_sql(
+            f"SELECT id_usuario, nome, email, is_admin, must_change_password FROM usuarios{where} "
+            "ORDER BY nome COLLATE NOCASE, id_usuario LIMIT ? OFFSET ?",
+            conn, params=(*params, limite, offset),
+        )
+    return _usuarios_bool(df), total
+
 def get_admin_count() -> int:
-    with conectar() as conn:
+    with conexao() as conn:
         cur = conn.execute("SELECT COUNT(1) FROM usuarios WHERE is_admin = 1")
         row = cur.fetchone()
     return row[0] if row else 0
 
 def can_delete_user(target_id: int) -> bool:
     """Impede exclusão do último admin."""
-    with conectar() as conn:
+    with conexao() as conn:
         cur = conn.execute("SELECT is_admin FROM usuarios WHERE id_usuario = ?", (target_id,))
         row = cur.fetchone()
         if not row:
@@ -252,124 +1185,635 @@ def atualizar_usuario(id_usuario: int, nome: Optional[str] = None, email: Option
     if not updates:
         return
     params.append(id_usuario)
-    with conectar() as conn:
+    with conexao() as conn:
         conn.execute(f"UPDATE usuarios SET {', '.join(updates)} WHERE id_usuario = ?", params)
 
 def excluir_usuario(id_usuario: int):
     if not can_delete_user(id_usuario):
         raise RuntimeError("Impossível excluir o último administrador.")
-    with conectar() as conn:
+    with conexao() as conn:
         conn.execute("DELETE FROM usuarios WHERE id_usuario = ?", (id_usuario,))
+        conn.execute("UPDATE recorrencias SET ativa = 0 WHERE id_usuario = ?", (id_usuario,))
 
 # ---------------- CRUD RENDAS / GASTOS ----------------
 
+def obter_versao_dados(id_usuario) -> int:
+    """Versão dos lançamentos do usuário; muda a cada escrita em rendas/gastos."""
+    with conexao() as conn:
+        row = conn.execute("SELECT versao_dados FROM usuarios WHERE id_usuario = ?", (id_usuario,)).fetchone()
+    return row[0] if row else 0
+
+COLUNAS_RENDAS = ("id", "id_usuario", "descricao", "valor_centavos", "mes", "ano")
+COLUNAS_GASTOS = ("id", "id_usuario", "id_classificacao", "categoria", "descricao", "valor_centavos", "mes", "ano")
+
+# ---------------- DINHEIRO ----------------
+# No banco e nos DataFrames os valores ficam em centavos (int). A conversão
+# de/para reais acontece só na borda: formulários, editor e exibição.
+
+def para_centavos(valor) -> int:
+    """Reais (float, str ou Decimal) -> centavos; meio centavo arredonda para longe do zero."""
+    return int((Decimal(str(valor)) * 100).to_integral_value(ROUND_HALF_UP))
+
+def serie_para_centavos(serie: pd.Series) -> pd.Series:
+    """Versão vetorizada de para_centavos; o que não for número vira <NA>."""
+    reais = pd.to_numeric(serie, errors="coerce").to_numpy(dtype="float64")
+    # round(…, 6) tira o ruído binário (12.345 * 100 = 1234.4999…) antes do
+    # arredondamento meio-para-longe-do-zero, igual ao ROUND do SQLite
+    centavos = np.round(reais * 100, 6)
+    return pd.Series(np.trunc(centavos + np.copysign(0.5, centavos)), index=serie.index).astype("Int64")
+
+def para_reais(centavos):
+    """Centavos (int, array ou Series) -> reais (float), só para exibição."""
+    return centavos / 100
+
+# Domínio de mes e id_classificacao. Os dtypes compactos da carga (TIPOS_INT)
+# e o schema Parquet contam com ele; quem grava valida aqui.
+MESES = range(1, 13)
+IDS_CLASSIFICACAO = frozenset(range(1, 7))  # os de logic.classificacao_base_df
+
+def _validar_mes(mes) -> int:
+    if mes is None or float(mes) not in MESES:
+        raise ValueError(f"Mês inválido: {mes} (use 1 a 12).")
+    return int(mes)
+
+def _validar_classificacao(id_classificacao) -> int:
+    if id_classificacao is None or float(id_classificacao) not in IDS_CLASSIFICACAO:
+        raise ValueError(f"Classificação desconhecida: {id_classificacao}.")
+    return int(id_classificacao)
+
 def inserir_renda(id_usuario, descricao, valor, mes, ano):
-    with conectar() as conn:
+    """`valor` em reais. ValueError se o mês não estiver entre 1 e 12."""
+    with conexao() as conn:
         conn.execute(
-            "INSERT INTO rendas VALUES (NULL,?,?,?,?,?)",
-            (id_usuario, descricao, valor, mes, ano)
+            "INSERT INTO rendas (id_usuario, descricao, valor_centavos, mes, ano) VALUES (?,?,?,?,?)",
+            (id_usuario, descricao, para_centavos(valor), _validar_mes(mes), int(ano))
         )
 
 def inserir_gasto(id_usuario, id_classificacao, categoria, descricao, valor, mes, ano):
-    with conectar() as conn:
+    """`valor` em reais. ValueError para mês fora de 1 a 12 ou classificação desconhecida."""
+    with conexao() as conn:
         conn.execute(
-            "INSERT INTO gastos VALUES (NULL,?,?,?,?,?,?,?)",
-            (id_usuario, id_classificacao, categoria, descricao, valor, mes, ano)
+            "INSERT INTO gastos (id_usuario, id_classificacao, categoria, descricao, valor_centavos, mes, ano) VALUES (?,?,?,?,?,?,?)",
+            (id_usuario, _validar_classificacao(id_classificacao), categoria, descricao, para_centavos(valor),
+             _validar_mes(mes), int(ano))
         )
 
-def carregar_rendas(id_usuario):
-    with conectar() as conn:
+def _filtro_periodo(mes=None, ano=None, inicio=None, fim=None):
+    """
+    Monta o WHERE de período. `inicio`/`fim` são tuplas (ano, mes) inclusivas.
+    O `ano >= ?`/`ano <= ?` redundante deixa o SQLite usar faixa no índice
+    (id_usuario, ano, mes) mesmo com o OR.
+    """
+    clausulas, params = [], []
+    if ano is not None:
+        clausulas.append("ano = ?"); params.append(int(ano))
+    if mes is not None:
+        clausulas.append("mes = ?"); params.append(int(mes))
+    if inicio is not None:
+        a, m = int(inicio[0]), int(inicio[1])
+        clausulas.append("ano >= ? AND (ano > ? OR mes >= ?)"); params += [a, a, m]
+    if fim is not None:
+        a, m = int(fim[0]), int(fim[1])
+        clausulas.append("ano <= ? AND (ano < ? OR mes <= ?)"); params += [a, a, m]
+    return clausulas, params
+
+def _carregar(tabela, colunas_validas, id_usuario, mes, ano, inicio, fim, colunas):
+    if colunas is None:
+        colunas = colunas_validas
+    else:
+        invalidas = set(colunas) - set(colunas_validas)
+        if invalidas:
+            raise ValueError(f"Colunas inválidas para {tabela}: {sorted(invalidas)}")
+    clausulas, params = _filtro_periodo(mes, ano, inicio, fim)
+    where = " AND ".join(["id_usuario = ?"] + clausulas)
+    with conexao() as conn:
         df = pd.read_sql(
-            "SELECT * FROM rendas WHERE id_usuario=?",
+            f"SELECT {', '.join(colunas)} FROM {tabela} WHERE {where} ORDER BY id",
             conn,
-            params=(id_usuario,))
-    df = normalizar_int(df, ["mes", "ano", "id_usuario"])
+            params=[id_usuario] + params)
     return normalizar_df(df)
 
-def carregar_gastos(id_usuario):
-    with conectar() as conn:
+def carregar_rendas(id_usuario, mes=None, ano=None, inicio=None, fim=None, colunas=None):
+    """
+    Rendas do usuário. Sem filtros retorna todo o histórico; com `mes`/`ano`
+    ou `inicio`/`fim` ((ano, mes) inclusivos) o recorte é feito no SQL.
+    `colunas` limita as colunas lidas (subconjunto de COLUNAS_RENDAS).
+    """
+    return _carregar("rendas", COLUNAS_RENDAS, id_usuario, mes, ano, inicio, fim, colunas)
+
+def carregar_gastos(id_usuario, mes=None, ano=None, inicio=None, fim=None, colunas=None):
+    """Gastos do usuário; mesmos filtros de `carregar_rendas`."""
+    return _carregar("gastos", COLUNAS_GASTOS, id_usuario, mes, ano, inicio, fim, colunas)
+
+def listar_anos(id_usuario) -> list:
+    """Anos com rendas ou gastos do usuário, em ordem crescente."""
+    with conexao() as conn:
+        cur = conn.execute(
+            """
+            SELECT ano FROM rendas WHERE id_usuario = ? AND ano IS NOT NULL
+            UNION
+            SELECT ano FROM gastos WHERE id_usuario = ? AND ano IS NOT NULL
+            ORDER BY ano
+            """,
+            (id_usuario, id_usuario)
+        )
+        return [int(r[0]) for r in cur.fetchall()]
+
+def listar_categorias(id_usuario, id_classificacao) -> list:
+    with conexao() as conn:
+        cur = conn.execute(
+            "SELECT DISTINCT categoria FROM gastos WHERE id_usuario = ? AND id_classificacao = ? AND categoria IS NOT NULL",
+            (id_usuario, int(id_classificacao))
+        )
+        return [r[0] for r in cur.fetchall()]
+
+# ---------------- BUSCA TEXTUAL ----------------
+
+BUSCA_MAX_PALAVRAS = 8
+COLUNAS_BUSCA = ("tipo", "id", "id_classificacao", "categoria", "descricao", "valor_centavos", "mes", "ano", "relevancia")
+
+def _consulta_fts(id_usuario: int, busca: str) -> Optional[str]:
+    """
+    Texto digitado -> consulta FTS5: cada palavra vira um prefixo do usuário
+    ("merc" -> "u42xmerc"*), todas obrigatórias. None se não houver palavras.
+    """
+    palavras = _palavras_busca(busca)[:BUSCA_MAX_PALAVRAS]
+    if not palavras:
+        return None
+    return " AND ".join(f'"u{int(id_usuario)}x{p}"*' for p in palavras)
+
+def _atualizar_busca(conn, tabelas):
+    """Indexa o que os triggers deixaram pendente (uma consulta por tabela quando não há nada)."""
+    atrasadas = [t for t in tabelas if conn.execute(f"SELECT 1 FROM {t}_busca_pendente LIMIT 1").fetchone()]
+    if atrasadas:
+        conn.execute("BEGIN IMMEDIATE")
+        for tabela in atrasadas:
+            _indexar_pendentes(conn, tabela)
+        conn.commit()
+
+def indexar_busca_pendente():
+    """Indexa agora as linhas pendentes de rendas/gastos (a busca faria isso na próxima consulta)."""
+    with conexao() as conn:
+        _atualizar_busca(conn, list(_COLUNAS_BUSCA))
+
+def buscar_lancamentos(id_usuario, busca: str, tipo: Optional[str] = None,
+                       limite: int = 50, offset: int = 0) -> Tuple[pd.DataFrame, int]:
+    """
+    Rendas e gastos do usuário cuja descrição (ou categoria, nos gastos)
+    contém palavras começando pelas digitadas, sem diferenciar maiúsculas
+    nem acentos. Mais relevantes primeiro (bm25; menor = melhor) e depois os
+    mais recentes. `tipo` limita a "rendas" ou "gastos". Retorna (página no
+    formato COLUNAS_BUSCA, total de lançamentos encontrados).
+    """
+    tabelas = [t for t in ("gastos", "rendas") if tipo in (None, t)]
+    if not tabelas:
+        raise ValueError(f"Tipo de lançamento desconhecido: {tipo}")
+    consulta = _consulta_fts(id_usuario, busca)
+    if consulta is None:
+        return pd.DataFrame(columns=COLUNAS_BUSCA), 0
+
+    partes = {
+        "gastos": "SELECT 'gastos' AS tipo, g.id, g.id_classificacao, g.categoria, g.descricao, "
+                  "g.valor_centavos, g.mes, g.ano, f.rank AS relevancia "
+                  "FROM gastos_fts f JOIN gastos g ON g.id = f.rowid "
+                  "WHERE gastos_fts MATCH ? AND g.id_usuario = ?",
+        "rendas": "SELECT 'rendas' AS tipo, r.id, NULL AS id_classificacao, NULL AS categoria, r.descricao, "
+                  "r.valor_centavos, r.mes, r.ano, f.rank AS relevancia "
+                  "FROM rendas_fts f JOIN rendas r ON r.id = f.rowid "
+                  "WHERE rendas_fts MATCH ? AND r.id_usuario = ?",
+    }
+    params = [v for _ in tabelas for v in (consulta, id_usuario)]
+    with conexao() as conn:
+        _atualizar_busca(conn, tabelas)
+        # o total passa pelo mesmo filtro de usuário da página
+        total = sum(
+            conn.execute(
+                f"SELECT COUNT(1) FROM {t}_fts f JOIN {t} x ON x.id = f.rowid "
+                f"WHERE {t}_fts MATCH ? AND x.id_usuario = ?", (consulta, id_usuario),
+            ).fetchone()[0]
+            for t in tabelas
+        )
+        linhas = conn.execute(
+            " UNION ALL ".join(partes[t] for t in tabelas)
+            + " ORDER BY relevancia, ano DESC, mes DESC, id DESC LIMIT ? OFFSET ?",
+            params + [limite, offset],
+        ).fetchall()
+    # sem read_sql/normalizar_df: numa página de 20 linhas eles custam
+    # vários ms, dez vezes a busca em si
+    return pd.DataFrame.from_records(linhas, columns=COLUNAS_BUSCA), total
+
+def reconstruir_indice_busca(otimizar: bool = True):
+    """Refaz os índices de busca a partir de rendas/gastos (e junta os segmentos do FTS5)."""
+    with conexao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for tabela in _COLUNAS_BUSCA:
+            _reconstruir_busca(conn, tabela)
+            if otimizar:
+                conn.execute(f"INSERT INTO {tabela}_fts ({tabela}_fts) VALUES ('optimize')")
+
+# ---------------- RECORRÊNCIAS ----------------
+# Regras de lançamentos que se repetem (salário, aluguel...). Quem cria os
+# lançamentos de cada mês é recorrencias.materializar.
+
+COLUNAS_RECORRENCIAS = (
+    "id", "tipo", "id_classificacao", "categoria", "descricao", "valor_centavos",
+    "intervalo_meses", "inicio_periodo", "fim_periodo", "proximo_periodo", "ativa",
+)
+
+def periodo(ano, mes) -> int:
+    """(ano, mes) -> número do mês (ano * 12 + mes - 1), usado nas recorrências."""
+    return int(ano) * 12 + int(mes) - 1
+
+def ano_mes(numero: int) -> Tuple[int, int]:
+    """Inverso de `periodo`."""
+    return numero // 12, numero % 12 + 1
+
+def criar_recorrencia(id_usuario, tipo, descricao, valor, inicio, fim=None, intervalo_meses=1,
+                      id_classificacao=None, categoria=None) -> int:
+    """
+    `valor` em reais; `inicio`/`fim` são (ano, mes), fim inclusivo e opcional.
+    Gastos precisam de classificação e categoria. Retorna o id da regra.
+    """
+    if tipo not in ("gastos", "rendas"):
+        raise ValueError(f"Tipo de lançamento desconhecido: {tipo}")
+    if tipo == "gastos" and (id_classificacao is None or not categoria):
+        raise ValueError("Recorrência de gasto precisa de classificação e categoria.")
+    if tipo == "gastos":
+        id_classificacao = _validar_classificacao(id_classificacao)
+    inicio_p = periodo(*inicio)
+    fim_p = periodo(*fim) if fim is not None else None
+    if fim_p is not None and fim_p < inicio_p:
+        raise ValueError("O fim da recorrência é anterior ao início.")
+    with conexao() as conn:
+        cur = conn.execute(
+            """
+            INSERT INTO recorrencias (id_usuario, tipo, id_classificacao, categoria, descricao, valor_centavos,
+                                      intervalo_meses, inicio_periodo, fim_periodo, proximo_periodo)
+            VALUES (?,?,?,?,?,?,?,?,?,?)
+            """,
+            (id_usuario, tipo, id_classificacao if tipo == "gastos" else None,
+             categoria if tipo == "gastos" else None, descricao, para_centavos(valor),
+             int(intervalo_meses), inicio_p, fim_p, inicio_p),
+        )
+        return cur.lastrowid
+
+def listar_recorrencias(id_usuario, apenas_ativas: bool = True) -> pd.DataFrame:
+    filtro = " AND ativa = 1" if apenas_ativas else ""
+    with conexao() as conn:
+        return pd.read_sql(
+            f"SELECT {', '.join(COLUNAS_RECORRENCIAS)} FROM recorrencias WHERE id_usuario = ?{filtro} ORDER BY id",
+            conn, params=(id_usuario,),
+        )
+
+def encerrar_recorrencia(id_recorrencia, id_usuario) -> bool:
+    """Para de gerar lançamentos; os já criados ficam. Retorna se a regra era do usuário."""
+    with conexao() as conn:
+        cur = conn.execute(
+            "UPDATE recorrencias SET ativa = 0 WHERE id = ? AND id_usuario = ?", (id_recorrencia, id_usuario)
+        )
+        return cur.rowcount > 0
+
+# ---------------- AGREGAÇÕES (SQL) ----------------
+# Leem da tabela materializada resumo_mensal (no máximo 12 × classificações
+# linhas por usuário/ano), não das tabelas de lançamentos. Totais em centavos.
+
+def somar_rendas(id_usuario, ano, mes=None) -> int:
+    clausulas, params = _filtro_periodo(mes=mes, ano=ano)
+    with conexao() as conn:
+        cur = conn.execute(
+            f"""
+            SELECT COALESCE(SUM(valor_centavos), 0) FROM resumo_mensal
+            WHERE id_usuario = ? AND {' AND '.join(clausulas)} AND id_classificacao = {RESUMO_ID_RENDAS}
+            """,
+            [id_usuario] + params
+        )
+        return int(cur.fetchone()[0])
+
+def somar_gastos_por_classificacao(id_usuario, ano, mes=None) -> pd.DataFrame:
+    """Total de gastos por id_classificacao no mês (ou no ano, se mes=None)."""
+    clausulas, params = _filtro_periodo(mes=mes, ano=ano)
+    with conexao() as conn:
+        df = pd.read_sql(
+            f"""
+            SELECT id_classificacao, SUM(valor_centavos) AS valor_centavos
+            FROM resumo_mensal
+            WHERE id_usuario = ? AND {' AND '.join(clausulas)} AND id_classificacao <> {RESUMO_ID_RENDAS}
+            GROUP BY id_classificacao
+            """,
+            conn,
+            params=[id_usuario] + params)
+    # resultado vazio vem como object; mantém os dtypes do groupby em pandas
+    return df.astype({"id_classificacao": "int64", "valor_centavos": "int64"})
+
+def somar_por_mes(tabela, id_usuario, ano, nome_coluna="valor_centavos") -> pd.DataFrame:
+    """Total por mês de `rendas` ou `gastos` no ano; colunas (mes, <nome_coluna>)."""
+    if tabela not in ("rendas", "gastos"):
+        raise ValueError(f"Tabela inválida: {tabela}")
+    operador = "=" if tabela == "rendas" else "<>"
+    with conexao() as conn:
+        df = pd.read_sql(
+            f"""
+            SELECT mes, SUM(valor_centavos) AS valor_centavos
+            FROM resumo_mensal
+            WHERE id_usuario = ? AND ano = ? AND id_classificacao {operador} {RESUMO_ID_RENDAS}
+            GROUP BY mes
+            ORDER BY mes
+            """,
+            conn,
+            params=(id_usuario, int(ano)))
+    df = df.astype({"mes": "Int64", "valor_centavos": "int64"})
+    return df.rename(columns={"valor_centavos": nome_coluna})
+
+def carregar_resumo_mensal(id_usuario) -> pd.DataFrame:
+    """
+    Todas as linhas de resumo_mensal do usuário (ano, mes, id_classificacao,
+    valor_centavos, quantidade); rendas vêm com id_classificacao = RESUMO_ID_RENDAS.
+    """
+    with conexao() as conn:
         df = pd.read_sql(
-            "SELECT * FROM gastos WHERE id_usuario=?",
+            """
+            SELECT ano, mes, id_classificacao, valor_centavos, quantidade
+            FROM resumo_mensal
+            WHERE id_usuario = ?
+            """,
             conn,
             params=(id_usuario,))
-    df = normalizar_int(df, ["mes", "ano", "id_usuario"])
-    return normalizar_df(df)
+    return df.astype("int64")
+
+def reconstruir_resumo_mensal(id_usuario=None):
+    """Recalcula resumo_mensal a partir de rendas/gastos (todos ou um usuário)."""
+    with conexao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        _reconstruir_resumo_mensal(conn, id_usuario)
+
+def verificar_resumo_mensal(id_usuario=None) -> pd.DataFrame:
+    """
+    Compara resumo_mensal com o recalculado a partir dos lançamentos.
+    Retorna as chaves divergentes (vazio = consistente).
+    """
+    filtro, params = ("", []) if id_usuario is None else (" AND id_usuario = ?", [id_usuario])
+    chave = ["id_usuario", "ano", "mes", "id_classificacao"]
+    with conexao() as conn:
+        esperado = pd.read_sql(
+            f"""
+            SELECT id_usuario, ano, mes, id_classificacao, SUM(valor_centavos) AS valor_centavos, COUNT(1) AS quantidade
+            FROM gastos
+            WHERE id_usuario IS NOT NULL AND ano IS NOT NULL AND mes IS NOT NULL
+              AND id_classificacao IS NOT NULL{filtro}
+            GROUP BY id_usuario, ano, mes, id_classificacao
+            UNION ALL
+            SELECT id_usuario, ano, mes, {RESUMO_ID_RENDAS}, SUM(valor_centavos), COUNT(1)
+            FROM rendas
+            WHERE id_usuario IS NOT NULL AND ano IS NOT NULL AND mes IS NOT NULL{filtro}
+            GROUP BY id_usuario, ano, mes
+            """,
+            conn,
+            params=params * 2)
+        atual = pd.read_sql(
+            f"SELECT id_usuario, ano, mes, id_classificacao, valor_centavos, quantidade FROM resumo_mensal WHERE 1 = 1{filtro}",
+            conn,
+            params=params)
+    comp = esperado.merge(atual, on=chave, how="outer", suffixes=("_esperado", "_atual"))
+    comp = comp.fillna({
+        "valor_centavos_esperado": 0, "valor_centavos_atual": 0,
+        "quantidade_esperado": 0, "quantidade_atual": 0,
+    })
+    # centavos inteiros: comparação exata, sem tolerância
+    divergente = (
+        (comp["valor_centavos_esperado"] != comp["valor_centavos_atual"])
+        | (comp["quantidade_esperado"] != comp["quantidade_atual"])
+    )
+    return comp[divergente].reset_index(drop=True)
 
 def atualizar_gasto(id_, desc, val):
-    with conectar() as conn:
+    with conexao() as conn:
         conn.execute(
-            "UPDATE gastos SET descricao=?, valor=? WHERE id=?",
-            (desc, val, id_)
+            "UPDATE gastos SET descricao=?, valor_centavos=? WHERE id=?",
+            (desc, para_centavos(val), id_)
         )
 
 def atualizar_renda(id_, desc, val):
-    with conectar() as conn:
+    with conexao() as conn:
         conn.execute(
-            "UPDATE rendas SET descricao=?, valor=? WHERE id=?",
-            (desc, val, id_)
+            "UPDATE rendas SET descricao=?, valor_centavos=? WHERE id=?",
+            (desc, para_centavos(val), id_)
         )
 
 
 def excluir_renda(renda_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM rendas WHERE id = ?", (renda_id,))
-    conn.commit()
-    conn.close()
+    with conexao() as conn:
+        conn.execute("DELETE FROM rendas WHERE id = ?", (renda_id,))
 
 def excluir_gasto(gasto_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM gastos WHERE id = ?", (gasto_id,))
-    conn.commit()
-    conn.close()
+    with conexao() as conn:
+        conn.execute("DELETE FROM gastos WHERE id = ?", (gasto_id,))
+
+# ---------------- EDIÇÃO EM LOTE ----------------
+
+def _como_parametros(df: pd.DataFrame, colunas) -> list:
+    """Linhas do DataFrame como tuplas prontas para executemany (NA -> None)."""
+    bloco = df[list(colunas)].astype(object)
+    return list(bloco.where(bloco.notna(), None).itertuples(index=False, name=None))
+
+def _linhas_alteradas(original: pd.DataFrame, editado: pd.DataFrame, colunas) -> pd.DataFrame:
+    comum = editado.merge(original[["id"] + list(colunas)], on="id", how="inner", suffixes=("", "__orig"))
+    alterada = np.zeros(len(comum), dtype=bool)
+    for col in colunas:
+        novo = comum[col].astype(object)
+        antigo = comum[f"{col}__orig"].astype(object)
+        novo = novo.where(novo.notna(), None).to_numpy()
+        antigo = antigo.where(antigo.notna(), None).to_numpy()
+        alterada |= novo != antigo
+    return comum.loc[alterada, ["id"] + list(colunas)]
+
+def _valor_em_centavos(df: pd.DataFrame) -> pd.DataFrame:
+    if "valor" not in df.columns:
+        return df
+    return df.assign(valor_centavos=serie_para_centavos(df["valor"])).drop(columns="valor")
+
+# valor_centavos é NOT NULL, e sem mes/ano (ou sem classificação, nos gastos)
+# o lançamento some dos filtros e do resumo: linhas inseridas ou alteradas
+# precisam deles, e mes/id_classificacao dentro do domínio (MESES,
+# IDS_CLASSIFICACAO)
+COLUNAS_OBRIGATORIAS = ("valor_centavos", "mes", "ano", "id_classificacao")
+_NOMES_OBRIGATORIAS = {"valor_centavos": "valor", "mes": "mês", "ano": "ano", "id_classificacao": "classificação"}
+_DOMINIOS = {"mes": ("mês fora de 1 a 12", MESES), "id_classificacao": ("classificação desconhecida", IDS_CLASSIFICACAO)}
+
+def _fora_do_dominio(serie: pd.Series, dominio) -> pd.Series:
+    numeros = pd.to_numeric(serie, errors="coerce")
+    return serie.notna() & ~numeros.isin(list(dominio))
+
+def _validar_edicao(novas: pd.DataFrame, alteradas: pd.DataFrame, original: pd.DataFrame):
+    """
+    ValueError listando as linhas novas/alteradas sem valor, mês, ano ou
+    classificação, ou com mês/classificação fora do domínio. Nas alteradas só
+    conta o valor que mudou: uma linha antiga fora do domínio ainda pode ter a
+    descrição editada, e volta ao banco como estava.
+    """
+    problemas = []
+    for col in COLUNAS_OBRIGATORIAS:
+        nome = _NOMES_OBRIGATORIAS[col]
+        if col in novas.columns and novas[col].isna().any():
+            problemas.append(f"{nome} vazio em {int(novas[col].isna().sum())} linha(s) nova(s)")
+        if col in alteradas.columns and alteradas[col].isna().any():
+            ids = ", ".join(str(i) for i in alteradas.loc[alteradas[col].isna(), "id"])
+            problemas.append(f"{nome} vazio no(s) id(s) {ids}")
+    for col, (descricao, dominio) in _DOMINIOS.items():
+        if col in novas.columns and _fora_do_dominio(novas[col], dominio).any():
+            problemas.append(f"{descricao} em {int(_fora_do_dominio(novas[col], dominio).sum())} linha(s) nova(s)")
+        if col in alteradas.columns:
+            antes = alteradas["id"].map(original.set_index("id")[col])
+            mudou = pd.to_numeric(alteradas[col], errors="coerce") != pd.to_numeric(antes, errors="coerce")
+            ruins = alteradas.loc[_fora_do_dominio(alteradas[col], dominio) & mudou, "id"]
+            if len(ruins):
+                problemas.append(f"{descricao} no(s) id(s) {', '.join(str(i) for i in ruins)}")
+    if problemas:
+        raise ValueError("; ".join(problemas) + ". Nada foi gravado.")
+
+def _aplicar_alteracoes(tabela, colunas_validas, id_usuario, original, editado, padroes=None) -> dict:
+    """
+    Compara o DataFrame editado (st.data_editor, num_rows="dynamic") com o
+    original e grava a diferença numa única transação, com executemany:
+    linhas sem id são inseridas, ids que sumiram são excluídos e ids com
+    alguma coluna diferente são atualizados. Linhas novas completamente
+    vazias são ignoradas; colunas ausentes nelas vêm de `padroes`.
+    Só toca em linhas do próprio usuário. Uma coluna `valor` (reais, como o
+    editor mostra) é convertida para `valor_centavos`. Linha nova ou alterada
+    sem valor, mês ou ano (COLUNAS_OBRIGATORIAS), ou com mês/classificação
+    fora do domínio, gera ValueError antes de gravar qualquer coisa.
+    """
+    original, editado = _valor_em_centavos(original), _valor_em_centavos(editado)
+    colunas = [c for c in editado.columns if c in colunas_validas and c not in ("id", "id_usuario")]
+    padroes = dict(padroes or {})
+
+    ids_original = pd.to_numeric(original["id"], errors="coerce").dropna().astype("int64")
+    ids_editado = pd.to_numeric(editado["id"], errors="coerce") if "id" in editado.columns else pd.Series(np.nan, index=editado.index)
+
+    novas = editado[ids_editado.isna()]
+    novas = novas[novas[colunas].notna().any(axis=1)].copy()
+    for col, valor in padroes.items():
+        if col in colunas_validas and col not in ("id", "id_usuario"):
+            if col in novas.columns:
+                novas[col] = novas[col].astype(object).where(novas[col].notna(), valor)
+            else:
+                novas[col] = valor
+    novas["id_usuario"] = id_usuario
+    colunas_insert = ["id_usuario"] + [c for c in colunas_validas if c in novas.columns and c not in ("id", "id_usuario")]
+
+    excluidos = sorted(set(ids_original) - set(ids_editado.dropna().astype("int64")))
+
+    existentes = editado[ids_editado.notna()].assign(id=ids_editado.dropna().astype("int64"))
+    alteradas = _linhas_alteradas(original.assign(id=ids_original), existentes, colunas) if colunas else existentes.iloc[0:0]
+
+    _validar_edicao(novas, alteradas, original.assign(id=ids_original))
 
-# ---------------- EXPORT / BACKUP ----------------
+    atualizados = excluidos_n = 0
+    with conexao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if len(novas):
+            conn.executemany(
+                f"INSERT INTO {tabela} ({', '.join(colunas_insert)}) VALUES ({', '.join('?' * len(colunas_insert))})",
+                _como_parametros(novas, colunas_insert)
+            )
+        if len(alteradas):
+            atualizados = conn.executemany(
+                f"UPDATE {tabela} SET {', '.join(f'{c} = ?' for c in colunas)} WHERE id = ? AND id_usuario = ?",
+                [p + (id_usuario,) for p in _como_parametros(alteradas, colunas + ["id"])]
+            ).rowcount
+        if excluidos:
+            excluidos_n = conn.executemany(
+                f"DELETE FROM {tabela} WHERE id = ? AND id_usuario = ?",
+                [(int(i), id_usuario) for i in excluidos]
+            ).rowcount
+
+    return {"inseridos": len(novas), "atualizados": atualizados, "excluidos": excluidos_n}
+
+def aplicar_alteracoes_rendas(id_usuario, original, editado, padroes=None) -> dict:
+    return _aplicar_alteracoes("rendas", COLUNAS_RENDAS, id_usuario, original, editado, padroes)
 
-def dump_db_bytes() -> bytes:
-    """Retorna conteúdo do arquivo SQLite (para download)."""
-    with open(DB_NAME, "rb") as f:
-        return f.read()
+def aplicar_alteracoes_gastos(id_usuario, original, editado, padroes=None) -> dict:
+    return _aplicar_alteracoes("gastos", COLUNAS_GASTOS, id_usuario, original, editado, padroes)
 
 # ---------------- NORMALIZAÇÃO ----------------
+# Roda uma vez, na carga (carregar_rendas / carregar_gastos). Tudo vetorizado:
+# só os BLOBs (anos antigos gravados a partir de np.int64) passam por Python,
+# e mesmo esses são decodificados em bloco com np.frombuffer.
 
-def converter_ano(valor):
-    if pd.isna(valor):
-        return pd.NA
-    if isinstance(valor, (bytes, bytearray, memoryview)):
-        try:
-            return int.from_bytes(bytes(valor), byteorder="little", signed=False)
-        except Exception:
-            pass
-    try:
-        return int(valor)
-    except Exception:
-        try:
-            return int(float(valor))
-        except Exception:
-            return pd.NA
+COLUNAS_INT = ("id_usuario", "id_classificacao", "mes", "ano")
 
-def normalizar_df(df):
-    if df.empty:
-        return df
-    if "mes" in df.columns:
-        df["mes"] = pd.to_numeric(df["mes"], errors="coerce").astype("Int64")
-    if "ano" in df.columns:
-        df["ano"] = df["ano"].apply(converter_ano).astype("Int64")
-    if "valor" in df.columns:
-        df["valor"] = pd.to_numeric(df["valor"], errors="coerce").astype(float)
-    return df
+# dtypes compactos dos DataFrames de lançamentos (nullable onde o banco aceita NULL)
+TIPOS_INT = {
+    "id": "int64",
+    "id_usuario": "Int64",
+    "id_classificacao": "Int8",
+    "mes": "Int8",
+    "ano": "Int16",
+}
 
+_TIPOS_BLOB = (bytes, bytearray, memoryview)
+
+def _decodificar_blobs(valores) -> np.ndarray:
+    """Inteiros little-endian sem sinal (até 8 bytes) -> float64."""
+    blobs = [bytes(v)[:8].ljust(8, b"\0") for v in valores]
+    return np.frombuffer(b"".join(blobs), dtype="<u8").astype("float64")
+
+def para_int64(serie: pd.Series) -> pd.Series:
+    """
+    Converte uma coluna para Int64: inteiros, floats (truncados), texto numérico
+    e BLOBs little-endian. O que não der para converter vira <NA>.
+    """
+    if isinstance(serie.dtype, pd.Int64Dtype):
+        return serie
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        return serie.astype("Int64")
+
+    if serie.dtype != object:
+        numeros = pd.to_numeric(serie, errors="coerce").to_numpy(dtype="float64")
+    else:
+        valores = serie.to_numpy(dtype=object)
+        eh_blob = np.fromiter(
+            (isinstance(v, _TIPOS_BLOB) for v in valores), dtype=bool, count=len(valores)
+        )
+        numeros = np.empty(len(valores), dtype="float64")
+        resto = valores[~eh_blob]
+        try:
+            # caminho rápido: números / None / texto numérico
+            numeros[~eh_blob] = resto.astype("float64")
+        except (TypeError, ValueError):
+            numeros[~eh_blob] = pd.to_numeric(pd.Series(resto), errors="coerce").to_numpy(dtype="float64")
+        if eh_blob.any():
+            numeros[eh_blob] = _decodificar_blobs(valores[eh_blob])
+
+    return pd.Series(np.trunc(numeros), index=serie.index).astype("Int64")
 
 def normalizar_int(df, colunas):
     for col in colunas:
         if col in df.columns:
-            df[col] = (
-                df[col]
-                .astype(str)
-                .str.replace(".0", "", regex=False)
-                .replace("nan", pd.NA)
-                .astype("Int64")
-            )
-        return df
-    
+            df[col] = para_int64(df[col])
+    return df
+
+def _compactar_int(serie: pd.Series, tipo: str) -> pd.Series:
+    """
+    Int64 -> `tipo` só se todos os valores couberem: astype faz wrap
+    silencioso (200 em Int8 vira -56). Se algum não couber, fica Int64.
+    """
+    limites = np.iinfo(tipo.lower())
+    if serie.dropna().between(limites.min, limites.max).all():
+        return serie.astype(tipo)
+    logger.warning("Coluna %s fora da faixa de %s; carregada como Int64.", serie.name, tipo)
+    return serie
+
+def normalizar_df(df):
+    """
+    Tipos finais dos lançamentos: valor_centavos int64, mes/ano/id_classificacao
+    em inteiros pequenos (Int64 se algum valor não couber) e categoria como
+    category (poucas categorias distintas repetidas em milhares de linhas).
+    """
+    for col, tipo in TIPOS_INT.items():
+        if col in df.columns:
+            df[col] = _compactar_int(para_int64(df[col]), tipo)
+    if "valor_centavos" in df.columns:
+        df["valor_centavos"] = para_int64(df["valor_centavos"]).fillna(0).astype("int64")
+    if "categoria" in df.columns:
+        df["categoria"] = df["categoria"].astype("category")
+    return df
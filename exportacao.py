@@ -0,0 +1,239 @@
+"""
+Exportação / importação colunar (Parquet) de rendas e gastos, e exportação
+da trilha de auditoria (CSV ou Parquet).
+
+A exportação lê o SQLite com fetchmany e escreve lotes Arrow direto num
+dataset Parquet particionado por ano (<destino>/<tabela>/ano=AAAA/...),
+sem montar DataFrame nem carregar a tabela inteira. A leitura para análise
+devolve pyarrow.Table (memory-map + filtros empurrados para o Parquet), sem
+tocar no banco em produção.
+"""
+import csv
+import json
+import os
+import tempfile
+import zipfile
+from typing import Iterator, Optional
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+import db
+from logger_config import logger
+
+
+TAMANHO_LOTE = 65_536
+TABELAS = ("rendas", "gastos")
+
+# mes e id_classificacao em int16, não int8: o banco não impede valores acima
+# de 127 (linhas antigas, outros clientes) e um só faria a exportação parar no meio
+SCHEMAS = {
+    "rendas": pa.schema([
+        ("id", pa.int64()),
+        ("id_usuario", pa.int64()),
+        ("descricao", pa.string()),
+        ("valor_centavos", pa.int64()),
+        ("mes", pa.int16()),
+        ("ano", pa.int16()),
+        ("hash_importacao", pa.string()),
+    ]),
+    "gastos": pa.schema([
+        ("id", pa.int64()),
+        ("id_usuario", pa.int64()),
+        ("id_classificacao", pa.int16()),
+        ("categoria", pa.dictionary(pa.int32(), pa.string())),
+        ("descricao", pa.string()),
+        ("valor_centavos", pa.int64()),
+        ("mes", pa.int16()),
+        ("ano", pa.int16()),
+        ("hash_importacao", pa.string()),
+    ]),
+}
+
+PARTICIONAMENTO = ds.partitioning(pa.schema([("ano", pa.int16())]), flavor="hive")
+
+
+def _lotes_sqlite(tabela: str, id_usuario: Optional[int], tamanho_lote: int) -> Iterator[pa.RecordBatch]:
+    schema = SCHEMAS[tabela]
+    filtro, params = ("", ()) if id_usuario is None else (" WHERE id_usuario = ?", (id_usuario,))
+    with db.conexao() as conn:
+        cur = conn.execute(f"SELECT {', '.join(schema.names)} FROM {tabela}{filtro}", params)
+        while True:
+            linhas = cur.fetchmany(tamanho_lote)
+            if not linhas:
+                break
+            colunas = list(zip(*linhas))
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, schema)],
+                schema=schema,
+            )
+
+
+def exportar_parquet(destino: str, id_usuario: Optional[int] = None,
+                     tabelas=TABELAS, tamanho_lote: int = TAMANHO_LOTE) -> dict:
+    """
+    Exporta rendas/gastos (de um usuário ou de todos) para `destino`/<tabela>,
+    particionado por ano. Retorna o número de linhas por tabela.
+    """
+    total = {}
+    for tabela in tabelas:
+        contagem = [0]
+
+        def lotes():
+            for lote in _lotes_sqlite(tabela, id_usuario, tamanho_lote):
+                contagem[0] += lote.num_rows
+                yield lote
+
+        ds.write_dataset(
+            lotes(),
+            base_dir=os.path.join(destino, tabela),
+            schema=SCHEMAS[tabela],
+            format="parquet",
+            partitioning=PARTICIONAMENTO,
+            basename_template=f"{tabela}-{{i}}.parquet",
+            existing_data_behavior="delete_matching",
+            max_rows_per_group=tamanho_lote * 4,
+        )
+        total[tabela] = contagem[0]
+    logger.info("exportação parquet em %s (usuário %s): %s", destino, id_usuario, total)
+    return total
+
+
+def exportar_zip(id_usuario: int) -> str:
+    """Exporta os dados de um usuário e compacta num .zip temporário (quem chamou deve apagá-lo)."""
+    with tempfile.TemporaryDirectory(prefix="financas_parquet_") as pasta:
+        exportar_parquet(pasta, id_usuario)
+        fd, destino = tempfile.mkstemp(prefix="financas_parquet_", suffix=".zip")
+        os.close(fd)
+        with zipfile.ZipFile(destino, "w", zipfile.ZIP_STORED) as zf:  # parquet já vem comprimido
+            for raiz, _, arquivos in os.walk(pasta):
+                for nome in arquivos:
+                    caminho = os.path.join(raiz, nome)
+                    zf.write(caminho, os.path.relpath(caminho, pasta))
+    return destino
+
+
+def abrir_dataset(origem: str, tabela: str) -> ds.Dataset:
+    # mmap: páginas do arquivo lidas sob demanda, sem cópia para buffers próprios
+    # (vale para a leitura em Arrow; importar_parquet converte cada lote)
+    return ds.dataset(
+        os.path.join(origem, tabela), format="parquet", partitioning=PARTICIONAMENTO,
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+    )
+
+
+def ler_parquet(origem: str, tabela: str, id_usuario: Optional[int] = None,
+                ano: Optional[int] = None, colunas=None) -> pa.Table:
+    """Lê um dataset exportado como pyarrow.Table (use .to_pandas() se precisar)."""
+    filtro = None
+    if id_usuario is not None:
+        filtro = ds.field("id_usuario") == id_usuario
+    if ano is not None:
+        cond = ds.field("ano") == ano
+        filtro = cond if filtro is None else filtro & cond
+    return abrir_dataset(origem, tabela).to_table(columns=colunas, filter=filtro)
+
+
+def importar_parquet(origem: str, tabelas=TABELAS, manter_ids: Optional[bool] = None,
+                     id_usuario_destino: Optional[int] = None,
+                     tamanho_lote: int = TAMANHO_LOTE) -> dict:
+    """
+    Importa um dataset gerado por exportar_parquet, lote a lote (to_batches).
+    Cada lote vira listas Python (to_pylist) para o executemany do sqlite3:
+    a memória fica limitada a um lote, mas os valores são copiados.
+
+    manter_ids=True preserva os ids (INSERT OR IGNORE: reimportar no mesmo
+    banco é idempotente); linhas cujo id já existe no banco são ignoradas e
+    contadas em "ids_existentes". Com False os ids são gerados de novo.
+    `id_usuario_destino` reatribui todas as linhas a outro usuário; nesse caso
+    o padrão é gerar ids novos, para não perder linhas que colidam com ids de
+    outros usuários. Retorna, por tabela, linhas lidas, inseridas, ignoradas
+    (ids existentes ou hash_importacao repetido) e ids_existentes.
+    """
+    if manter_ids is None:
+        manter_ids = id_usuario_destino is None
+    total = {}
+    for tabela in tabelas:
+        caminho = os.path.join(origem, tabela)
+        if not os.path.isdir(caminho):
+            continue
+        dataset = abrir_dataset(origem, tabela)
+        colunas = [c for c in SCHEMAS[tabela].names if c in dataset.schema.names]
+        if not manter_ids:
+            colunas.remove("id")
+        sql = (
+            f"INSERT OR IGNORE INTO {tabela} ({', '.join(colunas)}) "
+            f"VALUES ({', '.join('?' * len(colunas))})"
+        )
+        lidas = inseridas = ids_existentes = 0
+        for lote in dataset.to_batches(columns=colunas, batch_size=tamanho_lote):
+            valores = [lote.column(c).to_pylist() for c in colunas]
+            if id_usuario_destino is not None:
+                valores[colunas.index("id_usuario")] = [id_usuario_destino] * lote.num_rows
+            with db.conexao() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if manter_ids:
+                    ids_existentes += conn.execute(
+                        f"SELECT COUNT(1) FROM {tabela} WHERE id IN (SELECT value FROM json_each(?))",
+                        (json.dumps(valores[colunas.index("id")]),),
+                    ).fetchone()[0]
+                inseridas += conn.executemany(sql, zip(*valores)).rowcount
+            lidas += lote.num_rows
+        total[tabela] = {
+            "lidas": lidas, "inseridas": inseridas, "ignoradas": lidas - inseridas, "ids_existentes": ids_existentes,
+        }
+        if ids_existentes:
+            logger.warning(
+                "importação parquet de %s: %d linha(s) de %s ignorada(s) por id já existente "
+                "(use ids novos para importá-las)", origem, ids_existentes, tabela,
+            )
+    logger.info("importação parquet de %s: %s", origem, total)
+    return total
+
+
+# ---------------- AUDITORIA ----------------
+
+SCHEMA_AUDITORIA = pa.schema([
+    ("id", pa.int64()),
+    ("event_type", pa.dictionary(pa.int32(), pa.string())),
+    ("actor_id", pa.int64()),
+    ("target_id", pa.int64()),
+    ("details", pa.string()),
+    ("created_at", pa.timestamp("s", tz="UTC")),
+])
+
+
+def _lote_auditoria(linhas: list) -> pa.RecordBatch:
+    colunas = list(zip(*linhas))
+    arrays = [pa.array(valores, type=campo.type) for valores, campo in zip(colunas[:5], SCHEMA_AUDITORIA)]
+    # created_at vem como texto UTC do SQLite
+    arrays.append(pa.array(colunas[5], pa.string()).cast(pa.timestamp("s")).cast(SCHEMA_AUDITORIA.field("created_at").type))
+    return pa.RecordBatch.from_arrays(arrays, schema=SCHEMA_AUDITORIA)
+
+
+def exportar_auditoria(destino: str, formato: str = "csv", tamanho_lote: int = TAMANHO_LOTE, **filtros) -> int:
+    """
+    Grava audit_logs (com os filtros de db.paginar_audit_logs) em `destino`,
+    em ordem cronológica, lote a lote: a trilha inteira nunca fica na memória.
+    `formato` é "csv" ou "parquet". Retorna o número de linhas.
+    """
+    if formato not in ("csv", "parquet"):
+        raise ValueError(f"Formato desconhecido: {formato}")
+    total = 0
+    lotes = db.iterar_audit_logs(lote=tamanho_lote, **filtros)
+    if formato == "csv":
+        with open(destino, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(db.COLUNAS_AUDITORIA)
+            for linhas in lotes:
+                escritor.writerows(linhas)
+                total += len(linhas)
+    else:
+        with pq.ParquetWriter(destino, SCHEMA_AUDITORIA) as escritor:
+            for linhas in lotes:
+                escritor.write_batch(_lote_auditoria(linhas))
+                total += len(linhas)
+    logger.info("exportação de auditoria (%s) em %s: %d linha(s)", formato, destino, total)
+    return total
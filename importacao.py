@@ -0,0 +1,303 @@
+"""
+Importação de extratos bancários (CSV / OFX) em lote.
+
+Os arquivos são lidos em blocos (pd.read_csv(chunksize=...) para CSV, um
+tokenizador incremental para OFX), cada lançamento recebe um hash estável
+e os blocos são gravados com executemany + INSERT OR IGNORE, uma transação
+por lote. Reimportar o mesmo extrato não duplica nada: o índice único
+(id_usuario, hash_importacao) descarta o que já existe.
+
+Valores negativos viram gastos e positivos viram rendas.
+"""
+import hashlib
+import io
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import db
+from logger_config import logger
+
+
+TAMANHO_LOTE = 50_000
+
+CLASSIFICACAO_PADRAO = 1  # CFE - Custos fixos
+CATEGORIA_PADRAO = "Importado"
+
+
+@dataclass
+class RegraClassificacao:
+    """Descrições que casam com `padrao` (regex, sem diferenciar maiúsculas) vão para a classificação/categoria."""
+    padrao: str
+    id_classificacao: int
+    categoria: str
+
+
+# ---------------- LEITORES ----------------
+# Cada leitor produz DataFrames com as colunas: data (datetime64), descricao,
+# valor (float, com sinal), chave (identificador do banco, ex. FITID, ou None).
+
+def _abrir_texto(origem, encoding: str):
+    if isinstance(origem, (str, os.PathLike)):
+        return open(origem, "r", encoding=encoding, errors="replace", newline="")
+    if isinstance(origem, io.TextIOBase):
+        return origem
+    # arquivo binário (ex.: UploadedFile do Streamlit)
+    return io.TextIOWrapper(origem, encoding=encoding, errors="replace", newline="")
+
+
+def _converter_valor(serie: pd.Series, decimal: str) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(serie.dtype):
+        return serie.astype("float64")
+    texto = serie.astype(str)
+    if texto.str.contains("R$", regex=False).any():
+        texto = texto.str.replace("R$", "", regex=False)
+    texto = texto.str.replace(" ", "", regex=False)
+    if decimal == ",":
+        texto = texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    return pd.to_numeric(texto, errors="coerce")
+
+
+def ler_csv(origem, sep: str = ";", decimal: str = ",", encoding: str = "utf-8",
+            colunas: Optional[Dict[str, str]] = None, dayfirst: bool = True,
+            tamanho_bloco: int = TAMANHO_LOTE) -> Iterator[pd.DataFrame]:
+    """
+    `colunas` mapeia os nomes do arquivo para data/descricao/valor
+    (ex.: {"Data": "data", "Histórico": "descricao", "Valor": "valor"}).
+    """
+    mapa = colunas or {}
+    arquivo = _abrir_texto(origem, encoding)
+    try:
+        leitor = pd.read_csv(arquivo, sep=sep, dtype=str, chunksize=tamanho_bloco, keep_default_na=False)
+        for bloco in leitor:
+            bloco = bloco.rename(columns=mapa)
+            bloco.columns = [str(c).strip().lower() for c in bloco.columns]
+            faltando = {"data", "descricao", "valor"} - set(bloco.columns)
+            if faltando:
+                raise ValueError(f"CSV sem as colunas: {sorted(faltando)}")
+            yield pd.DataFrame({
+                "data": pd.to_datetime(bloco["data"], dayfirst=dayfirst, errors="coerce"),
+                "descricao": bloco["descricao"].astype(str).str.strip(),
+                "valor": _converter_valor(bloco["valor"], decimal),
+                "chave": None,
+            })
+    finally:
+        if isinstance(origem, (str, os.PathLike)):
+            arquivo.close()
+
+
+_TOKEN_OFX = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def ler_ofx(origem, encoding: str = "latin-1", tamanho_bloco: int = TAMANHO_LOTE) -> Iterator[pd.DataFrame]:
+    """
+    Leitor incremental de OFX (SGML 1.x ou XML 2.x): lê o arquivo em pedaços e
+    emite blocos de até `tamanho_bloco` transações <STMTTRN>.
+    """
+    arquivo = _abrir_texto(origem, encoding)
+    linhas: List[Tuple] = []
+    atual: Optional[dict] = None
+    resto = ""
+
+    def fechar():
+        nonlocal atual
+        if atual is not None:
+            linhas.append((
+                atual.get("DTPOSTED", "")[:8],
+                (atual.get("MEMO") or atual.get("NAME") or "").strip(),
+                atual.get("TRNAMT", ""),
+                atual.get("FITID"),
+            ))
+        atual = None
+
+    def bloco_pronto():
+        df = pd.DataFrame(linhas, columns=["data", "descricao", "valor", "chave"])
+        linhas.clear()
+        df["data"] = pd.to_datetime(df["data"], format="%Y%m%d", errors="coerce")
+        df["valor"] = pd.to_numeric(df["valor"].str.replace(",", ".", regex=False), errors="coerce")
+        return df
+
+    try:
+        while True:
+            pedaco = arquivo.read(1024 * 1024)
+            texto = resto + (pedaco or "")
+            # guarda um possível token cortado no fim do pedaço
+            corte = texto.rfind("<") if pedaco else len(texto)
+            texto, resto = texto[:corte], texto[corte:]
+            for fecha, tag, valor in _TOKEN_OFX.findall(texto):
+                tag = tag.upper()
+                if tag == "STMTTRN":
+                    fechar()
+                    if not fecha:
+                        atual = {}
+                elif tag == "BANKTRANLIST" and fecha:
+                    fechar()
+                elif atual is not None and not fecha:
+                    atual[tag] = valor.strip()
+                if len(linhas) >= tamanho_bloco:
+                    yield bloco_pronto()
+            if not pedaco:
+                break
+        fechar()
+        if linhas:
+            yield bloco_pronto()
+    finally:
+        if isinstance(origem, (str, os.PathLike)):
+            arquivo.close()
+
+
+# ---------------- CLASSIFICAÇÃO / HASH ----------------
+
+def _normalizar_descricao(serie: pd.Series) -> pd.Series:
+    return serie.str.lower().str.replace(r"\s+", " ", regex=True).str.strip()
+
+
+def historico_classificacao(id_usuario: int) -> Dict[str, Tuple[int, str]]:
+    """descrição normalizada -> (id_classificacao, categoria) mais recente dos gastos do usuário."""
+    gastos = db.carregar_gastos(id_usuario, colunas=["id", "descricao", "id_classificacao", "categoria"])
+    gastos = gastos.dropna(subset=["descricao", "id_classificacao"])
+    if gastos.empty:
+        return {}
+    gastos = gastos.assign(chave=_normalizar_descricao(gastos["descricao"].astype(str)))
+    ultimos = gastos.sort_values("id").drop_duplicates("chave", keep="last")
+    return dict(zip(ultimos["chave"], zip(ultimos["id_classificacao"].astype(int), ultimos["categoria"])))
+
+
+def classificar(descricoes: pd.Series, regras: Iterable[RegraClassificacao],
+                historico: Dict[str, Tuple[int, str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Regras explícitas têm prioridade; depois o histórico do usuário; depois o padrão."""
+    n = len(descricoes)
+    ids = np.full(n, CLASSIFICACAO_PADRAO, dtype="int64")
+    categorias = np.full(n, CATEGORIA_PADRAO, dtype=object)
+    resolvido = np.zeros(n, dtype=bool)
+
+    for regra in regras:
+        casa = descricoes.str.contains(regra.padrao, case=False, regex=True, na=False).to_numpy() & ~resolvido
+        ids[casa] = regra.id_classificacao
+        categorias[casa] = regra.categoria
+        resolvido |= casa
+
+    if historico:
+        achado = _normalizar_descricao(descricoes).map(historico)
+        tem = achado.notna().to_numpy() & ~resolvido
+        if tem.any():
+            pares = achado[tem]
+            ids[tem] = [p[0] for p in pares]
+            categorias[tem] = [p[1] for p in pares]
+
+    return ids, categorias
+
+
+def calcular_hashes(bloco: pd.DataFrame, ocorrencias: Dict[str, int]) -> List[str]:
+    """
+    Hash estável por lançamento. Com chave do banco (FITID) usa só ela; sem
+    chave usa data|descrição|centavos + nº da ocorrência no arquivo, para que
+    lançamentos idênticos legítimos (dois cafés no mesmo dia) não se anulem.
+    `ocorrencias` é compartilhado entre os blocos do mesmo arquivo.
+    """
+    centavos = bloco["centavos"].to_numpy()
+    datas = bloco["data"].dt.strftime("%Y-%m-%d").to_numpy()
+    hashes = []
+    for data, descricao, cents, chave in zip(datas, bloco["descricao"].to_numpy(), centavos, bloco["chave"].to_numpy()):
+        if chave:
+            base = f"k|{chave}"
+        else:
+            base = f"{data}|{descricao}|{cents}"
+            n = ocorrencias.get(base, 0)
+            ocorrencias[base] = n + 1
+            base = f"{base}|{n}"
+        hashes.append(hashlib.blake2b(base.encode("utf-8"), digest_size=16).hexdigest())
+    return hashes
+
+
+# ---------------- PIPELINE ----------------
+
+def _gravar_lote(id_usuario: int, bloco: pd.DataFrame, regras, historico) -> Tuple[int, int]:
+    gastos = bloco[bloco["centavos"] < 0]
+    rendas = bloco[bloco["centavos"] > 0]
+
+    ids, categorias = classificar(gastos["descricao"], regras, historico)
+    linhas_gastos = list(zip(
+        [id_usuario] * len(gastos), ids.tolist(), categorias.tolist(),
+        gastos["descricao"].tolist(), (-gastos["centavos"]).tolist(),
+        gastos["mes"].tolist(), gastos["ano"].tolist(), gastos["hash"].tolist(),
+    ))
+    linhas_rendas = list(zip(
+        [id_usuario] * len(rendas), rendas["descricao"].tolist(), rendas["centavos"].tolist(),
+        rendas["mes"].tolist(), rendas["ano"].tolist(), rendas["hash"].tolist(),
+    ))
+
+    with db.conexao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        n_gastos = conn.executemany(
+            """
+            INSERT OR IGNORE INTO gastos
+            (id_usuario, id_classificacao, categoria, descricao, valor_centavos, mes, ano, hash_importacao)
+            VALUES (?,?,?,?,?,?,?,?)
+            """,
+            linhas_gastos
+        ).rowcount if linhas_gastos else 0
+        n_rendas = conn.executemany(
+            """
+            INSERT OR IGNORE INTO rendas
+            (id_usuario, descricao, valor_centavos, mes, ano, hash_importacao)
+            VALUES (?,?,?,?,?,?)
+            """,
+            linhas_rendas
+        ).rowcount if linhas_rendas else 0
+    return n_gastos, n_rendas
+
+
+def detectar_formato(nome: str) -> str:
+    extensao = os.path.splitext(str(nome).lower())[1]
+    if extensao in (".ofx", ".qfx"):
+        return "ofx"
+    return "csv"
+
+
+def importar_extrato(id_usuario: int, origem, formato: Optional[str] = None,
+                     regras: Iterable[RegraClassificacao] = (), usar_historico: bool = True,
+                     tamanho_lote: int = TAMANHO_LOTE, **opcoes) -> dict:
+    """
+    Importa um extrato para o usuário. `origem` é um caminho ou arquivo aberto;
+    `opcoes` vão para o leitor (ex.: sep, decimal, encoding, colunas).
+    Retorna contagens: lidas, gastos, rendas, duplicadas, invalidas.
+    """
+    if formato is None:
+        formato = detectar_formato(getattr(origem, "name", origem))
+    if formato == "csv":
+        blocos = ler_csv(origem, tamanho_bloco=tamanho_lote, **opcoes)
+    elif formato == "ofx":
+        blocos = ler_ofx(origem, tamanho_bloco=tamanho_lote, **opcoes)
+    else:
+        raise ValueError(f"Formato de extrato desconhecido: {formato}")
+
+    regras = list(regras)
+    historico = historico_classificacao(id_usuario) if usar_historico else {}
+    ocorrencias: Dict[str, int] = {}
+    total = {"lidas": 0, "gastos": 0, "rendas": 0, "duplicadas": 0, "invalidas": 0}
+
+    for bloco in blocos:
+        total["lidas"] += len(bloco)
+        bloco["centavos"] = db.serie_para_centavos(bloco["valor"])
+        validas = bloco["data"].notna() & bloco["centavos"].notna() & (bloco["centavos"] != 0)
+        total["invalidas"] += int((~validas).sum())
+        bloco = bloco[validas].reset_index(drop=True)
+        if bloco.empty:
+            continue
+        bloco["mes"] = bloco["data"].dt.month.astype("int64")
+        bloco["ano"] = bloco["data"].dt.year.astype("int64")
+        bloco["centavos"] = bloco["centavos"].astype("int64")
+        bloco["hash"] = calcular_hashes(bloco, ocorrencias)
+
+        n_gastos, n_rendas = _gravar_lote(id_usuario, bloco, regras, historico)
+        total["gastos"] += n_gastos
+        total["rendas"] += n_rendas
+        total["duplicadas"] += len(bloco) - n_gastos - n_rendas
+
+    logger.info("importação de extrato (%s) para usuário %s: %s", formato, id_usuario, total)
+    return total
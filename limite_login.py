@@ -0,0 +1,261 @@
+"""
+Limite de tentativas de login em memória, por e-mail e por IP.
+
+A decisão de bloqueio não consulta o banco: cada chave guarda os instantes das
+suas últimas N falhas num deque de tamanho N (janela deslizante), então checar
+e registrar são O(1). Está bloqueada a chave com N falhas dentro da janela;
+um login com sucesso zera o contador do e-mail (o do IP continua).
+
+login_attempts continua sendo o histórico: as tentativas vão para o banco em
+lotes (thread `manutencao-login`), que também aplica de tempos em tempos a
+retenção de login_attempts (retencao.reter: agrega por dia e apaga as mais
+antigas que LOGIN_RETENCAO_DIAS), ligada por padrão. Ao subir o processo, o limitador é aquecido com as falhas da janela gravadas
+no banco, para um restart não zerar bloqueios.
+
+O limite por IP usa o endereço da conexão. Atrás de um proxy reverso ele é o
+do proxy, igual para todos: um atacante bloquearia o login de todo mundo.
+Nesse caso informe os proxies em LOGIN_PROXIES_CONFIAVEIS (o IP passa a vir
+de X-Forwarded-For) ou desligue o limite por IP com LOGIN_MAX_FALHAS_IP=0; o
+limite por e-mail continua barrando a força bruta contra uma conta.
+
+O estado é do processo: réplicas diferentes contam separadamente.
+"""
+import atexit
+import os
+import threading
+import time
+from calendar import timegm
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Optional
+
+import db
+import retencao
+from logger_config import logger
+
+
+LOGIN_MAX_FALHAS = int(os.environ.get("LOGIN_MAX_FALHAS", "5"))
+LOGIN_MAX_FALHAS_IP = int(os.environ.get("LOGIN_MAX_FALHAS_IP", "20"))  # 0 = sem limite por IP
+# quantos proxies reversos confiáveis há na frente do app (0 = nenhum: vale o IP da conexão)
+LOGIN_PROXIES_CONFIAVEIS = int(os.environ.get("LOGIN_PROXIES_CONFIAVEIS", "0"))
+LOGIN_JANELA_MIN = float(os.environ.get("LOGIN_JANELA_MIN", "15"))
+LOGIN_MAX_CHAVES = int(os.environ.get("LOGIN_MAX_CHAVES", "100000"))
+LOGIN_PERSISTIR = os.environ.get("LOGIN_PERSISTIR", "1") != "0"
+LOGIN_LOTE = int(os.environ.get("LOGIN_LOTE", "500"))
+LOGIN_DESCARGA_S = float(os.environ.get("LOGIN_DESCARGA_S", "5"))
+LOGIN_PODA_INTERVALO_MIN = float(os.environ.get("LOGIN_PODA_INTERVALO_MIN", "60"))  # 0 = desligado
+
+
+def _epoch_utc(texto: str) -> float:
+    """'AAAA-MM-DD HH:MM:SS' (CURRENT_TIMESTAMP, UTC) -> segundos desde a época."""
+    return float(timegm(time.strptime(texto[:19], "%Y-%m-%d %H:%M:%S")))
+
+
+def ip_do_cliente(ip_conexao: Optional[str], x_forwarded_for: Optional[str] = None,
+                  proxies: int = LOGIN_PROXIES_CONFIAVEIS) -> Optional[str]:
+    """
+    IP de quem tenta o login. Sem proxies confiáveis é o da conexão. Com N,
+    é o N-ésimo endereço de X-Forwarded-For a partir da direita: cada proxy
+    acrescenta à direita quem se conectou a ele, e o que está mais à esquerda
+    o próprio cliente pode ter forjado. Sem endereços suficientes no
+    cabeçalho, fica o da conexão.
+    """
+    if proxies <= 0 or not x_forwarded_for:
+        return ip_conexao
+    enderecos = [e.strip() for e in x_forwarded_for.split(",") if e.strip()]
+    return enderecos[-proxies] if len(enderecos) >= proxies else ip_conexao
+
+
+class JanelaDeslizante:
+    """
+    Últimas `max_falhas` falhas por chave. Guarda no máximo `max_chaves`
+    chaves (LRU): sob credential stuffing com e-mails aleatórios a memória
+    fica limitada, e o limite por IP continua valendo.
+    """
+
+    def __init__(self, max_falhas: int, janela_s: float, max_chaves: int = LOGIN_MAX_CHAVES):
+        self.max_falhas = max_falhas
+        self.janela_s = janela_s
+        self.max_chaves = max_chaves
+        self._falhas: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.descartadas = 0
+
+    def bloqueado_ate(self, chave: str, agora: Optional[float] = None) -> float:
+        """Instante (epoch) em que a chave volta a poder tentar; 0 se não está bloqueada."""
+        agora = time.time() if agora is None else agora
+        with self._lock:
+            falhas = self._falhas.get(chave)
+            if falhas is None or len(falhas) < self.max_falhas:
+                return 0.0
+            liberado = falhas[0] + self.janela_s
+        return liberado if liberado > agora else 0.0
+
+    def registrar_falha(self, chave: str, agora: Optional[float] = None):
+        agora = time.time() if agora is None else agora
+        with self._lock:
+            falhas = self._falhas.get(chave)
+            if falhas is None:
+                falhas = self._falhas[chave] = deque(maxlen=self.max_falhas)
+                if len(self._falhas) > self.max_chaves:
+                    self._falhas.popitem(last=False)
+                    self.descartadas += 1
+            else:
+                self._falhas.move_to_end(chave)
+            falhas.append(agora)
+
+    def limpar(self, chave: str):
+        with self._lock:
+            self._falhas.pop(chave, None)
+
+    def __len__(self) -> int:
+        return len(self._falhas)
+
+
+class LimitadorLogin:
+    """Janela por e-mail + janela por IP (se max_falhas_ip > 0), com gravação em lote em login_attempts."""
+
+    def __init__(self, max_falhas: int = LOGIN_MAX_FALHAS, max_falhas_ip: int = LOGIN_MAX_FALHAS_IP,
+                 janela_min: float = LOGIN_JANELA_MIN, max_chaves: int = LOGIN_MAX_CHAVES,
+                 persistir: bool = LOGIN_PERSISTIR, lote: int = LOGIN_LOTE):
+        self.janela_min = janela_min
+        self.por_email = JanelaDeslizante(max_falhas, janela_min * 60, max_chaves)
+        self.por_ip = JanelaDeslizante(max_falhas_ip, janela_min * 60, max_chaves)
+        self.limitar_ip = max_falhas_ip > 0
+        self.persistir = persistir
+        self.lote = lote
+        self._pendentes: list = []
+        self._lock = threading.Lock()
+        self.bloqueios = 0
+        self.gravadas = 0
+
+    @staticmethod
+    def _chave_email(email: str) -> str:
+        return (email or "").strip().lower()
+
+    def espera(self, email: str, ip: Optional[str] = None, agora: Optional[float] = None) -> float:
+        """Segundos até o próximo login permitido para (email, ip); 0 = liberado."""
+        agora = time.time() if agora is None else agora
+        ate = self.por_email.bloqueado_ate(self._chave_email(email), agora)
+        if ip and self.limitar_ip:
+            ate = max(ate, self.por_ip.bloqueado_ate(ip, agora))
+        if ate:
+            self.bloqueios += 1
+            return ate - agora
+        return 0.0
+
+    def registrar(self, email: str, ip: Optional[str], sucesso: bool, agora: Optional[float] = None):
+        agora = time.time() if agora is None else agora
+        chave = self._chave_email(email)
+        if sucesso:
+            self.por_email.limpar(chave)
+        else:
+            self.por_email.registrar_falha(chave, agora)
+            if ip and self.limitar_ip:
+                self.por_ip.registrar_falha(ip, agora)
+        if not self.persistir:
+            return
+        instante = datetime.fromtimestamp(agora, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._pendentes.append((email, 1 if sucesso else 0, ip, instante))
+            cheio = len(self._pendentes) >= self.lote
+        if cheio:
+            self.descarregar()
+
+    def descarregar(self) -> int:
+        """Grava as tentativas pendentes em login_attempts; retorna quantas."""
+        with self._lock:
+            tentativas, self._pendentes = self._pendentes, []
+        if not tentativas:
+            return 0
+        try:
+            db.gravar_tentativas_login(tentativas)
+        except Exception:
+            # o bloqueio já foi decidido em memória; só o histórico fica incompleto
+            logger.exception("login_attempts: %d tentativa(s) não gravada(s)", len(tentativas))
+            return 0
+        self.gravadas += len(tentativas)
+        return len(tentativas)
+
+    def aquecer(self) -> int:
+        """Carrega as falhas da janela gravadas no banco. Retorna quantas."""
+        falhas = db.falhas_login_recentes(int(self.janela_min) + 1)
+        for email, ip, instante in falhas:
+            agora = _epoch_utc(instante)
+            self.por_email.registrar_falha(self._chave_email(email), agora)
+            if ip and self.limitar_ip:
+                self.por_ip.registrar_falha(ip, agora)
+        return len(falhas)
+
+    def pendentes(self) -> int:
+        return len(self._pendentes)
+
+    def stats(self) -> dict:
+        return {
+            "emails": len(self.por_email),
+            "ips": len(self.por_ip),
+            "bloqueios": self.bloqueios,
+            "pendentes": self.pendentes(),
+            "gravadas": self.gravadas,
+            "chaves_descartadas": self.por_email.descartadas + self.por_ip.descartadas,
+        }
+
+
+class ManutencaoLogin(threading.Thread):
+    """Thread daemon: grava as tentativas pendentes e aplica a retenção de login_attempts de tempos em tempos."""
+
+    def __init__(self, limitador: LimitadorLogin, descarga_s: float = LOGIN_DESCARGA_S,
+                 poda_intervalo_min: float = LOGIN_PODA_INTERVALO_MIN):
+        super().__init__(name="manutencao-login", daemon=True)
+        self.limitador = limitador
+        self.descarga_s = descarga_s
+        self.poda_intervalo = poda_intervalo_min * 60
+        self._parar = threading.Event()
+
+    def run(self):
+        proxima_poda = time.monotonic()
+        while not self._parar.wait(self.descarga_s):
+            self.limitador.descarregar()
+            if self.poda_intervalo > 0 and time.monotonic() >= proxima_poda:
+                try:
+                    retencao.reter("login_attempts")
+                except Exception:
+                    logger.exception("falha na retenção de login_attempts")
+                proxima_poda = time.monotonic() + self.poda_intervalo
+
+    def parar(self):
+        self._parar.set()
+
+
+_limitador: Optional[LimitadorLogin] = None
+_manutencao: Optional[ManutencaoLogin] = None
+_limitador_lock = threading.Lock()
+
+
+def obter_limitador() -> LimitadorLogin:
+    """Limitador do processo; criado (e aquecido pelo banco) no primeiro uso."""
+    global _limitador, _manutencao
+    if _limitador is None:
+        with _limitador_lock:
+            if _limitador is None:
+                limitador = LimitadorLogin()
+                try:
+                    limitador.aquecer()
+                except Exception:
+                    logger.exception("falha ao aquecer o limitador de login")
+                if limitador.persistir or LOGIN_PODA_INTERVALO_MIN > 0:
+                    _manutencao = ManutencaoLogin(limitador)
+                    _manutencao.start()
+                _limitador = limitador
+    return _limitador
+
+
+def descarregar_tentativas() -> int:
+    return _limitador.descarregar() if _limitador is not None else 0
+
+
+atexit.register(descarregar_tentativas)
+
+
+def estatisticas_login() -> dict:
+    return _limitador.stats() if _limitador is not None else {}
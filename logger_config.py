@@ -1,9 +1,10 @@
 import logging
+import os
 
 def get_logger(name: str = "minha_renda"):
     logger = logging.getLogger(name)
     if not logger.handlers:
-        handler = logging.FileHandler("app.log", encoding="utf-8")
+        handler = logging.FileHandler(os.environ.get("APP_LOG", "app.log"), encoding="utf-8")
         formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s")
         handler.setFormatter(formatter)
         logger.addHandler(handler)
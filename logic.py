@@ -1,5 +1,15 @@
+from dataclasses import dataclass
+
+import numpy as np
 import pandas as pd
-from db import normalizar_int
+from db import (
+    RESUMO_ID_RENDAS,
+    carregar_resumo_mensal,
+    para_reais,
+    somar_rendas,
+    somar_gastos_por_classificacao,
+    somar_por_mes,
+)
 
 # ================= DATAFRAMES BASE =================
 
@@ -15,17 +25,18 @@ classificacao_base_df = pd.DataFrame([
 # ================= FUNÇÕES AUXILIARES =================
 
 def calcular_renda_total(rendas_df, visao, mes, ano, id_usuario):
+    """Total de rendas do período, em centavos."""
     if rendas_df.empty:
-        return 0.0
+        return 0
 
     if visao == "Mensal":
-        return rendas_df.query(
+        return int(rendas_df.query(
             "mes == @mes and ano == @ano and id_usuario == @id_usuario"
-            )["valor"].sum()
+            )["valor_centavos"].sum())
 
-    return rendas_df.query(
+    return int(rendas_df.query(
         "ano == @ano and id_usuario == @id_usuario"
-        )["valor"].sum()
+        )["valor_centavos"].sum())
 
 
 def aplicar_indicadores(resumo):
@@ -47,6 +58,49 @@ def aplicar_indicadores(resumo):
     return resumo
 
 
+def montar_resumo(gastos_por_classificacao, classificacao_df, renda_total):
+    """
+    Junta os totais por id_classificacao (valor_centavos) com a tabela de
+    classificações e calcula os indicadores. Compartilhado pelos caminhos
+    pandas e SQL. `renda_total` em centavos; `valor`/`valor_ideal` saem em reais.
+    """
+    resumo = (
+        gastos_por_classificacao
+        .astype({"id_classificacao": "int64"})
+        .merge(classificacao_df, on="id_classificacao", how="right")
+        .fillna({"valor_centavos": 0})
+        .astype({"valor_centavos": "int64"})
+        )
+
+    resumo["valor"] = para_reais(resumo["valor_centavos"])
+    resumo["valor_ideal"] = resumo["ideal_pct"] * para_reais(renda_total)
+    resumo["real_pct"] = resumo["valor_centavos"] / renda_total if renda_total > 0 else 0
+
+    return aplicar_indicadores(resumo)
+
+
+MESES_ABREV = [
+    "Jan", "Fev", "Mar", "Abr", "Mai", "Jun",
+    "Jul", "Ago", "Set", "Out", "Nov", "Dez"
+]
+
+
+def montar_evolucao(gastos_por_mes, rendas_por_mes):
+    """
+    `gastos_por_mes` (mes, Gastos) + `rendas_por_mes` (mes, Renda), em centavos
+    -> evolução em reais. O saldo é calculado ainda em centavos.
+    """
+    df = gastos_por_mes.merge(rendas_por_mes, on="mes", how="outer").fillna(0)
+    df = df.astype({"Gastos": "int64", "Renda": "int64"})
+    df["Saldo"] = df["Renda"] - df["Gastos"]
+    for col in ("Gastos", "Renda", "Saldo"):
+        df[col] = para_reais(df[col])
+
+    df["mes_nome"] = df["mes"].apply(lambda x: MESES_ABREV[x - 1])
+
+    return df
+
+
 # ================= RESUMOS =================
 
 def resumo_mensal_classificacao(
@@ -65,22 +119,12 @@ def resumo_mensal_classificacao(
         "mes == @mes and ano == @ano and id_usuario == @id_usuario"
         )
 
-    gastos_df = normalizar_int(gastos_df, ["id_classificacao", "mes", "ano"])
-    classificacao_df = normalizar_int(classificacao_df, ["id_classificacao"])
-
-    resumo = (
-        gastos_mes
-        .groupby("id_classificacao", as_index=False)["valor"]
-        .sum()
-        .merge(classificacao_df, on="id_classificacao", how="right")
-        .fillna({"valor": 0})
+    resumo = montar_resumo(
+        gastos_mes.groupby("id_classificacao", as_index=False)["valor_centavos"].sum(),
+        classificacao_df,
+        renda_total
         )
-
-    resumo["valor_ideal"] = resumo["ideal_pct"] * renda_total
-    resumo["real_pct"] = resumo["valor"] / renda_total if renda_total > 0 else 0
-
-    resumo = aplicar_indicadores(resumo)
-    return renda_total, resumo
+    return para_reais(renda_total), resumo
 
 
 def resumo_anual_classificacao(
@@ -98,18 +142,12 @@ def resumo_anual_classificacao(
         "ano == @ano and id_usuario == @id_usuario"
         )
 
-    resumo = (
-        gastos_ano
-        .groupby("id_classificacao", as_index=False)["valor"].sum()
-        .merge(classificacao_df, on="id_classificacao", how="right")
-        .fillna({"valor": 0})
+    resumo = montar_resumo(
+        gastos_ano.groupby("id_classificacao", as_index=False)["valor_centavos"].sum(),
+        classificacao_df,
+        renda_total
         )
-
-    resumo["valor_ideal"] = resumo["ideal_pct"] * renda_total
-    resumo["real_pct"] = resumo["valor"] / renda_total if renda_total > 0 else 0
-
-    resumo = aplicar_indicadores(resumo)
-    return renda_total, resumo
+    return para_reais(renda_total), resumo
 
 
 # ================= ORQUESTRADOR =================
@@ -145,26 +183,205 @@ def gerar_resumo(
 def gerar_evolucao_mensal(gastos_df, rendas_df, ano):
     gastos = (
         gastos_df[gastos_df["ano"] == ano]
-        .groupby("mes")["valor"]
+        .groupby("mes")["valor_centavos"]
         .sum()
         .reset_index(name="Gastos")
         )
 
     rendas = (
         rendas_df[rendas_df["ano"] == ano]
-        .groupby("mes")["valor"]
+        .groupby("mes")["valor_centavos"]
         .sum()
         .reset_index(name="Renda")
         )
 
-    df = gastos.merge(rendas, on="mes", how="outer").fillna(0)
-    df["Saldo"] = df["Renda"] - df["Gastos"]
+    return montar_evolucao(gastos, rendas)
+
+
+# ================= AGREGAÇÃO EM SQL =================
+# Mesmas saídas de gerar_resumo / gerar_evolucao_mensal, mas o GROUP BY roda
+# no SQLite (índices de cobertura) em vez de carregar as linhas no pandas.
 
-    df["mes_nome"] = df["mes"].apply(
-        lambda x: [
-            "Jan", "Fev", "Mar", "Abr", "Mai", "Jun",
-            "Jul", "Ago", "Set", "Out", "Nov", "Dez"
-        ][x - 1]
+def gerar_resumo_sql(classificacao_df, visao, mes, ano, id_usuario):
+    mes_filtro = mes if visao == "Mensal" else None
+
+    renda_total = somar_rendas(id_usuario, ano, mes_filtro)
+    gastos = somar_gastos_por_classificacao(id_usuario, ano, mes_filtro)
+
+    return para_reais(renda_total), montar_resumo(gastos, classificacao_df, renda_total)
+
+
+def gerar_evolucao_mensal_sql(id_usuario, ano):
+    return montar_evolucao(
+        somar_por_mes("gastos", id_usuario, ano, "Gastos"),
+        somar_por_mes("rendas", id_usuario, ano, "Renda")
         )
 
-    return df
\ No newline at end of file
+
+# ================= MATRIZ DE PERÍODOS =================
+# Todos os (ano, mes, id_classificacao) do usuário calculados de uma vez com
+# np.bincount sobre códigos lineares; resumo mensal/anual, evolução e
+# comparativo entre anos viram fatias da matriz, sem query/groupby/merge.
+
+FAIXAS_STATUS = np.array([0.9, 1.1])
+LIMITES_STATUS = (-1, 100)
+STATUS = ["Abaixo do ideal", "Dentro do ideal", "Acima do ideal"]
+ICONES = ["🟢", "🟡", "🔴"]
+
+
+def _categorias_status(real_pct, rotulos):
+    """Equivalente a pd.cut(real_pct, bins=[-1, 0.9, 1.1, 100], labels=rotulos)."""
+    codigos = np.searchsorted(FAIXAS_STATUS, real_pct, side="left")
+    fora = (real_pct <= LIMITES_STATUS[0]) | (real_pct > LIMITES_STATUS[1])
+    codigos = np.where(fora, -1, codigos)
+    return pd.Categorical.from_codes(codigos, categories=rotulos, ordered=True)
+
+
+def _acumular(ano, mes, classe, valor, quantidade, forma):
+    """Soma e contagem por célula (ano_idx, mes - 1, classe_idx) numa matriz `forma`."""
+    codigos = np.ravel_multi_index((ano, mes - 1, classe), forma)
+    n = int(np.prod(forma))
+    # valores inteiros (centavos): a soma em float64 é exata até 2**53
+    soma = np.bincount(codigos, weights=valor, minlength=n).round().astype("int64")
+    qtd = np.bincount(codigos, weights=quantidade, minlength=n).round().astype("int64")
+    return soma.reshape(forma), qtd.reshape(forma)
+
+
+@dataclass
+class MatrizResumo:
+    anos: np.ndarray              # (A,) anos presentes, crescente
+    classificacao_df: pd.DataFrame
+    gastos: np.ndarray            # (A, 12, C + 1) centavos; última = fora de classificacao_df
+    qtd_gastos: np.ndarray        # (A, 12, C + 1) lançamentos
+    rendas: np.ndarray            # (A, 12) centavos
+    qtd_rendas: np.ndarray        # (A, 12) lançamentos
+
+    def _indice_ano(self, ano):
+        i = int(np.searchsorted(self.anos, ano))
+        return i if i < len(self.anos) and self.anos[i] == ano else None
+
+    def _fatia(self, visao, mes, ano):
+        """(renda em centavos, gastos por classificação em centavos) do período."""
+        i = self._indice_ano(ano)
+        if i is None:
+            return 0, np.zeros(self.gastos.shape[2] - 1, dtype="int64")
+        if visao == "Mensal":
+            return int(self.rendas[i, mes - 1]), self.gastos[i, mes - 1, :-1]
+        return int(self.rendas[i].sum()), self.gastos[i, :, :-1].sum(axis=0)
+
+    def resumo(self, visao, mes, ano):
+        """Mesma saída de gerar_resumo / gerar_resumo_sql."""
+        renda_total, gastos = self._fatia(visao, mes, ano)
+
+        resumo = self.classificacao_df.copy()
+        resumo.insert(1, "valor_centavos", gastos.astype("int64"))
+        resumo["valor"] = para_reais(resumo["valor_centavos"])
+        resumo["valor_ideal"] = resumo["ideal_pct"] * para_reais(renda_total)
+        if renda_total > 0:
+            real_pct = gastos / renda_total
+        else:
+            real_pct = np.zeros(len(gastos), dtype="int64")
+        resumo["real_pct"] = real_pct
+        resumo["pct_barra"] = resumo["real_pct"].clip(upper=1.5)
+        resumo["status"] = _categorias_status(real_pct, STATUS)
+        resumo["icone"] = _categorias_status(real_pct, ICONES)
+
+        return para_reais(renda_total), resumo
+
+    def evolucao(self, ano):
+        """Mesma saída de gerar_evolucao_mensal_sql: meses com lançamento no ano."""
+        i = self._indice_ano(ano)
+        if i is None:
+            return montar_evolucao(
+                pd.DataFrame({"mes": pd.array([], dtype="Int64"), "Gastos": pd.array([], dtype="int64")}),
+                pd.DataFrame({"mes": pd.array([], dtype="Int64"), "Renda": pd.array([], dtype="int64")}),
+                )
+        meses = np.flatnonzero((self.qtd_gastos[i].sum(axis=1) > 0) | (self.qtd_rendas[i] > 0))
+        gastos = self.gastos[i].sum(axis=1)[meses]
+        rendas = self.rendas[i][meses]
+
+        df = pd.DataFrame({
+            "mes": pd.array(meses + 1, dtype="Int64"),
+            "Gastos": para_reais(gastos),
+            "Renda": para_reais(rendas),
+            "Saldo": para_reais(rendas - gastos),
+            })
+        df["mes_nome"] = [MESES_ABREV[m] for m in meses]
+        return df
+
+    def comparativo_anual(self):
+        """Renda, gastos, saldo e variação dos gastos em relação ao ano anterior."""
+        rendas = self.rendas.sum(axis=1)
+        gastos = self.gastos.sum(axis=(1, 2))
+        df = pd.DataFrame({
+            "ano": self.anos,
+            "Renda": para_reais(rendas),
+            "Gastos": para_reais(gastos),
+            "Saldo": para_reais(rendas - gastos),
+            })
+        df["var_gastos_pct"] = df["Gastos"].pct_change().replace([np.inf, -np.inf], np.nan)
+        return df
+
+    def gastos_por_ano(self):
+        """Gastos (reais) por ano × classificação, colunas pelos códigos."""
+        return pd.DataFrame(
+            para_reais(self.gastos.sum(axis=1)),
+            index=pd.Index(self.anos, name="ano"),
+            columns=self.classificacao_df["codigo"].tolist() + ["Outras"],
+            )
+
+
+def montar_matriz(rendas_df, gastos_df, classificacao_df):
+    """
+    Monta a MatrizResumo a partir de lançamentos (uma linha por renda/gasto)
+    ou de linhas já agregadas com coluna `quantidade` (resumo_mensal).
+    Linhas sem período são ignoradas. Gastos com classificação fora de
+    `classificacao_df` (ou sem classificação) ficam na última posição: contam
+    na evolução e no comparativo, mas não no resumo (como no merge de
+    montar_resumo).
+    """
+    ids = pd.Index(classificacao_df["id_classificacao"].astype("int64"))
+
+    def colunas(df, com_classe):
+        validas = (df["ano"].notna() & df["mes"].between(1, 12)).fillna(False)
+        classe = np.zeros(len(df), dtype="int64")
+        if com_classe:
+            classe = ids.get_indexer(df["id_classificacao"].astype("float64"))
+            classe[classe < 0] = len(ids)
+        validas = np.asarray(validas, dtype=bool)
+        qtd = df["quantidade"] if "quantidade" in df.columns else pd.Series(1, index=df.index)
+        return (
+            df["ano"].to_numpy(dtype="int64", na_value=0)[validas],
+            df["mes"].to_numpy(dtype="int64", na_value=0)[validas],
+            classe[validas],
+            df["valor_centavos"].to_numpy(dtype="float64")[validas],
+            qtd.to_numpy(dtype="float64")[validas],
+        )
+
+    g_ano, g_mes, g_classe, g_valor, g_qtd = colunas(gastos_df, True)
+    r_ano, r_mes, _, r_valor, r_qtd = colunas(rendas_df, False)
+
+    anos = np.union1d(g_ano, r_ano).astype("int64")
+    gastos, qtd_gastos = _acumular(
+        np.searchsorted(anos, g_ano), g_mes, g_classe, g_valor, g_qtd, (len(anos), 12, len(ids) + 1)
+        )
+    rendas, qtd_rendas = _acumular(
+        np.searchsorted(anos, r_ano), r_mes, np.zeros(len(r_ano), dtype="int64"), r_valor, r_qtd,
+        (len(anos), 12, 1)
+        )
+
+    return MatrizResumo(
+        anos=anos,
+        classificacao_df=classificacao_df.reset_index(drop=True),
+        gastos=gastos,
+        qtd_gastos=qtd_gastos,
+        rendas=rendas[:, :, 0],
+        qtd_rendas=qtd_rendas[:, :, 0],
+        )
+
+
+def matriz_resumo_sql(id_usuario, classificacao_df):
+    """MatrizResumo do usuário a partir de resumo_mensal (uma consulta, poucas linhas)."""
+    resumo = carregar_resumo_mensal(id_usuario)
+    eh_renda = resumo["id_classificacao"] == RESUMO_ID_RENDAS
+    return montar_matriz(resumo[eh_renda], resumo[~eh_renda], classificacao_df)
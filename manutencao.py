@@ -0,0 +1,223 @@
+"""
+Tarefas de manutenção do banco, para rodar fora do Streamlit:
+
+    python manutencao.py migrar
+    python manutencao.py verificar-resumo [--usuario ID]
+    python manutencao.py reconstruir-resumo [--usuario ID]
+    python manutencao.py backup [--destino ARQ] [--compressao gzip|zstd|nenhuma]
+    python manutencao.py backup-agendado [--intervalo-min N] [--manter N]
+    python manutencao.py importar --usuario ID ARQUIVO [--formato csv|ofx] [--sep ;] [--decimal ,]
+    python manutencao.py exportar-parquet DESTINO [--usuario ID]
+    python manutencao.py importar-parquet ORIGEM [--novos-ids] [--usuario-destino ID]
+    python manutencao.py reter [--tabela audit_logs|login_attempts] [--dias N] [--destino arquivo|banco|nenhum]
+    python manutencao.py reindexar-busca
+    python manutencao.py materializar-recorrencias [--ate AAAA-MM] [--usuario ID]
+    python manutencao.py exportar-auditoria DESTINO [--formato csv|parquet] [--tipo T ...] [--ator ID] [--alvo ID] [--inicio AAAA-MM-DD] [--fim AAAA-MM-DD]
+"""
+import argparse
+import sys
+import time
+
+import backup
+import exportacao
+import importacao
+import recorrencias
+import retencao
+from db import (
+    migrar,
+    reconstruir_indice_busca,
+    reconstruir_resumo_mensal,
+    verificar_resumo_mensal,
+)
+
+
+def _cmd_migrar(args):
+    print(f"Schema na versão {migrar()}")
+    return 0
+
+
+def _cmd_verificar_resumo(args):
+    divergencias = verificar_resumo_mensal(args.usuario)
+    if divergencias.empty:
+        print("resumo_mensal consistente.")
+        return 0
+    print(divergencias.to_string(index=False))
+    print(f"{len(divergencias)} divergência(s). Rode 'reconstruir-resumo' para corrigir.")
+    return 1
+
+
+def _cmd_reconstruir_resumo(args):
+    reconstruir_resumo_mensal(args.usuario)
+    print("resumo_mensal reconstruído.")
+    return 0
+
+
+def _cmd_reindexar_busca(args):
+    reconstruir_indice_busca()
+    print("Índices de busca (gastos_fts/rendas_fts) reconstruídos.")
+    return 0
+
+
+def _cmd_materializar_recorrencias(args):
+    ate = tuple(int(x) for x in args.ate.split("-")) if args.ate else None
+    total = recorrencias.materializar(ate=ate, id_usuario=args.usuario)
+    print(f"{total['lancamentos']} lançamento(s) de {total['regras']} recorrência(s) em {total['lotes']} lote(s)")
+    return 0
+
+
+def _compressao(valor):
+    return None if valor == "nenhuma" else valor
+
+
+def _cmd_backup(args):
+    compressao = _compressao(args.compressao)
+    if args.destino:
+        caminho = backup.gerar_backup(args.destino, compressao)
+    else:
+        caminho = backup.backup_local(compressao=compressao, manter=args.manter)
+    print(f"Backup gerado em {caminho}")
+    return 0
+
+
+def _cmd_backup_agendado(args):
+    agendador = backup.BackupAgendado(
+        args.intervalo_min, compressao=_compressao(args.compressao), manter=args.manter
+    )
+    backup.backup_local(compressao=agendador.compressao, manter=agendador.manter)
+    agendador.start()
+    print(f"Backup a cada {args.intervalo_min} min em {agendador.diretorio} (Ctrl+C para sair)")
+    try:
+        while agendador.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        agendador.parar()
+    return 0
+
+
+def _cmd_importar(args):
+    opcoes = {}
+    formato = args.formato or importacao.detectar_formato(args.arquivo)
+    if formato == "csv":
+        opcoes = {"sep": args.sep, "decimal": args.decimal, "encoding": args.encoding}
+    total = importacao.importar_extrato(args.usuario, args.arquivo, formato=formato, **opcoes)
+    print(
+        f"{total['lidas']} linha(s) lida(s): {total['gastos']} gasto(s) e {total['rendas']} renda(s) "
+        f"importado(s), {total['duplicadas']} duplicada(s), {total['invalidas']} inválida(s)."
+    )
+    return 0
+
+
+def _cmd_exportar_parquet(args):
+    total = exportacao.exportar_parquet(args.destino, args.usuario)
+    for tabela, linhas in total.items():
+        print(f"{tabela}: {linhas} linha(s) em {args.destino}/{tabela}")
+    return 0
+
+
+def _cmd_importar_parquet(args):
+    total = exportacao.importar_parquet(
+        args.origem, manter_ids=False if args.novos_ids else None, id_usuario_destino=args.usuario_destino
+    )
+    for tabela, contagem in total.items():
+        print(f"{tabela}: {contagem['inseridas']} de {contagem['lidas']} linha(s) inserida(s), "
+              f"{contagem['ignoradas']} ignorada(s) ({contagem['ids_existentes']} por id já existente)")
+    return 0
+
+
+def _cmd_reter(args):
+    tabelas = [args.tabela] if args.tabela else list(retencao.POLITICAS)
+    for tabela in tabelas:
+        total = retencao.reter(tabela, args.dias, destino=args.destino)
+        print(f"{tabela}: {total['linhas']} linha(s) arquivada(s)/agregada(s) em {total['lotes']} lote(s)"
+              + (f" -> {total['arquivo']}" if total["arquivo"] else ""))
+    return 0
+
+
+def _cmd_exportar_auditoria(args):
+    linhas = exportacao.exportar_auditoria(
+        args.destino, args.formato, event_type=args.tipo, actor_id=args.ator,
+        target_id=args.alvo, inicio=args.inicio, fim=args.fim,
+    )
+    print(f"{linhas} evento(s) de auditoria em {args.destino}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção do banco Minha Renda")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    sub.add_parser("migrar", help="aplica migrações pendentes").set_defaults(func=_cmd_migrar)
+
+    p = sub.add_parser("verificar-resumo", help="confere resumo_mensal contra rendas/gastos")
+    p.add_argument("--usuario", type=int, default=None)
+    p.set_defaults(func=_cmd_verificar_resumo)
+
+    p = sub.add_parser("reconstruir-resumo", help="recalcula resumo_mensal")
+    p.add_argument("--usuario", type=int, default=None)
+    p.set_defaults(func=_cmd_reconstruir_resumo)
+
+    sub.add_parser("reindexar-busca", help="refaz os índices de busca textual de rendas/gastos") \
+        .set_defaults(func=_cmd_reindexar_busca)
+
+    p = sub.add_parser("materializar-recorrencias", help="gera os lançamentos devidos das recorrências")
+    p.add_argument("--ate", default=None, help="AAAA-MM (padrão: mês atual)")
+    p.add_argument("--usuario", type=int, default=None, help="padrão: todos os usuários")
+    p.set_defaults(func=_cmd_materializar_recorrencias)
+
+    compressoes = ["nenhuma", "gzip", "zstd"]
+
+    p = sub.add_parser("backup", help="backup consistente do banco")
+    p.add_argument("--destino", default=None, help="arquivo de saída (padrão: BACKUP_DIR com retenção)")
+    p.add_argument("--compressao", choices=compressoes, default=backup.BACKUP_COMPRESSAO or "nenhuma")
+    p.add_argument("--manter", type=int, default=backup.BACKUP_RETENCAO)
+    p.set_defaults(func=_cmd_backup)
+
+    p = sub.add_parser("backup-agendado", help="gera backups periódicos em BACKUP_DIR")
+    p.add_argument("--intervalo-min", type=float, default=backup.BACKUP_INTERVALO_MIN or 60)
+    p.add_argument("--compressao", choices=compressoes, default=backup.BACKUP_COMPRESSAO or "nenhuma")
+    p.add_argument("--manter", type=int, default=backup.BACKUP_RETENCAO)
+    p.set_defaults(func=_cmd_backup_agendado)
+
+    p = sub.add_parser("importar", help="importa extrato bancário CSV/OFX para um usuário")
+    p.add_argument("arquivo")
+    p.add_argument("--usuario", type=int, required=True)
+    p.add_argument("--formato", choices=["csv", "ofx"], default=None)
+    p.add_argument("--sep", default=";")
+    p.add_argument("--decimal", default=",")
+    p.add_argument("--encoding", default="utf-8")
+    p.set_defaults(func=_cmd_importar)
+
+    p = sub.add_parser("exportar-parquet", help="exporta rendas/gastos em Parquet particionado por ano")
+    p.add_argument("destino")
+    p.add_argument("--usuario", type=int, default=None, help="padrão: todos os usuários")
+    p.set_defaults(func=_cmd_exportar_parquet)
+
+    p = sub.add_parser("importar-parquet", help="importa um diretório gerado por exportar-parquet")
+    p.add_argument("origem")
+    p.add_argument("--novos-ids", action="store_true", help="gera ids novos em vez de preservar (padrão com --usuario-destino)")
+    p.add_argument("--usuario-destino", type=int, default=None, help="reatribui as linhas a este usuário")
+    p.set_defaults(func=_cmd_importar_parquet)
+
+    p = sub.add_parser("reter", help="arquiva, agrega por dia e apaga audit_logs/login_attempts antigos")
+    p.add_argument("--tabela", choices=list(retencao.POLITICAS), default=None, help="padrão: todas")
+    p.add_argument("--dias", type=int, default=None, help="padrão: prazo configurado da tabela")
+    p.add_argument("--destino", choices=retencao.DESTINOS, default=retencao.RETENCAO_DESTINO)
+    p.set_defaults(func=_cmd_reter)
+
+    p = sub.add_parser("exportar-auditoria", help="exporta audit_logs (CSV/Parquet) em lotes")
+    p.add_argument("destino")
+    p.add_argument("--formato", choices=["csv", "parquet"], default="csv")
+    p.add_argument("--tipo", action="append", default=None, help="event_type (pode repetir)")
+    p.add_argument("--ator", type=int, default=None)
+    p.add_argument("--alvo", type=int, default=None)
+    p.add_argument("--inicio", default=None, help="AAAA-MM-DD (UTC)")
+    p.add_argument("--fim", default=None, help="AAAA-MM-DD (UTC), inclusive")
+    p.set_defaults(func=_cmd_exportar_auditoria)
+
+    args = parser.parse_args(argv)
+    migrar()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Lançamentos recorrentes: materializa as regras de `recorrencias` em
+rendas/gastos, para todos os usuários, até o mês atual.
+
+Cada regra guarda o próximo mês ainda não gerado (proximo_periodo). As
+regras vencidas são lidas em ordem de id e gravadas em lotes de até
+RECORRENCIAS_LOTE lançamentos, numa transação curta por lote (BEGIN
+IMMEDIATE): insere os lançamentos e avança o cursor das regras juntos.
+
+Rodar de novo é seguro: o cursor já avançou, e cada lançamento leva a
+chave "rec:<regra>:<período>" em hash_importacao, cujo índice único
+(id_usuario, hash_importacao) faz o INSERT OR IGNORE descartar o que já
+existe, mesmo que o cursor tenha voltado. Um lançamento apagado pelo
+usuário não é recriado.
+
+RECORRENCIAS_INTERVALO_MIN liga a execução agendada (0 = desligada).
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+import db
+from logger_config import logger
+
+
+# cada lançamento passa pelos triggers de resumo, versão e busca (~70 µs):
+# 250 por lote seguram o lock de escrita por ~20 ms
+RECORRENCIAS_LOTE = int(os.environ.get("RECORRENCIAS_LOTE", "250"))
+RECORRENCIAS_PAUSA_S = 0.01  # entre lotes: dá a vez aos escritores
+RECORRENCIAS_INTERVALO_MIN = float(os.environ.get("RECORRENCIAS_INTERVALO_MIN", "60"))
+
+_SQL_INSERIR = {
+    "gastos": """
+        INSERT OR IGNORE INTO gastos
+        (id_usuario, id_classificacao, categoria, descricao, valor_centavos, mes, ano, hash_importacao)
+        VALUES (?,?,?,?,?,?,?,?)
+    """,
+    "rendas": """
+        INSERT OR IGNORE INTO rendas
+        (id_usuario, descricao, valor_centavos, mes, ano, hash_importacao)
+        VALUES (?,?,?,?,?,?)
+    """,
+}
+
+
+def chave(id_regra: int, periodo: int) -> str:
+    """hash_importacao do lançamento que a regra gera no período."""
+    return f"rec:{id_regra}:{periodo}"
+
+
+def _mes_atual() -> Tuple[int, int]:
+    hoje = datetime.now()
+    return hoje.year, hoje.month
+
+
+def materializar(ate: Optional[Tuple[int, int]] = None, id_usuario: Optional[int] = None,
+                 lote: int = RECORRENCIAS_LOTE, pausa: float = RECORRENCIAS_PAUSA_S) -> dict:
+    """
+    Gera os lançamentos devidos das regras ativas até `ate` ((ano, mes),
+    padrão: mês atual), de todos os usuários ou só de `id_usuario`.
+    Retorna {"regras", "lancamentos", "lotes"} (lançamentos de fato inseridos).
+    """
+    limite = db.periodo(*(ate or _mes_atual()))
+    filtro, params = ("", []) if id_usuario is None else (" AND id_usuario = ?", [id_usuario])
+    resultado = {"regras": 0, "lancamentos": 0, "lotes": 0}
+    tocadas = set()
+    a_partir = 0
+
+    while True:
+        with db.conexao() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            regras = conn.execute(
+                f"""
+                SELECT id, id_usuario, tipo, id_classificacao, categoria, descricao, valor_centavos,
+                       intervalo_meses, fim_periodo, proximo_periodo
+                FROM recorrencias
+                WHERE ativa = 1 AND proximo_periodo <= ? AND id >= ?{filtro}
+                ORDER BY id LIMIT ?
+                """,
+                [limite, a_partir] + params + [lote],
+            ).fetchall()
+            if not regras:
+                break
+
+            linhas = {"gastos": [], "rendas": []}
+            cursores, gerados = [], 0
+            for id_, usuario, tipo, id_class, categoria, descricao, valor, intervalo, fim, proximo in regras:
+                ultimo = limite if fim is None else min(limite, fim)
+                periodos = list(range(proximo, ultimo + 1, intervalo))[:max(lote - gerados, 1)]
+                for p in periodos:
+                    ano, mes = db.ano_mes(p)
+                    if tipo == "gastos":
+                        linhas[tipo].append((usuario, id_class, categoria, descricao, valor, mes, ano, chave(id_, p)))
+                    else:
+                        linhas[tipo].append((usuario, descricao, valor, mes, ano, chave(id_, p)))
+                novo = periodos[-1] + intervalo if periodos else proximo
+                encerrada = fim is not None and novo > fim
+                cursores.append((novo, 0 if encerrada else 1, id_))
+                gerados += len(periodos)
+                # regra só em parte: volta nela no próximo lote
+                a_partir = id_ if novo <= ultimo else id_ + 1
+                if gerados >= lote:
+                    break
+
+            for tipo, valores in linhas.items():
+                if valores:
+                    resultado["lancamentos"] += conn.executemany(_SQL_INSERIR[tipo], valores).rowcount
+            conn.executemany("UPDATE recorrencias SET proximo_periodo = ?, ativa = ? WHERE id = ?", cursores)
+        tocadas.update(id_ for _, _, id_ in cursores)
+        resultado["lotes"] += 1
+        time.sleep(pausa)
+    resultado["regras"] = len(tocadas)
+
+    if resultado["lancamentos"]:
+        logger.info(
+            "recorrências: %d lançamento(s) de %d regra(s) em %d lote(s), até %02d/%d",
+            resultado["lancamentos"], resultado["regras"], resultado["lotes"], *reversed(db.ano_mes(limite)),
+        )
+    return resultado
+
+
+# ---------------- MATERIALIZAÇÃO AGENDADA ----------------
+
+class RecorrenciasAgendadas(threading.Thread):
+    """Thread daemon que materializa as recorrências a cada `intervalo_min` minutos (a primeira vez logo no início)."""
+
+    def __init__(self, intervalo_min: float = RECORRENCIAS_INTERVALO_MIN):
+        super().__init__(name="recorrencias-agendadas", daemon=True)
+        self.intervalo = intervalo_min * 60
+        self._parar = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                materializar()
+            except Exception:
+                logger.exception("falha ao materializar recorrências")
+            if self._parar.wait(self.intervalo):
+                break
+
+    def parar(self):
+        self._parar.set()
+
+
+_agendador: Optional[RecorrenciasAgendadas] = None
+_agendador_lock = threading.Lock()
+
+
+def iniciar_recorrencias_agendadas() -> Optional[RecorrenciasAgendadas]:
+    """Inicia o agendador uma vez por processo, se RECORRENCIAS_INTERVALO_MIN > 0."""
+    global _agendador
+    if RECORRENCIAS_INTERVALO_MIN <= 0:
+        return None
+    with _agendador_lock:
+        if _agendador is None or not _agendador.is_alive():
+            _agendador = RecorrenciasAgendadas()
+            _agendador.start()
+    return _agendador
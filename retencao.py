@@ -0,0 +1,261 @@
+"""
+Retenção de audit_logs e login_attempts.
+
+Linhas mais antigas que a política são, lote a lote e numa transação curta
+por lote (BEGIN IMMEDIATE; os escritores esperam só um lote):
+
+  1. arquivadas: CSV gzip em RETENCAO_DIR (um arquivo por execução) ou num
+     banco SQLite de arquivo anexado (RETENCAO_BANCO), ou descartadas;
+  2. somadas nos agregados diários (audit_logs_diario por tipo de evento,
+     login_attempts_diario por sucesso/falha), que continuam consultáveis;
+  3. apagadas.
+
+Se um lote falha, nada dele é apagado. No arquivo CSV um lote que falhou
+depois de escrito pode aparecer de novo na próxima execução (deduplique por
+id); no banco de arquivo a inserção é idempotente (INSERT OR IGNORE).
+
+Política (variáveis de ambiente): RETENCAO_AUDIT_DIAS, LOGIN_RETENCAO_DIAS
+(0 = manter tudo) e RETENCAO_DESTINO (arquivo | banco | nenhum).
+
+login_attempts é retida por padrão, pela thread do limitador de login
+(limite_login, a cada LOGIN_PODA_INTERVALO_MIN). audit_logs só tem execução
+agendada com RETENCAO_INTERVALO_MIN > 0 (padrão 0 = desligada; sem ela roda
+por `python manutencao.py reter`).
+"""
+import csv
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import db
+from logger_config import logger
+
+
+RETENCAO_AUDIT_DIAS = int(os.environ.get("RETENCAO_AUDIT_DIAS", "365"))
+RETENCAO_LOGIN_DIAS = int(os.environ.get("LOGIN_RETENCAO_DIAS", "30"))
+RETENCAO_DESTINO = os.environ.get("RETENCAO_DESTINO", "arquivo").lower()
+RETENCAO_DIR = os.environ.get("RETENCAO_DIR", os.path.join(db.BASE_DIR, "arquivo"))
+RETENCAO_BANCO = os.environ.get("RETENCAO_BANCO", os.path.join(db.BASE_DIR, "arquivo.db"))
+# apaga a trilha de auditoria: a execução agendada de audit_logs só roda se
+# configurada, como o backup agendado (login_attempts fica com limite_login)
+RETENCAO_INTERVALO_MIN = float(os.environ.get("RETENCAO_INTERVALO_MIN", "0"))  # 0 = desligada
+RETENCAO_LOTE = int(os.environ.get("RETENCAO_LOTE", "1000"))
+RETENCAO_PAUSA_S = 0.01  # entre lotes: dá a vez aos escritores
+
+DESTINOS = ("arquivo", "banco", "nenhum")
+
+# por tabela: coluna de data, colunas arquivadas, DDL no banco de arquivo e
+# agregação diária (recebe os ids do lote como lista JSON)
+POLITICAS = {
+    "audit_logs": {
+        "data": "created_at",
+        "colunas": db.COLUNAS_AUDITORIA,
+        "ddl": """
+            CREATE TABLE IF NOT EXISTS arquivo.audit_logs (
+                id INTEGER PRIMARY KEY, event_type TEXT, actor_id INTEGER,
+                target_id INTEGER, details TEXT, created_at TIMESTAMP
+            )
+        """,
+        "agregar": """
+            INSERT INTO audit_logs_diario (dia, event_type, quantidade)
+            SELECT date(created_at), event_type, COUNT(1) FROM audit_logs
+            WHERE id IN (SELECT value FROM json_each(?))
+            GROUP BY 1, 2
+            ON CONFLICT (dia, event_type) DO UPDATE SET quantidade = quantidade + excluded.quantidade
+        """,
+    },
+    "login_attempts": {
+        "data": "attempted_at",
+        "colunas": ("id", "email", "attempted_at", "success", "ip"),
+        "ddl": """
+            CREATE TABLE IF NOT EXISTS arquivo.login_attempts (
+                id INTEGER PRIMARY KEY, email TEXT, attempted_at TIMESTAMP,
+                success INTEGER, ip TEXT
+            )
+        """,
+        "agregar": """
+            INSERT INTO login_attempts_diario (dia, success, quantidade)
+            SELECT date(attempted_at), COALESCE(success, 0), COUNT(1) FROM login_attempts
+            WHERE id IN (SELECT value FROM json_each(?))
+            GROUP BY 1, 2
+            ON CONFLICT (dia, success) DO UPDATE SET quantidade = quantidade + excluded.quantidade
+        """,
+    },
+}
+
+
+def dias_padrao(tabela: str) -> int:
+    return RETENCAO_AUDIT_DIAS if tabela == "audit_logs" else RETENCAO_LOGIN_DIAS
+
+
+class _ArquivoCsv:
+    """CSV gzip aberto no primeiro lote; um arquivo por execução e tabela."""
+
+    def __init__(self, diretorio: str, tabela: str, colunas):
+        self.caminho = None
+        self._diretorio, self._tabela, self._colunas = diretorio, tabela, colunas
+        self._arquivo = self._escritor = None
+
+    def escrever(self, linhas: list):
+        if self._arquivo is None:
+            os.makedirs(self._diretorio, exist_ok=True)
+            nome = f"{self._tabela}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv.gz"
+            self.caminho = os.path.join(self._diretorio, nome)
+            self._arquivo = gzip.open(self.caminho, "at", newline="", encoding="utf-8", compresslevel=6)
+            self._escritor = csv.writer(self._arquivo)
+            self._escritor.writerow(self._colunas)
+        self._escritor.writerows(linhas)
+        self._arquivo.flush()
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+
+
+def reter(tabela: str, dias: Optional[int] = None, destino: str = RETENCAO_DESTINO,
+          lote: int = RETENCAO_LOTE, pausa: float = RETENCAO_PAUSA_S,
+          diretorio: str = RETENCAO_DIR, banco: str = RETENCAO_BANCO) -> dict:
+    """
+    Aplica a retenção a `tabela` (audit_logs ou login_attempts): arquiva,
+    agrega por dia e apaga as linhas com mais de `dias` dias.
+    Retorna {"linhas", "lotes", "arquivo"}.
+    """
+    politica = POLITICAS[tabela]
+    if destino not in DESTINOS:
+        raise ValueError(f"Destino de retenção desconhecido: {destino}")
+    dias = dias_padrao(tabela) if dias is None else dias
+    resultado = {"linhas": 0, "lotes": 0, "arquivo": None}
+    if dias <= 0:
+        return resultado
+    if tabela == "audit_logs":
+        db.descarregar_auditoria()
+
+    corte = (datetime.now(timezone.utc) - timedelta(days=dias)).strftime("%Y-%m-%d %H:%M:%S")
+    colunas = ", ".join(politica["colunas"])
+    data = politica["data"]
+    arquivo_csv = _ArquivoCsv(diretorio, tabela, politica["colunas"]) if destino == "arquivo" else None
+
+    # conexão própria: o ATTACH não pode voltar para o pool
+    conn = db.conectar()
+    try:
+        if destino == "banco":
+            conn.execute("ATTACH DATABASE ? AS arquivo", (banco,))
+            conn.execute(politica["ddl"])
+            conn.commit()
+            resultado["arquivo"] = banco
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                linhas = conn.execute(
+                    f"SELECT {colunas} FROM {tabela} WHERE {data} < ? ORDER BY {data}, id LIMIT ?",
+                    (corte, lote),
+                ).fetchall()
+                if not linhas:
+                    conn.rollback()
+                    break
+                ids = json.dumps([linha[0] for linha in linhas])
+                if destino == "banco":
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO arquivo.{tabela} ({colunas}) "
+                        f"SELECT {colunas} FROM main.{tabela} WHERE id IN (SELECT value FROM json_each(?))",
+                        (ids,),
+                    )
+                elif arquivo_csv is not None:
+                    arquivo_csv.escrever(linhas)
+                conn.execute(politica["agregar"], (ids,))
+                conn.execute(f"DELETE FROM {tabela} WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            resultado["linhas"] += len(linhas)
+            resultado["lotes"] += 1
+            if len(linhas) < lote:
+                break
+            time.sleep(pausa)
+    finally:
+        if arquivo_csv is not None:
+            arquivo_csv.fechar()
+            resultado["arquivo"] = resultado["arquivo"] or arquivo_csv.caminho
+        conn.close()
+
+    if resultado["linhas"]:
+        logger.info(
+            "retenção de %s: %d linha(s) com mais de %d dia(s) em %d lote(s) -> %s",
+            tabela, resultado["linhas"], dias, resultado["lotes"], resultado["arquivo"] or destino,
+        )
+    return resultado
+
+
+def aplicar_politica(**opcoes) -> dict:
+    """Retenção de todas as tabelas com os prazos configurados."""
+    return {tabela: reter(tabela, **opcoes) for tabela in POLITICAS}
+
+
+def contagem_diaria(tabela: str):
+    """
+    Contagem por dia somando os agregados (linhas já apagadas) e as linhas
+    ainda na tabela: audit_logs por event_type, login_attempts por success.
+    """
+    data = POLITICAS[tabela]["data"]
+    chave = "event_type" if tabela == "audit_logs" else "COALESCE(success, 0)"
+    nome = "event_type" if tabela == "audit_logs" else "success"
+    import pandas as pd  # só aqui: o módulo é importado antes do login
+
+    with db.conexao() as conn:
+        return pd.read_sql(
+            f"""
+            SELECT dia, {nome}, SUM(quantidade) AS quantidade FROM (
+                SELECT dia, {nome}, quantidade FROM {tabela}_diario
+                UNION ALL
+                SELECT date({data}) AS dia, {chave} AS {nome}, COUNT(1) FROM {tabela} GROUP BY 1, 2
+            )
+            GROUP BY dia, {nome} ORDER BY dia, {nome}
+            """,
+            conn,
+        )
+
+
+# ---------------- RETENÇÃO AGENDADA ----------------
+
+class RetencaoAgendada(threading.Thread):
+    """Thread daemon que retém `tabelas` a cada `intervalo_min` minutos (a primeira vez logo no início)."""
+
+    def __init__(self, intervalo_min: float = RETENCAO_INTERVALO_MIN, tabelas=("audit_logs",)):
+        super().__init__(name="retencao-agendada", daemon=True)
+        self.intervalo = intervalo_min * 60
+        self.tabelas = tabelas
+        self._parar = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                for tabela in self.tabelas:
+                    reter(tabela)
+            except Exception:
+                logger.exception("falha na retenção agendada")
+            if self._parar.wait(self.intervalo):
+                break
+
+    def parar(self):
+        self._parar.set()
+
+
+_agendador: Optional[RetencaoAgendada] = None
+_agendador_lock = threading.Lock()
+
+
+def iniciar_retencao_agendada() -> Optional[RetencaoAgendada]:
+    """Inicia o agendador uma vez por processo, se RETENCAO_INTERVALO_MIN > 0."""
+    global _agendador
+    if RETENCAO_INTERVALO_MIN <= 0:
+        return None
+    with _agendador_lock:
+        if _agendador is None or not _agendador.is_alive():
+            _agendador = RetencaoAgendada()
+            _agendador.start()
+    return _agendador
@@ -0,0 +1,203 @@
+"""
+Hash e verificação de senhas (bcrypt) fora da thread do script.
+
+O bcrypt é CPU puro e de propósito lento (~0,3 s no custo 12). O pacote
+`bcrypt` solta o GIL durante o cálculo, então um pool de threads basta:
+o rerun de cada sessão só espera o próprio hash, e o pool limita quantos
+hashes rodam ao mesmo tempo (SENHAS_POOL), para uma rajada de logins não
+tomar todos os núcleos. Trabalhos além de SENHAS_FILA_MAX esperam até
+SENHAS_TIMEOUT_S e então levantam TimeoutError (servidor ocupado).
+
+BCRYPT_CUSTO é o work factor de hashes novos; meça com
+benchmarks/bench_senhas.py antes de mudar. Rehash de hashes antigos acontece
+depois de um login certo, em segundo plano: SHA-256 legado sempre;
+hashes bcrypt de custo menor só com SENHAS_REHASH=1.
+"""
+import hashlib
+import hmac
+import os
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Union
+
+import bcrypt
+
+from logger_config import logger
+
+
+BCRYPT_CUSTO = int(os.environ.get("BCRYPT_CUSTO", "12"))
+SENHAS_POOL = int(os.environ.get("SENHAS_POOL", str(min(4, os.cpu_count() or 1))))
+SENHAS_FILA_MAX = int(os.environ.get("SENHAS_FILA_MAX", "64"))
+SENHAS_TIMEOUT_S = float(os.environ.get("SENHAS_TIMEOUT_S", "10"))
+SENHAS_REHASH = os.environ.get("SENHAS_REHASH", "0") == "1"
+
+Hash = Union[bytes, str]
+
+
+def _hash_bcrypt(senha: str, custo: int) -> bytes:
+    return bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt(custo))
+
+
+def _checar_bcrypt(senha: str, armazenado: bytes) -> bool:
+    try:
+        return bcrypt.checkpw(senha.encode("utf-8"), armazenado)
+    except ValueError:  # hash corrompido / formato desconhecido
+        return False
+
+
+def _e_sha256(armazenado: Hash) -> bool:
+    return isinstance(armazenado, str) and len(armazenado) == 64 and all(c in string.hexdigits for c in armazenado)
+
+
+def _como_bcrypt(armazenado: Hash) -> Optional[bytes]:
+    if isinstance(armazenado, (bytes, bytearray, memoryview)):
+        return bytes(armazenado)
+    if isinstance(armazenado, str) and armazenado.startswith("$2"):
+        return armazenado.encode("utf-8")
+    return None
+
+
+def custo_do_hash(armazenado: Hash) -> Optional[int]:
+    """Work factor de um hash bcrypt ($2b$12$...); None se não for bcrypt."""
+    dados = _como_bcrypt(armazenado)
+    try:
+        return int(dados.split(b"$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class ServicoSenhas:
+    """Pool limitado de threads para bcrypt, com fila limitada."""
+
+    def __init__(self, tamanho: int = SENHAS_POOL, fila_max: int = SENHAS_FILA_MAX,
+                 timeout: float = SENHAS_TIMEOUT_S):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=tamanho, thread_name_prefix="senhas")
+        self._vagas = threading.BoundedSemaphore(fila_max)
+        self.executados = 0
+        self.recusados = 0
+        self.rehashes = 0
+
+    def _enviar(self, espera: Optional[float], fn: Callable, *args):
+        obteve = self._vagas.acquire(timeout=espera) if espera else self._vagas.acquire(blocking=False)
+        if not obteve:
+            self.recusados += 1
+            raise TimeoutError("serviço de senhas ocupado")
+        try:
+            futuro = self._pool.submit(fn, *args)
+        except Exception:
+            self._vagas.release()
+            raise
+        futuro.add_done_callback(lambda _: self._vagas.release())
+        self.executados += 1
+        return futuro
+
+    def _executar(self, fn: Callable, *args):
+        inicio = time.monotonic()
+        futuro = self._enviar(self.timeout, fn, *args)
+        restante = max(0.0, self.timeout - (time.monotonic() - inicio))
+        try:
+            return futuro.result(timeout=restante)
+        except TimeoutError:
+            futuro.cancel()
+            raise
+
+    def gerar_hash(self, senha: str, custo: int = BCRYPT_CUSTO) -> bytes:
+        return self._executar(_hash_bcrypt, senha, custo)
+
+    def verificar(self, senha: str, armazenado: Hash) -> bool:
+        if _e_sha256(armazenado):
+            # legado: barato, compara em tempo constante sem passar pelo pool
+            return hmac.compare_digest(hashlib.sha256(senha.encode("utf-8")).hexdigest(), armazenado)
+        dados = _como_bcrypt(armazenado)
+        if dados is None:
+            return False
+        return self._executar(_checar_bcrypt, senha, dados)
+
+    def rehash_em_segundo_plano(self, senha: str, gravar: Callable[[bytes], None],
+                                custo: int = BCRYPT_CUSTO) -> bool:
+        """
+        Gera um hash novo sem esperar e chama `gravar(novo_hash)` quando pronto.
+        Com a fila cheia não faz nada (fica para o próximo login); retorna se agendou.
+        """
+        try:
+            futuro = self._enviar(None, _hash_bcrypt, senha, custo)
+        except TimeoutError:
+            return False
+
+        def concluir(f):
+            try:
+                gravar(f.result())
+                self.rehashes += 1
+            except Exception:
+                logger.exception("falha ao regravar hash de senha")
+
+        futuro.add_done_callback(concluir)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "executados": self.executados,
+            "recusados": self.recusados,
+            "rehashes": self.rehashes,
+        }
+
+
+_servico: Optional[ServicoSenhas] = None
+_servico_lock = threading.Lock()
+
+
+def obter_servico() -> ServicoSenhas:
+    global _servico
+    if _servico is None:
+        with _servico_lock:
+            if _servico is None:
+                _servico = ServicoSenhas()
+    return _servico
+
+
+def gerar_hash(senha: str) -> bytes:
+    return obter_servico().gerar_hash(senha)
+
+
+def verificar(senha: str, armazenado: Hash) -> bool:
+    return obter_servico().verificar(senha, armazenado)
+
+
+def precisa_rehash(armazenado: Hash, custo: int = BCRYPT_CUSTO, rehash_custo: Optional[bool] = None) -> bool:
+    """SHA-256 legado sempre; bcrypt de custo menor só com SENHAS_REHASH (opt-in)."""
+    if _e_sha256(armazenado):
+        return True
+    rehash_custo = SENHAS_REHASH if rehash_custo is None else rehash_custo
+    atual = custo_do_hash(armazenado)
+    return bool(rehash_custo) and atual is not None and atual < custo
+
+
+def rehash_em_segundo_plano(senha: str, gravar: Callable[[bytes], None]) -> bool:
+    return obter_servico().rehash_em_segundo_plano(senha, gravar)
+
+
+def medir_custos(custos=range(10, 15), repeticoes: int = 3) -> dict:
+    """Melhor tempo (ms) de um hashpw por custo, na thread atual."""
+    tempos = {}
+    for custo in custos:
+        melhor = float("inf")
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            _hash_bcrypt("calibracao", custo)
+            melhor = min(melhor, time.perf_counter() - inicio)
+        tempos[custo] = melhor * 1000
+    return tempos
+
+
+def calibrar_custo(alvo_ms: float = 250, custos=range(10, 15)) -> int:
+    """Maior custo cujo hash fica abaixo de `alvo_ms` nesta máquina (mínimo 10)."""
+    tempos = medir_custos(custos)
+    dentro = [c for c, ms in tempos.items() if ms <= alvo_ms]
+    return max(dentro) if dentro else min(tempos)
+
+
+def estatisticas_senhas() -> dict:
+    return _servico.stats() if _servico is not None else {}
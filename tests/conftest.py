@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# log e arquivos da retenção dos testes não vão para o diretório atual
+_SAIDAS = tempfile.mkdtemp(prefix="financas_testes_")
+os.environ.setdefault("APP_LOG", os.path.join(_SAIDAS, "app.log"))
+os.environ.setdefault("RETENCAO_DIR", os.path.join(_SAIDAS, "arquivo"))
+os.environ.setdefault("RETENCAO_BANCO", os.path.join(_SAIDAS, "arquivo.db"))
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    """Banco temporário já migrado; db.DB_NAME volta ao original no fim."""
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "teste.db"))
+    db.migrar(forcar=True)
+    yield db.DB_NAME
+    # eventos de auditoria pendentes são gravados ainda neste banco
+    db.descarregar_auditoria()
+    db.fechar_conexoes()
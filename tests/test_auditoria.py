@@ -0,0 +1,138 @@
+"""Garantias da gravação assíncrona de auditoria (db.py, seção AUDITORIA)."""
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+import db
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class GravadorTravado(db.GravadorAuditoria):
+    """Só começa a consumir a fila depois de `liberar`."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.liberar = threading.Event()
+
+    def run(self):
+        self.liberar.wait()
+        super().run()
+
+
+@pytest.fixture
+def gravador(banco, monkeypatch):
+    """Instala um gravador de teste no lugar do global: gravador(classe, **opções)."""
+    instalados = []
+
+    def instalar(classe=db.GravadorAuditoria, **opcoes):
+        novo = classe(**opcoes)
+        novo.start()
+        monkeypatch.setattr(db, "_gravador", novo)
+        instalados.append(novo)
+        return novo
+
+    db.parar_auditoria()
+    yield instalar
+    for g in instalados:
+        if isinstance(g, GravadorTravado):
+            g.liberar.set()
+        g.parar()
+
+
+def detalhes(tipo: str) -> list:
+    with db.conexao() as conn:
+        return [r[0] for r in conn.execute("SELECT details FROM audit_logs WHERE event_type = ? ORDER BY id", (tipo,))]
+
+
+def test_descarregar_grava_tudo_na_ordem(gravador):
+    gravador(lote=100)
+    for i in range(2000):
+        db.log_audit("ordem", 1, 2, str(i))
+    assert db.descarregar_auditoria(timeout=30)
+    assert detalhes("ordem") == [str(i) for i in range(2000)]
+
+
+def test_created_at_e_o_instante_da_chamada(gravador):
+    travado = gravador(GravadorTravado)
+    antes = db._agora_utc()
+    db.log_audit("instante", None, None, None)
+    depois = db._agora_utc()
+    time.sleep(1.1)
+    travado.liberar.set()
+    assert db.descarregar_auditoria()
+    with db.conexao() as conn:
+        criado = conn.execute("SELECT created_at FROM audit_logs WHERE event_type = 'instante'").fetchone()[0]
+    assert antes <= criado <= depois < db._agora_utc()
+
+
+def test_fila_cheia_grava_sincrono_sem_perder_nem_reordenar(gravador):
+    # fila de 10 que ninguém consome: a cada 11ª chamada a fila inteira e o
+    # evento são gravados por quem chamou, antes dos que vêm depois
+    travado = gravador(GravadorTravado, tamanho_fila=10, espera_max=0.01)
+    for i in range(50):
+        db.log_audit("cheia", None, None, str(i))
+    assert travado.sincronos == 4
+    assert detalhes("cheia") == [str(i) for i in range(44)]
+    assert travado.pendentes() == 6
+    travado.liberar.set()
+    assert db.descarregar_auditoria()
+    assert detalhes("cheia") == [str(i) for i in range(50)]
+    assert travado.stats()["perdidos"] == 0
+
+
+def test_fila_cheia_com_gravador_ativo_mantem_a_ordem(gravador):
+    # fila minúscula e sem espera: a thread e as gravações síncronas de 4
+    # produtores se revezam; cada produtor vê seus eventos na ordem das chamadas
+    ativo = gravador(tamanho_fila=5, lote=3, espera_max=0)
+
+    def produzir(ator):
+        for i in range(500):
+            db.log_audit("concorrente", ator, None, str(i))
+
+    produtores = [threading.Thread(target=produzir, args=(ator,)) for ator in range(4)]
+    for t in produtores:
+        t.start()
+    for t in produtores:
+        t.join()
+    assert db.descarregar_auditoria(timeout=30)
+    with db.conexao() as conn:
+        linhas = conn.execute("SELECT actor_id, details FROM audit_logs WHERE event_type = 'concorrente' ORDER BY id")
+        por_ator = {}
+        for ator, detalhe in linhas:
+            por_ator.setdefault(ator, []).append(detalhe)
+    assert por_ator == {ator: [str(i) for i in range(500)] for ator in range(4)}
+    assert ativo.gravados == 2000 and ativo.perdidos == 0
+
+
+def test_parada_durante_gravacao_sincrona_ainda_encerra(gravador):
+    travado = gravador(GravadorTravado, tamanho_fila=3, espera_max=0.01)
+    for i in range(3):
+        db.log_audit("parada", None, None, str(i))
+    travado._fila.get_nowait()
+    travado._fila.put(db._PARAR)  # pedido de parada na fila cheia
+    db.log_audit("parada", None, None, "3")  # esvazia a fila, inclusive o pedido
+    travado.liberar.set()
+    travado.join(5)
+    assert not travado.is_alive()
+    assert detalhes("parada") == ["1", "2", "3"]
+
+
+def test_saida_normal_do_processo_grava_a_fila(banco):
+    script = textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {RAIZ!r})
+        import db
+        db.DB_NAME = {banco!r}
+        for i in range(1000):
+            db.log_audit("saida", None, None, str(i))
+    """)
+    # intervalo longo: sem o atexit nada seria gravado antes da saída
+    env = dict(os.environ, AUDIT_INTERVALO_S="60", AUDIT_LOTE="5000")
+    subprocess.run([sys.executable, "-c", script], check=True, cwd=RAIZ, env=env, timeout=60)
+    assert detalhes("saida") == [str(i) for i in range(1000)]
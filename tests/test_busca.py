@@ -0,0 +1,113 @@
+"""Busca textual (buscar_lancamentos): palavras só do próprio usuário, qualquer pontuação."""
+import sqlite3
+import unicodedata
+
+import pytest
+
+import db
+
+
+def achados(id_usuario, busca):
+    df, total = db.buscar_lancamentos(id_usuario, busca)
+    assert total == len(df)
+    return sorted(df["descricao"])
+
+
+@pytest.fixture
+def lancamentos(banco):
+    db.inserir_gasto(2, 1, "Moradia", "a!u4xsalario", 10, 1, 2024)
+    db.inserir_renda(4, "Bônus", 10, 1, 2024)
+    db.inserir_gasto(3, 6, "Lazer", "Café…Padaria «Pão» ¿Cinema? #ingresso", 10, 2, 2024)
+    db.inserir_renda(3, unicodedata.normalize("NFD", "Restituição"), 10, 2, 2024)
+
+
+def test_pontuacao_nao_cria_termo_de_outro_usuario(lancamentos):
+    assert db.buscar_lancamentos(4, "salario")[1] == 0
+    # para o dono, "u4xsalario" é só mais uma palavra da descrição
+    assert achados(2, "u4xsal") == ["a!u4xsalario"]
+
+
+@pytest.mark.parametrize("busca", ["padaria", "pao", "cinema", "ingresso", "cafe pao", "CINE"])
+def test_palavras_depois_de_qualquer_pontuacao(lancamentos, busca):
+    assert achados(3, busca) == ["Café…Padaria «Pão» ¿Cinema? #ingresso"]
+
+
+def test_acentos_decompostos(lancamentos):
+    assert len(achados(3, "restituicao")) == 1
+    assert len(achados(3, "restituição")) == 1
+
+
+def test_total_so_conta_o_usuario(lancamentos):
+    # mesmo com termos indexados fora do prefixo certo, total == linhas do usuário
+    with db.conexao() as conn:
+        conn.execute("INSERT INTO gastos_fts (rowid, categoria, descricao) "
+                     "SELECT id, '', 'u4xsalario' FROM gastos WHERE id_usuario = 2")
+    df, total = db.buscar_lancamentos(4, "salario")
+    assert df.empty and total == 0
+
+
+def test_escritas_mantem_o_indice(lancamentos):
+    db.inserir_gasto(3, 1, "Viagem", "Hotel/Fazenda-Paraíso!", 900, 7, 2024)
+    df, _ = db.buscar_lancamentos(3, "paraiso")
+    id_gasto = int(df["id"].iloc[0])
+    db.atualizar_gasto(id_gasto, "Pousada!Sol", 900)
+    assert achados(3, "paraiso") == [] and achados(3, "sol") == ["Pousada!Sol"]
+    with db.conexao() as conn:
+        conn.execute("UPDATE gastos SET id_usuario = 5 WHERE id = ?", (id_gasto,))
+    assert achados(3, "sol") == [] and achados(5, "sol") == ["Pousada!Sol"]
+    db.excluir_gasto(id_gasto)
+    assert achados(5, "sol") == []
+    with db.conexao() as conn:
+        for tabela in ("gastos", "rendas"):
+            conn.execute(f"INSERT INTO {tabela}_fts ({tabela}_fts) VALUES ('integrity-check')")
+
+
+def test_outro_cliente_sqlite_grava_sem_termos_busca(lancamentos):
+    # conexão crua, sem a função do app: os triggers são SQL puro
+    conn = sqlite3.connect(db.DB_NAME)
+    with conn:
+        conn.execute("INSERT INTO gastos (id_usuario, id_classificacao, categoria, descricao, valor_centavos, mes, ano) "
+                     "VALUES (3, 1, 'Casa', 'Conserto:Geladeira', 100, 3, 2024)")
+        conn.execute("UPDATE gastos SET descricao = 'Padaria do bairro' WHERE descricao LIKE 'Café%'")
+        conn.execute("DELETE FROM rendas WHERE id_usuario = 3")
+    conn.close()
+    assert achados(3, "geladeira") == ["Conserto:Geladeira"]
+    assert achados(3, "cinema") == [] and achados(3, "bairro") == ["Padaria do bairro"]
+    assert db.buscar_lancamentos(3, "restituicao")[1] == 0
+    with db.conexao() as conn:
+        assert conn.execute("SELECT COUNT(1) FROM gastos_busca_pendente").fetchone()[0] == 0
+        for tabela in ("gastos", "rendas"):
+            conn.execute(f"INSERT INTO {tabela}_fts ({tabela}_fts) VALUES ('integrity-check')")
+
+
+def test_migracao_refaz_o_indice_antigo(monkeypatch, tmp_path):
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "antigo.db"))
+    migracoes = db.MIGRACOES
+    monkeypatch.setattr(db, "MIGRACOES", [m for m in migracoes if m[0] < 16])
+    db.migrar(forcar=True)
+    # formato anterior: índice sem conteúdo, termos calculados nos triggers
+    # (aqui com o replace() da versão 13, que vazava para o usuário 4)
+    with db.conexao() as conn:
+        for trigger in ("ins", "del", "upd"):
+            conn.execute(f"DROP TRIGGER trg_gastos_busca_{trigger}")
+        conn.execute("DROP TABLE gastos_fts")
+        conn.execute("CREATE VIRTUAL TABLE gastos_fts USING fts5(categoria, descricao, content='', "
+                     "tokenize='unicode61 remove_diacritics 2')")
+        conn.execute("CREATE TRIGGER trg_gastos_busca_ins AFTER INSERT ON gastos BEGIN "
+                     "INSERT INTO gastos_fts (rowid, categoria, descricao) SELECT NEW.id, "
+                     "'u' || NEW.id_usuario || 'x' || NEW.categoria, "
+                     "'u' || NEW.id_usuario || 'x' || NEW.descricao; END")
+    db.inserir_gasto(2, 1, "Moradia", "a!u4xsalario", 10, 1, 2024)
+    with db.conexao() as conn:
+        vazados = conn.execute("SELECT COUNT(1) FROM gastos_fts WHERE gastos_fts MATCH 'u4xsalario'").fetchone()[0]
+    assert vazados == 1
+    monkeypatch.setattr(db, "MIGRACOES", migracoes)
+    db.migrar(forcar=True)
+    with db.conexao() as conn:
+        vazados = conn.execute("SELECT COUNT(1) FROM gastos_fts WHERE gastos_fts MATCH 'u4xsalario'").fetchone()[0]
+        triggers = " ".join(r[0] for r in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' "
+                                                        "AND name LIKE 'trg_%_busca_%'"))
+    assert vazados == 0 and "termos_busca" not in triggers
+    assert db.buscar_lancamentos(4, "salario")[1] == 0
+    assert achados(2, "u4xsal") == ["a!u4xsalario"]
+    db.fechar_conexoes()
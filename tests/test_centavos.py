@@ -0,0 +1,100 @@
+"""Dinheiro em centavos inteiros: somas exatas, conversão na borda e frames compactos."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import db
+import logic
+
+CATEGORIAS = ["Mercado", "Aluguel", "Luz", "Água", "Internet", "Farmácia", "Padaria", "Combustível"]
+
+
+def como_antes(df: pd.DataFrame) -> pd.DataFrame:
+    """Tipos que carregar_gastos devolvia com valor REAL: float64, Int64 e object."""
+    return df.assign(valor=df["valor_centavos"] / 100).drop(columns="valor_centavos").astype({
+        "id_usuario": "Int64", "id_classificacao": "Int64", "mes": "Int64", "ano": "Int64",
+        "categoria": object,
+    })
+
+
+@pytest.mark.parametrize("reais, centavos", [
+    (0.1, 10), ("12.345", 1235), (12.345, 1235), (-12.345, -1235), ("0.005", 1), (1e6, 100_000_000), (0, 0),
+])
+def test_para_centavos(reais, centavos):
+    assert db.para_centavos(reais) == centavos
+    assert db.serie_para_centavos(pd.Series([reais])).tolist() == [centavos]
+
+
+def test_serie_para_centavos_marca_invalidos_como_na():
+    assert db.serie_para_centavos(pd.Series(["1,5", None, "abc", 2.5])).isna().tolist() == [True, True, True, False]
+
+
+def test_somas_exatas(banco):
+    # 0,10 somado 10.000 vezes em float64 não dá 1000.0; em centavos dá 100000
+    assert sum([0.1] * 10_000) != 1000.0
+    with db.conexao() as conn:
+        conn.executemany(
+            "INSERT INTO gastos (id_usuario, id_classificacao, categoria, descricao, valor_centavos, mes, ano) "
+            "VALUES (2, 1, 'Padaria', 'pão', ?, ?, 2024)",
+            [(db.para_centavos(0.1), 1 + i % 12) for i in range(10_000)],
+        )
+    gastos = db.carregar_gastos(2)
+    assert int(gastos["valor_centavos"].sum()) == 100_000
+    assert int(db.somar_gastos_por_classificacao(2, 2024)["valor_centavos"].sum()) == 100_000
+    _, resumo = logic.gerar_resumo_sql(logic.classificacao_base_df, "Anual", None, 2024, 2)
+    assert resumo.loc[resumo["id_classificacao"] == 1, "valor"].item() == 1000.0
+    assert logic.gerar_evolucao_mensal_sql(2, 2024)["Gastos"].sum() == pytest.approx(1000.0)
+
+
+def test_migracao_de_real_para_centavos(monkeypatch, tmp_path):
+    # banco no schema anterior (valor REAL) migrado para centavos
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "antigo.db"))
+    migracoes = db.MIGRACOES
+    monkeypatch.setattr(db, "MIGRACOES", [m for m in migracoes if m[0] < 8])
+    db.migrar(forcar=True)
+    valores = [0.1, 0.2, 12.345, 19.99, 1e-3, None]
+    with db.conexao() as conn:
+        conn.executemany("INSERT INTO rendas (id_usuario, descricao, valor, mes, ano) VALUES (2, 'r', ?, 1, 2024)",
+                         [(v,) for v in valores])
+    monkeypatch.setattr(db, "MIGRACOES", migracoes)
+    db.migrar(forcar=True)
+
+    rendas = db.carregar_rendas(2)
+    assert rendas["valor_centavos"].tolist() == [10, 20, 1235, 1999, 0, 0]
+    assert db.somar_rendas(2, 2024) == 3264
+    db.fechar_conexoes()
+
+
+def test_tipos_compactos(banco):
+    db.inserir_gasto(2, 3, "Mercado", "feira", 10.5, 4, 2024)
+    gastos = db.carregar_gastos(2)
+    assert gastos.dtypes.astype(str).to_dict() == {
+        "id": "int64", "id_usuario": "Int64", "id_classificacao": "Int8", "categoria": "category",
+        "descricao": "object", "valor_centavos": "int64", "mes": "Int8", "ano": "Int16",
+    }
+    # carga vazia mantém os tipos
+    assert db.carregar_gastos(99)["valor_centavos"].dtype == "int64"
+
+
+def test_frame_compacto_usa_menos_memoria(banco):
+    rng = np.random.default_rng(7)
+    linhas = 20_000
+    with db.conexao() as conn:
+        conn.executemany(
+            "INSERT INTO gastos (id_usuario, id_classificacao, categoria, descricao, valor_centavos, mes, ano) "
+            "VALUES (2, ?, ?, 'lançamento', ?, ?, ?)",
+            zip(rng.integers(1, 7, linhas).tolist(), [CATEGORIAS[i] for i in rng.integers(0, 8, linhas)],
+                rng.integers(1, 500_000, linhas).tolist(), rng.integers(1, 13, linhas).tolist(),
+                rng.integers(2015, 2027, linhas).tolist()),
+        )
+    novo = db.carregar_gastos(2)
+    antigo = como_antes(novo)
+
+    def memoria(serie):
+        return serie.memory_usage(deep=True, index=False)
+
+    assert memoria(novo["categoria"]) < memoria(antigo["categoria"]) / 10
+    for col in ("id_classificacao", "mes"):
+        assert memoria(novo[col]) < memoria(antigo[col]) / 4
+    assert memoria(novo["ano"]) < memoria(antigo["ano"]) / 2
+    assert novo.memory_usage(deep=True).sum() < 0.7 * antigo.memory_usage(deep=True).sum()
@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+
+import db
+
+
+def _editor(id_usuario: int) -> pd.DataFrame:
+    """Rendas como o editor da aba Registros mostra (valor em reais)."""
+    df = db.carregar_rendas(id_usuario)[["id", "descricao", "valor_centavos", "mes", "ano"]]
+    return df.assign(valor=db.para_reais(df["valor_centavos"])).drop(columns="valor_centavos")
+
+
+@pytest.fixture
+def rendas(banco):
+    db.inserir_renda(2, "Salário", 3000, 1, 2024)
+    db.inserir_renda(2, "Bico", 150.5, 2, 2024)
+    return _editor(2)
+
+
+def test_aplica_insercao_edicao_e_exclusao(rendas):
+    editado = rendas.copy()
+    editado.loc[editado["descricao"] == "Bico", "valor"] = 200.25
+    editado = editado[editado["descricao"] != "Salário"]
+    editado = pd.concat([editado, pd.DataFrame([{"descricao": "Freela", "valor": 10.1}])], ignore_index=True)
+    resultado = db.aplicar_alteracoes_rendas(2, rendas, editado, padroes={"mes": 3, "ano": 2024})
+    assert resultado == {"inseridos": 1, "atualizados": 1, "excluidos": 1}
+    assert db.carregar_rendas(2).set_index("descricao")["valor_centavos"].to_dict() == {"Bico": 20025, "Freela": 1010}
+
+
+def test_linha_nova_sem_valor_nao_grava_nada(rendas):
+    editado = rendas.copy()
+    editado.loc[0, "descricao"] = "Alterada"
+    editado = pd.concat([editado, pd.DataFrame([{"descricao": "Só descrição"}])], ignore_index=True)
+    with pytest.raises(ValueError, match="valor vazio em 1 linha"):
+        db.aplicar_alteracoes_rendas(2, rendas, editado, padroes={"mes": 3, "ano": 2024})
+    assert db.carregar_rendas(2)["descricao"].tolist() == ["Salário", "Bico"]
+
+
+def test_edicao_que_apaga_valor_ou_periodo_e_rejeitada(rendas):
+    editado = rendas.copy()
+    editado.loc[0, "valor"] = None
+    editado.loc[1, "ano"] = None
+    ids = rendas["id"].tolist()
+    with pytest.raises(ValueError) as erro:
+        db.aplicar_alteracoes_rendas(2, rendas, editado)
+    assert f"valor vazio no(s) id(s) {ids[0]}" in str(erro.value)
+    assert f"ano vazio no(s) id(s) {ids[1]}" in str(erro.value)
+    assert db.carregar_rendas(2)["valor_centavos"].tolist() == [300000, 15050]
+
+
+def _editor_gastos(id_usuario: int) -> pd.DataFrame:
+    df = db.carregar_gastos(id_usuario)[["id", "id_classificacao", "categoria", "descricao", "valor_centavos", "mes", "ano"]]
+    return df.assign(valor=db.para_reais(df["valor_centavos"])).drop(columns="valor_centavos").astype({"categoria": object})
+
+
+def test_mes_e_classificacao_fora_do_dominio_sao_rejeitados(banco):
+    db.inserir_gasto(2, 1, "Moradia", "Aluguel", 900, 1, 2024)
+    original = _editor_gastos(2)
+    editado = original.astype({"id_classificacao": "Int64", "mes": "Int64"})
+    editado.loc[0, ["id_classificacao", "mes"]] = [200, 300]
+    editado = pd.concat([editado, pd.DataFrame([{"id_classificacao": 9, "descricao": "x", "valor": 1, "mes": 13}])],
+                        ignore_index=True)
+    with pytest.raises(ValueError) as erro:
+        db.aplicar_alteracoes_gastos(2, original, editado, padroes={"ano": 2024})
+    for trecho in ("mês fora de 1 a 12 em 1 linha", "classificação desconhecida em 1 linha",
+                   f"mês fora de 1 a 12 no(s) id(s) {original['id'][0]}"):
+        assert trecho in str(erro.value)
+    assert db.carregar_gastos(2)[["id_classificacao", "mes"]].values.tolist() == [[1, 1]]
+
+
+def test_linha_antiga_fora_do_dominio_volta_sem_wrap(banco):
+    # gravada antes da validação (ou por outro cliente): Int8 faria 200 -> -56
+    with db.conexao() as conn:
+        conn.execute("INSERT INTO gastos (id_usuario, id_classificacao, categoria, descricao, valor_centavos, mes, ano) "
+                     "VALUES (2, 200, 'Outros', 'antiga', 100, 300, 2024)")
+    original = _editor_gastos(2)
+    assert original[["id_classificacao", "mes"]].values.tolist() == [[200, 300]]
+    editado = original.copy()
+    editado.loc[0, "descricao"] = "só a descrição"
+    assert db.aplicar_alteracoes_gastos(2, original, editado)["atualizados"] == 1
+    with db.conexao() as conn:
+        assert conn.execute("SELECT id_classificacao, mes, descricao FROM gastos").fetchall() == [(200, 300, "só a descrição")]
+
+
+def test_inserir_valida_mes_e_classificacao(banco):
+    with pytest.raises(ValueError, match="Mês inválido"):
+        db.inserir_renda(2, "Salário", 10, 13, 2024)
+    with pytest.raises(ValueError, match="Classificação desconhecida"):
+        db.inserir_gasto(2, 200, "Moradia", "Aluguel", 10, 1, 2024)
+    with pytest.raises(ValueError, match="Classificação desconhecida"):
+        db.criar_recorrencia(2, "gastos", "Aluguel", 10, (2024, 1), id_classificacao=0, categoria="Moradia")
+    assert db.carregar_rendas(2).empty and db.carregar_gastos(2).empty
+
+
+def test_ids_de_classificacao_iguais_aos_da_logica():
+    import logic
+    assert set(logic.classificacao_base_df["id_classificacao"]) == db.IDS_CLASSIFICACAO
@@ -0,0 +1,46 @@
+import db
+import exportacao
+
+
+def _popular():
+    for i in range(5):
+        db.inserir_renda(2, f"Salário {i}", 1000 + i, 1 + i, 2024)
+        db.inserir_gasto(2, 1, "Moradia", f"Aluguel {i}", 500 + i, 1 + i, 2024)
+
+
+def test_reimportar_no_mesmo_banco_conta_ids_existentes(banco, tmp_path):
+    _popular()
+    exportacao.exportar_parquet(str(tmp_path / "export"), id_usuario=2)
+    total = exportacao.importar_parquet(str(tmp_path / "export"))
+    for tabela in exportacao.TABELAS:
+        assert total[tabela] == {"lidas": 5, "inseridas": 0, "ignoradas": 5, "ids_existentes": 5}
+    assert len(db.carregar_rendas(2)) == 5
+
+
+def test_reatribuir_usuario_gera_ids_novos(banco, tmp_path):
+    _popular()
+    exportacao.exportar_parquet(str(tmp_path / "export"), id_usuario=2)
+    # os ids exportados já existem (são do usuário 2): nenhuma linha do usuário 3 pode sumir
+    total = exportacao.importar_parquet(str(tmp_path / "export"), id_usuario_destino=3)
+    for tabela in exportacao.TABELAS:
+        assert total[tabela]["inseridas"] == 5 and total[tabela]["ids_existentes"] == 0
+    assert sorted(db.carregar_gastos(3)["valor_centavos"]) == [50000, 50100, 50200, 50300, 50400]
+    assert len(db.carregar_gastos(2)) == 5
+
+
+def test_manter_ids_com_reatribuicao_informa_colisoes(banco, tmp_path):
+    _popular()
+    exportacao.exportar_parquet(str(tmp_path / "export"), id_usuario=2)
+    total = exportacao.importar_parquet(str(tmp_path / "export"), manter_ids=True, id_usuario_destino=3)
+    assert total["rendas"]["ids_existentes"] == 5 and total["rendas"]["inseridas"] == 0
+
+
+def test_exporta_valores_fora_da_faixa_de_int8(banco, tmp_path):
+    # linha antiga, de antes da validação de mes/id_classificacao na gravação
+    with db.conexao() as conn:
+        conn.execute("INSERT INTO gastos (id_usuario, id_classificacao, categoria, descricao, valor_centavos, mes, ano) "
+                     "VALUES (2, 200, 'Outros', 'antiga', 100, 300, 2024)")
+    exportacao.exportar_parquet(str(tmp_path / "export"), id_usuario=2)
+    exportacao.importar_parquet(str(tmp_path / "export"), id_usuario_destino=3)
+    with db.conexao() as conn:
+        assert conn.execute("SELECT id_classificacao, mes FROM gastos WHERE id_usuario = 3").fetchall() == [(200, 300)]
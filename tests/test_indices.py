@@ -0,0 +1,67 @@
+"""EXPLAIN QUERY PLAN das consultas quentes: cada uma usa o índice previsto, sem varrer a tabela."""
+import pytest
+
+import db
+
+PERIODO = ("ano >= ? AND (ano > ? OR mes >= ?) AND ano <= ? AND (ano < ? OR mes <= ?)",
+           (2023, 2023, 3, 2024, 2024, 5))
+AUDITORIA = f"SELECT {', '.join(db.COLUNAS_AUDITORIA)} FROM audit_logs"
+
+CONSULTAS = [
+    # carregar_rendas / carregar_gastos (_carregar + _filtro_periodo)
+    ("rendas", f"SELECT {', '.join(db.COLUNAS_RENDAS)} FROM rendas WHERE id_usuario = ? ORDER BY id", (1,),
+     "idx_rendas_usuario_periodo_valor"),
+    ("gastos", f"SELECT {', '.join(db.COLUNAS_GASTOS)} FROM gastos WHERE id_usuario = ? AND ano = ? AND mes = ? "
+     "ORDER BY id", (1, 2024, 1), "idx_gastos_usuario_periodo_valor"),
+    ("gastos", f"SELECT {', '.join(db.COLUNAS_GASTOS)} FROM gastos WHERE id_usuario = ? AND {PERIODO[0]} ORDER BY id",
+     (1, *PERIODO[1]), "idx_gastos_usuario_periodo_valor"),
+    # listar_anos
+    ("rendas", "SELECT ano FROM rendas WHERE id_usuario = ? AND ano IS NOT NULL "
+     "UNION SELECT ano FROM gastos WHERE id_usuario = ? AND ano IS NOT NULL ORDER BY ano", (1, 1),
+     "idx_rendas_usuario_periodo_valor"),
+    # count_failed_attempts_recent / clear_login_attempts / falhas_login_recentes
+    ("login_attempts", "SELECT COUNT(1) FROM login_attempts WHERE email = ? AND success = 0 "
+     "AND attempted_at >= datetime('now', ?)", ("a@x.com", "-15 minutes"), "idx_login_attempts_email"),
+    ("login_attempts", "DELETE FROM login_attempts WHERE email = ?", ("a@x.com",), "idx_login_attempts_email"),
+    ("login_attempts", "SELECT email, ip, attempted_at FROM login_attempts WHERE attempted_at >= datetime('now', ?) "
+     "AND success = 0 ORDER BY attempted_at", ("-15 minutes",), "idx_login_attempts_data"),
+    # paginar_audit_logs, sem filtro e com cada filtro
+    ("audit_logs", f"{AUDITORIA} ORDER BY created_at DESC, id DESC LIMIT ?", (100,), "idx_audit_logs_created_at"),
+    ("audit_logs", f"{AUDITORIA} WHERE event_type IN (?) ORDER BY created_at DESC, id DESC LIMIT ?", ("login", 100),
+     "idx_audit_logs_tipo"),
+    ("audit_logs", f"{AUDITORIA} WHERE actor_id = ? ORDER BY created_at DESC, id DESC LIMIT ?", (1, 100),
+     "idx_audit_logs_ator"),
+    ("audit_logs", f"{AUDITORIA} WHERE target_id = ? ORDER BY created_at DESC, id DESC LIMIT ?", (1, 100),
+     "idx_audit_logs_alvo"),
+    # buscar_usuarios
+    ("usuarios", "SELECT id_usuario, nome, email, is_admin, must_change_password FROM usuarios "
+     "ORDER BY nome COLLATE NOCASE, id_usuario LIMIT ? OFFSET ?", (50, 0), "idx_usuarios_nome"),
+]
+
+
+def plano(sql: str, params) -> list:
+    with db.conexao() as conn:
+        return [linha[3] for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+@pytest.mark.parametrize("tabela, sql, params, indice", CONSULTAS)
+def test_consulta_usa_indice(banco, tabela, sql, params, indice):
+    passos = plano(sql, params)
+    assert any(f"INDEX {indice}" in p for p in passos), passos
+    assert not any(p == f"SCAN {tabela}" for p in passos), passos
+
+
+def test_paginas_de_auditoria_sem_ordenacao_extra(banco):
+    # a ordem (created_at, id) sai do índice: sem B-tree temporária por página
+    passos = plano(f"{AUDITORIA} WHERE created_at < ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                   ("2024-01-01", 100))
+    assert not any("TEMP B-TREE" in p for p in passos), passos
+
+
+@pytest.mark.parametrize("operador", ["=", "<>"])
+def test_agregacoes_leem_resumo_mensal_pela_chave(banco, operador):
+    passos = plano(
+        "SELECT mes, SUM(valor_centavos) FROM resumo_mensal WHERE id_usuario = ? AND ano = ? "
+        f"AND id_classificacao {operador} {db.RESUMO_ID_RENDAS} GROUP BY mes ORDER BY mes", (1, 2024),
+    )
+    assert any("resumo_mensal USING PRIMARY KEY" in p for p in passos), passos
@@ -0,0 +1,33 @@
+import pytest
+
+import limite_login
+
+
+@pytest.mark.parametrize("cabecalho, proxies, esperado", [
+    ("203.0.113.7", 0, "10.0.0.2"),                      # sem proxy confiável: cabeçalho ignorado
+    ("203.0.113.7", 1, "203.0.113.7"),
+    ("1.1.1.1, 203.0.113.7", 1, "203.0.113.7"),          # o da esquerda o cliente pode forjar
+    ("1.1.1.1, 203.0.113.7, 10.0.0.9", 2, "203.0.113.7"),
+    ("203.0.113.7", 2, "10.0.0.2"),                      # menos endereços que proxies
+    (None, 1, "10.0.0.2"),
+])
+def test_ip_do_cliente(cabecalho, proxies, esperado):
+    assert limite_login.ip_do_cliente("10.0.0.2", cabecalho, proxies) == esperado
+
+
+def test_limite_por_ip_desligado_nao_bloqueia_o_proxy():
+    limitador = limite_login.LimitadorLogin(max_falhas=5, max_falhas_ip=0, persistir=False)
+    for i in range(50):
+        limitador.registrar(f"alvo{i}@x.com", "10.0.0.2", sucesso=False, agora=1000.0 + i)
+    assert limitador.espera("outra@x.com", "10.0.0.2", agora=1100.0) == 0
+    for _ in range(5):
+        limitador.registrar("alvo@x.com", "10.0.0.2", sucesso=False, agora=1100.0)
+    assert limitador.espera("alvo@x.com", "10.0.0.2", agora=1101.0) > 0  # o limite por conta continua
+
+
+def test_limite_por_ip_ligado():
+    limitador = limite_login.LimitadorLogin(max_falhas=5, max_falhas_ip=3, persistir=False)
+    for i in range(3):
+        limitador.registrar(f"alvo{i}@x.com", "10.0.0.2", sucesso=False, agora=1000.0)
+    assert limitador.espera("outra@x.com", "10.0.0.2", agora=1001.0) > 0
+    assert limitador.espera("outra@x.com", "10.0.0.3", agora=1001.0) == 0
@@ -0,0 +1,83 @@
+"""Paridade dos resumos: pandas (gerar_resumo / gerar_evolucao_mensal) x SQL x MatrizResumo."""
+import random
+
+import pandas as pd
+import pytest
+
+import db
+import logic
+
+ANOS = (2022, 2023, 2024)
+COM_DADOS, SEM_RENDAS, MESES_SOLTOS, VAZIO = 5, 6, 7, 99
+
+
+@pytest.fixture
+def lancamentos(banco):
+    aleatorio = random.Random(2)
+    gastos, rendas = [], []
+    for u in (COM_DADOS, 8):
+        for _ in range(400):
+            gastos.append((u, aleatorio.randint(1, 6), "Mercado", "d", aleatorio.randint(1, 50_000),
+                           aleatorio.randint(1, 12), aleatorio.choice(ANOS)))
+        for _ in range(60):
+            rendas.append((u, "Salário", aleatorio.randint(1, 900_000), aleatorio.randint(1, 12),
+                           aleatorio.choice(ANOS)))
+    gastos.append((SEM_RENDAS, 1, "Aluguel", "d", 1_000, 3, 2024))
+    # só alguns meses do ano: a evolução traz apenas esses
+    gastos += [(MESES_SOLTOS, 2, "Dízimo", "d", 990, 2, 2023), (MESES_SOLTOS, 6, "Cinema", "d", 1, 11, 2023)]
+    rendas.append((MESES_SOLTOS, "Bico", 12_345, 5, 2023))
+    with db.conexao() as conn:
+        conn.executemany(
+            "INSERT INTO gastos (id_usuario, id_classificacao, categoria, descricao, valor_centavos, mes, ano) "
+            "VALUES (?,?,?,?,?,?,?)", gastos,
+        )
+        conn.executemany(
+            "INSERT INTO rendas (id_usuario, descricao, valor_centavos, mes, ano) VALUES (?,?,?,?,?)", rendas,
+        )
+
+
+def _periodos():
+    for ano in (*ANOS, 2030):
+        yield "Anual", None, ano
+        for mes in (1, 2, 5, 7, 11, 12):
+            yield "Mensal", mes, ano
+
+
+@pytest.mark.parametrize("id_usuario", [COM_DADOS, SEM_RENDAS, MESES_SOLTOS, VAZIO])
+def test_resumo_sql_e_matriz_iguais_ao_pandas(lancamentos, id_usuario):
+    classificacao = logic.classificacao_base_df
+    rendas, gastos = db.carregar_rendas(id_usuario), db.carregar_gastos(id_usuario)
+    matriz = logic.matriz_resumo_sql(id_usuario, classificacao)
+    for visao, mes, ano in _periodos():
+        renda, resumo = logic.gerar_resumo(rendas, gastos, classificacao.copy(), visao, mes, ano, id_usuario)
+        renda_sql, resumo_sql = logic.gerar_resumo_sql(classificacao.copy(), visao, mes, ano, id_usuario)
+        renda_matriz, resumo_matriz = matriz.resumo(visao, mes, ano)
+        assert renda == renda_sql == renda_matriz
+        pd.testing.assert_frame_equal(resumo_sql, resumo, check_dtype=False)
+        pd.testing.assert_frame_equal(resumo_matriz, resumo, check_dtype=False)
+
+
+@pytest.mark.parametrize("id_usuario", [COM_DADOS, SEM_RENDAS, MESES_SOLTOS, VAZIO])
+def test_evolucao_sql_e_matriz_iguais_ao_pandas(lancamentos, id_usuario):
+    rendas, gastos = db.carregar_rendas(id_usuario), db.carregar_gastos(id_usuario)
+    matriz = logic.matriz_resumo_sql(id_usuario, logic.classificacao_base_df)
+    for ano in (*ANOS, 2030):
+        evolucao = logic.gerar_evolucao_mensal(gastos, rendas, ano)
+        pd.testing.assert_frame_equal(logic.gerar_evolucao_mensal_sql(id_usuario, ano), evolucao, check_dtype=False)
+        pd.testing.assert_frame_equal(matriz.evolucao(ano), evolucao, check_dtype=False)
+
+
+def test_evolucao_so_com_meses_lancados(lancamentos):
+    evolucao = logic.gerar_evolucao_mensal_sql(MESES_SOLTOS, 2023)
+    assert evolucao["mes_nome"].tolist() == ["Fev", "Mai", "Nov"]
+    assert evolucao["Saldo"].tolist() == [-9.90, 123.45, -0.01]
+
+
+def test_totais_exatos_em_centavos(lancamentos):
+    _, resumo = logic.gerar_resumo_sql(logic.classificacao_base_df, "Anual", None, 2024, COM_DADOS)
+    with db.conexao() as conn:
+        esperado = dict(conn.execute(
+            "SELECT id_classificacao, SUM(valor_centavos) FROM gastos WHERE id_usuario = ? AND ano = 2024 "
+            "GROUP BY id_classificacao", (COM_DADOS,),
+        ).fetchall())
+    assert dict(zip(resumo["id_classificacao"], resumo["valor_centavos"])) == esperado
@@ -0,0 +1,47 @@
+import time
+
+import db
+import limite_login
+import retencao
+
+
+def _tentativas_e_eventos_antigos():
+    with db.conexao() as conn:
+        conn.executemany(
+            "INSERT INTO login_attempts (email, attempted_at, success, ip) "
+            "VALUES ('a@b.c', datetime('now', ?), ?, '10.0.0.1')",
+            [("-40 days", 0), ("-40 days", 1), ("-1 days", 0)],
+        )
+        conn.execute("INSERT INTO audit_logs (event_type, details, created_at) VALUES ('antigo', '', datetime('now', '-400 days'))")
+
+
+def _contar(tabela):
+    with db.conexao() as conn:
+        return conn.execute(f"SELECT COUNT(1) FROM {tabela}").fetchone()[0]
+
+
+def test_login_attempts_retido_por_padrao_pela_thread_do_limitador(banco):
+    _tentativas_e_eventos_antigos()
+    assert limite_login.LOGIN_PODA_INTERVALO_MIN > 0
+    thread = limite_login.ManutencaoLogin(limite_login.LimitadorLogin(persistir=False), descarga_s=0.01)
+    thread.start()
+    limite = time.monotonic() + 10
+    while _contar("login_attempts") > 1 and time.monotonic() < limite:
+        time.sleep(0.02)
+    thread.parar()
+    thread.join(5)
+    assert _contar("login_attempts") == 1
+    assert retencao.contagem_diaria("login_attempts")["quantidade"].sum() == 3
+    assert _contar("audit_logs") >= 1  # a trilha de auditoria não é tocada
+
+
+def test_retencao_agendada_e_opcional_e_so_de_audit_logs(banco):
+    assert retencao.RETENCAO_INTERVALO_MIN == 0 and retencao.iniciar_retencao_agendada() is None
+    _tentativas_e_eventos_antigos()
+    agendada = retencao.RetencaoAgendada(intervalo_min=60)
+    agendada.start()
+    agendada.parar()
+    agendada.join(10)
+    with db.conexao() as conn:
+        assert conn.execute("SELECT COUNT(1) FROM audit_logs WHERE event_type = 'antigo'").fetchone()[0] == 0
+    assert _contar("login_attempts") == 3